@@ -1,12 +1,10 @@
 from django.contrib import admin
 from django import forms
-from .models import Company, Timesheet, TimesheetEntry, ExtraHours
+from .forms import CompanyPatternForm
+from .models import WEEK_LABELS, Company, Timesheet, TimesheetEntry, ExtraHours
+from .services import resync_with_company_patterns
 
-class CompanyAdminForm(forms.ModelForm):
-    class Meta:
-        model = Company
-        fields = '__all__'
-    
+class CompanyAdminForm(CompanyPatternForm):
     def clean_name(self):
         name = self.cleaned_data.get('name')
         if name:
@@ -17,45 +15,36 @@ class CompanyAdminForm(forms.ModelForm):
                 raise forms.ValidationError(f'A company with the name "{name}" already exists.')
         return name
 
+def _week_fieldset(week, description, collapse=True):
+    options = {
+        'fields': tuple(CompanyPatternForm.day_field_name(week, weekday) for weekday in range(7)),
+        'description': description,
+    }
+    if collapse:
+        options['classes'] = ('collapse',)
+    return (f'Week {WEEK_LABELS[week]}', options)
+
 class CompanyAdmin(admin.ModelAdmin):
     form = CompanyAdminForm
-    list_display = ['name', 'pattern_type', 'is_active', 'get_weekly_total']
-    list_filter = ['pattern_type', 'is_active']
+    list_display = ['name', 'cycle_weeks', 'is_active', 'get_weekly_total']
+    list_filter = ['cycle_weeks', 'is_active']
     search_fields = ['name']
     
     fieldsets = (
         ('Basic Info', {
-            'fields': ('name', 'pattern_type', 'biweekly_start_date', 'is_active')
-        }),
-        ('Weekly Pattern (Standard)', {
-            'fields': ('mon_hours', 'tue_hours', 'wed_hours', 'thu_hours', 'fri_hours', 'sat_hours', 'sun_hours'),
-            'description': 'Used for weekly pattern companies'
-        }),
-        ('Bi-Weekly Pattern - Week A', {
-            'fields': ('mon_hours_week_a', 'tue_hours_week_a', 'wed_hours_week_a', 'thu_hours_week_a', 
-                      'fri_hours_week_a', 'sat_hours_week_a', 'sun_hours_week_a'),
-            'classes': ('collapse',),
-            'description': 'First week of bi-weekly cycle'
-        }),
-        ('Bi-Weekly Pattern - Week B', {
-            'fields': ('mon_hours_week_b', 'tue_hours_week_b', 'wed_hours_week_b', 'thu_hours_week_b',
-                      'fri_hours_week_b', 'sat_hours_week_b', 'sun_hours_week_b'),
-            'classes': ('collapse',),
-            'description': 'Second week of bi-weekly cycle (alternating)'
+            'fields': ('name', 'cycle_weeks', 'cycle_start_date', 'is_active')
         }),
+        _week_fieldset(0, 'Every week for weekly companies; the first week of a rotation', collapse=False),
+        _week_fieldset(1, 'Second week of the rotation'),
+        _week_fieldset(2, 'Third week of the rotation'),
+        _week_fieldset(3, 'Fourth week of the rotation'),
     )
     
     def get_weekly_total(self, obj):
-        if obj.pattern_type == 'weekly':
-            total = (obj.mon_hours + obj.tue_hours + obj.wed_hours + 
-                    obj.thu_hours + obj.fri_hours + obj.sat_hours + obj.sun_hours)
-            return f"{total} hrs/week"
-        else:
-            total_a = (obj.mon_hours_week_a + obj.tue_hours_week_a + obj.wed_hours_week_a +
-                      obj.thu_hours_week_a + obj.fri_hours_week_a + obj.sat_hours_week_a + obj.sun_hours_week_a)
-            total_b = (obj.mon_hours_week_b + obj.tue_hours_week_b + obj.wed_hours_week_b +
-                      obj.thu_hours_week_b + obj.fri_hours_week_b + obj.sat_hours_week_b + obj.sun_hours_week_b)
-            return f"A: {total_a}, B: {total_b} hrs/week"
+        weeks = obj.get_weeks()
+        if len(weeks) == 1:
+            return f"{weeks[0][2]} hrs/week"
+        return ', '.join(f"{label}: {total}" for label, _, total in weeks) + " hrs/week"
     get_weekly_total.short_description = 'Weekly Total'
 
 class TimesheetEntryInline(admin.TabularInline):
@@ -68,13 +57,15 @@ class ExtraHoursInline(admin.TabularInline):
 
 @admin.register(Timesheet)
 class TimesheetAdmin(admin.ModelAdmin):
-    list_display = ['cleaner_name', 'month', 'year', 'get_total_hours', 'created_at']
+    list_display = ['cleaner_name', 'month', 'year', 'total_hours', 'created_at']
     list_filter = ['year', 'month']
     search_fields = ['cleaner_name']
     inlines = [TimesheetEntryInline, ExtraHoursInline]
+    actions = ['resync_hours']
     
-    def get_total_hours(self, obj):
-        return obj.get_total_hours()
-    get_total_hours.short_description = 'Total Hours'
+    @admin.action(description='Re-sync hours with the current company patterns')
+    def resync_hours(self, request, queryset):
+        changed = resync_with_company_patterns(queryset.values_list('pk', flat=True))
+        self.message_user(request, f'Updated {changed} entries.')
 
 admin.site.register(Company, CompanyAdmin)
\ No newline at end of file
@@ -0,0 +1,127 @@
+# timesheet/api.py
+"""
+Serialization and pagination for the read-only JSON API.
+
+Collections are paged with an id keyset cursor (?after=<id>). With
+?stream=1 the whole filtered collection is written out as one JSON
+document, fetched and encoded STREAM_BATCH_SIZE timesheets at a time, so
+memory stays flat however many rows match.
+"""
+import calendar
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+
+from .hours import to_float, to_hundredths
+from .models import Timesheet, TimesheetEntry
+
+DEFAULT_FIELDS = ('id', 'cleaner_name', 'year', 'month', 'total_hours', 'updated_at')
+# Fields that need the entries / extra hours loaded
+RELATED_FIELDS = ('entries', 'extra_hours', 'days')
+ALL_FIELDS = DEFAULT_FIELDS + RELATED_FIELDS
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+STREAM_BATCH_SIZE = 500
+
+_encoder = DjangoJSONEncoder()
+
+
+def parse_fields(value, default=DEFAULT_FIELDS):
+    """Comma-separated field names -> tuple; raises ValueError on unknown names"""
+    if not value:
+        return default
+    fields = tuple(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in ALL_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    return fields
+
+
+def timesheet_queryset(fields):
+    """Timesheets ordered by id, with only the relations `fields` needs"""
+    queryset = Timesheet.objects.order_by('id')
+    if 'entries' in fields or 'days' in fields:
+        queryset = queryset.prefetch_related(
+            Prefetch('entries', queryset=TimesheetEntry.objects.select_related('company').order_by('id'))
+        )
+    if 'extra_hours' in fields or 'days' in fields:
+        queryset = queryset.prefetch_related('extra_hours')
+    return queryset
+
+
+def daily_hours(timesheet):
+    """Scheduled plus dated extra hours for each day of the timesheet's month"""
+    days = [0] * calendar.monthrange(timesheet.year, timesheet.month)[1]
+    for entry in timesheet.entries.all():
+        days = [a + b for a, b in zip(days, entry.get_month_hundredths())]
+    for eh in timesheet.extra_hours.all():
+        if eh.date and eh.date.year == timesheet.year and eh.date.month == timesheet.month:
+            days[eh.date.day - 1] += to_hundredths(eh.hours)
+    return [to_float(hours) for hours in days]
+
+
+def serialize_entry(entry, with_days=False):
+    data = {
+        'id': entry.pk,
+        'company_id': entry.company_id,
+        'company': entry.company.name,
+        'total_hours': to_float(to_hundredths(entry.total_hours)),
+    }
+    if with_days:
+        data['days'] = [to_float(hours) for hours in entry.get_month_hundredths()]
+    return data
+
+
+def serialize_extra_hours(eh):
+    return {
+        'id': eh.pk,
+        'company_id': eh.company_id,
+        'date': eh.date,
+        'hours': to_float(to_hundredths(eh.hours)),
+        'description': eh.description,
+    }
+
+
+def serialize_timesheet(timesheet, fields):
+    data = {}
+    for field in fields:
+        if field == 'total_hours':
+            data[field] = to_float(to_hundredths(timesheet.total_hours))
+        elif field == 'entries':
+            data[field] = [serialize_entry(entry, 'days' in fields) for entry in timesheet.entries.all()]
+        elif field == 'extra_hours':
+            data[field] = [serialize_extra_hours(eh) for eh in timesheet.extra_hours.all()]
+        elif field == 'days':
+            data[field] = daily_hours(timesheet)
+        else:
+            data[field] = getattr(timesheet, field)
+    return data
+
+
+def keyset_page(queryset, after=None, limit=PAGE_SIZE):
+    """Return (rows, next_after) for the page of `queryset` after id `after`"""
+    if after is not None:
+        queryset = queryset.filter(id__gt=after)
+    # Fetch one extra row to know whether there is another page
+    rows = list(queryset[:limit + 1])
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, rows[-1].pk
+    return rows, None
+
+
+def iter_json_stream(queryset, fields, batch_size=STREAM_BATCH_SIZE):
+    """Yield a {"results": [...]} document for every row of queryset, one batch at a time"""
+    yield '{"results": ['
+    after = None
+    first = True
+    while True:
+        rows, after = keyset_page(queryset, after, batch_size)
+        if rows:
+            chunk = ', '.join(_encoder.encode(serialize_timesheet(ts, fields)) for ts in rows)
+            yield chunk if first else ', ' + chunk
+            first = False
+        if after is None:
+            break
+    yield ']}'
@@ -3,4 +3,7 @@ from django.apps import AppConfig
 
 class TimesheetConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'timesheet'
\ No newline at end of file
+    name = 'timesheet'
+
+    def ready(self):
+        from . import signals  # noqa: F401
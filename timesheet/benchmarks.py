@@ -0,0 +1,112 @@
+# timesheet/benchmarks.py
+"""
+Benchmarks for the timesheet hot paths.
+
+Each benchmark is timed over several repeats for wall time, then run once
+more under tracemalloc with query capture for peak memory and query count
+(kept separate so tracing overhead does not skew the timings).
+"""
+import gc
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import Timesheet, TimesheetEntry
+
+SCALES = {
+    'small': {'companies': 10, 'cleaners': 5, 'months': 3, 'entries_per_timesheet': 3, 'extra_hours_per_timesheet': 2},
+    'medium': {'companies': 50, 'cleaners': 20, 'months': 12, 'entries_per_timesheet': 5, 'extra_hours_per_timesheet': 3},
+    'large': {'companies': 150, 'cleaners': 80, 'months': 24, 'entries_per_timesheet': 8, 'extra_hours_per_timesheet': 4},
+}
+
+
+def measure(run, setup=None, repeat=5):
+    """Time run(setup()) `repeat` times and profile one extra run; returns a result dict"""
+    timings = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        gc.collect()
+        start = time.perf_counter()
+        run(arg)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    arg = setup() if setup else None
+    gc.collect()
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as queries:
+            run(arg)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'repeat': repeat,
+        'wall_ms': {
+            'min': round(min(timings), 3),
+            'median': round(statistics.median(timings), 3),
+            'mean': round(statistics.mean(timings), 3),
+            'max': round(max(timings), 3),
+        },
+        'queries': len(queries),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def _get(client, url):
+    response = client.get(url)
+    assert response.status_code == 200, f"{url} returned {response.status_code}"
+    # Consume streamed bodies so the whole response is part of the measurement
+    if getattr(response, 'streaming', False):
+        for _ in response.streaming_content:
+            pass
+    else:
+        response.content
+    response.close()
+
+
+def run_suite(repeat=5):
+    """Run every benchmark against the data currently in the database"""
+    client = Client()
+    # The busiest timesheet is the worst case for detail and export
+    busiest = Timesheet.objects.annotate(entry_count=Count('entries')).order_by('-entry_count', 'pk').first()
+    if busiest is None:
+        raise ValueError("No timesheets to benchmark; seed some data first")
+    detail_url = reverse('timesheet_detail', args=[busiest.pk])
+    excel_url = reverse('generate_excel', args=[busiest.pk])
+
+    def load_entries():
+        return list(TimesheetEntry.objects.select_related('timesheet', 'company'))
+
+    def total_hours(entries):
+        for entry in entries:
+            entry.get_total_hours()
+
+    results = {
+        'get_total_hours': measure(total_hours, setup=load_entries, repeat=repeat),
+        'timesheet_detail': measure(lambda _: _get(client, detail_url), repeat=repeat),
+        'timesheet_list': measure(lambda _: _get(client, reverse('timesheet_list')), repeat=repeat),
+        'company_list': measure(lambda _: _get(client, reverse('company_list')), repeat=repeat),
+    }
+
+    # Export from a fresh cache directory each time so the workbook is really built
+    cache_dir = tempfile.mkdtemp(prefix='timesheet-bench-')
+    try:
+        with override_settings(TIMESHEET_EXPORT_CACHE_DIR=cache_dir):
+            def empty_cache():
+                shutil.rmtree(cache_dir, ignore_errors=True)
+            results['generate_excel'] = measure(lambda _: _get(client, excel_url), setup=empty_cache, repeat=repeat)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    results['get_total_hours']['entries'] = TimesheetEntry.objects.count()
+    results['timesheet_detail']['entries'] = busiest.entries.count()
+    return results
@@ -0,0 +1,103 @@
+# timesheet/export_cache.py
+"""
+On-disk cache for generated Excel exports.
+
+Files are keyed by a content version of the timesheet (see export_version),
+so an unchanged timesheet is served from disk and a changed one simply gets
+a new key. The directory is shared by all gunicorn workers: files are
+written to a temporary name and renamed into place, and the least recently
+used files are evicted once the directory grows past its size limit.
+"""
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+
+# Bump when the workbook layout changes so old cached files are not reused
+EXPORT_LAYOUT_VERSION = 1
+
+
+def export_version(timesheet, entries, extra_hours):
+    """Digest of everything that affects a timesheet's workbook"""
+    parts = [
+        f"layout:{EXPORT_LAYOUT_VERSION}",
+        f"timesheet:{timesheet.pk}:{timesheet.cleaner_name}:{timesheet.year}:{timesheet.month}",
+    ]
+    for entry in entries:
+        parts.append(f"entry:{entry.pk}:{entry.company_id}:{entry.company.name}:{entry.hours_snapshot}")
+    for eh in extra_hours:
+        parts.append(f"extra:{eh.pk}:{eh.company_id}:{eh.date}:{eh.hours}:{eh.description}")
+    return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()[:32]
+
+
+class ExportCache:
+    """Size-bounded LRU cache of export files in a local directory"""
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = Path(directory or settings.TIMESHEET_EXPORT_CACHE_DIR)
+        self.max_bytes = max_bytes if max_bytes is not None else settings.TIMESHEET_EXPORT_CACHE_MAX_BYTES
+
+    def path_for(self, key):
+        return self.directory / f"{key}.xlsx"
+
+    def get(self, key):
+        """
+        The cached file for key opened for reading, or None; marks it as
+        recently used. An open file stays readable even if another worker
+        evicts it meanwhile.
+        """
+        path = self.path_for(key)
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return f
+
+    def put(self, key, write):
+        """Create the file for key by calling write(fileobj), evict old files and return it opened for reading"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.path_for(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            # Opened before the rename so eviction elsewhere cannot pull it away
+            f = open(tmp_path, 'rb')
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        self.evict(keep=path)
+        return f
+
+    def evict(self, keep=None):
+        """Delete least recently used files until the cache fits in max_bytes"""
+        files = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.xlsx'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            if keep is not None and path == str(keep):
+                continue
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -0,0 +1,469 @@
+# timesheet/exports.py
+"""
+Excel export built on openpyxl's write-only mode.
+
+Rows are written straight to the worksheet's temporary XML stream and all
+cells share a small set of named styles, so memory stays flat however many
+days and companies a sheet has. The finished workbook is spooled to a
+temporary file and streamed to the client in chunks.
+"""
+import calendar
+import io
+import multiprocessing
+import os
+import re
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from itertools import groupby
+from operator import attrgetter
+
+from django.conf import settings
+from django.db.models import Prefetch
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+from openpyxl.styles.fonts import DEFAULT_FONT
+from openpyxl.utils import get_column_letter
+
+from .hours import to_float, to_hundredths
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+STREAM_BLOCK_SIZE = 64 * 1024
+POOL_MIN_ITEMS = 8
+# Pool size when TIMESHEET_EXPORT_WORKERS is not set; each worker holds a Django process
+DEFAULT_MAX_WORKERS = 4
+
+HEADER_ROW = 4
+
+# Characters Excel does not allow in sheet titles
+INVALID_TITLE_CHARS = re.compile(r'[\[\]:*?/\\]')
+
+
+def _named_styles():
+    center_align = Alignment(horizontal='center', vertical='center')
+    thin_border = Border(
+        left=Side(style='thin'),
+        right=Side(style='thin'),
+        top=Side(style='thin'),
+        bottom=Side(style='thin')
+    )
+    blue_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+    return [
+        NamedStyle(name='ts_title', font=Font(bold=True, size=12)),
+        NamedStyle(name='ts_bold', font=Font(bold=True)),
+        NamedStyle(name='ts_bordered', font=DEFAULT_FONT, border=thin_border),
+        NamedStyle(name='ts_hours', font=DEFAULT_FONT, number_format='0.00'),
+        NamedStyle(
+            name='ts_header',
+            font=Font(bold=True, size=11),
+            alignment=center_align,
+            border=thin_border,
+            fill=PatternFill(start_color="D9E1F2", end_color="D9E1F2", fill_type="solid"),
+        ),
+        NamedStyle(
+            name='ts_day_hours',
+            font=DEFAULT_FONT,
+            alignment=center_align,
+            border=thin_border,
+            number_format='0.00',
+        ),
+        NamedStyle(
+            name='ts_total',
+            font=Font(bold=True),
+            alignment=center_align,
+            border=thin_border,
+            fill=PatternFill(start_color="E7E6E6", end_color="E7E6E6", fill_type="solid"),
+            number_format='0.00',
+        ),
+        NamedStyle(
+            name='ts_grand_total',
+            font=Font(bold=True, color="FFFFFF"),
+            alignment=center_align,
+            border=thin_border,
+            fill=blue_fill,
+            number_format='0.00',
+        ),
+    ]
+
+
+def new_workbook():
+    """Create a write-only workbook with the shared timesheet styles registered"""
+    wb = Workbook(write_only=True)
+    for style in _named_styles():
+        wb.add_named_style(style)
+    return wb
+
+
+def export_filename(timesheet):
+    return f"{timesheet.cleaner_name}_{timesheet.get_month_name()}_{timesheet.year}.xlsx"
+
+
+def write_timesheet_sheet(wb, timesheet, entries, extra_hours, title="Timesheet"):
+    """Append one timesheet, in the standard layout, as a new sheet of a write-only workbook"""
+    ws = wb.create_sheet(title=title)
+    entries = list(entries)
+    extra_hours = list(extra_hours)
+    last_col = 2 + len(entries)
+
+    def cell(value, style=None):
+        c = WriteOnlyCell(ws, value=value)
+        if style:
+            c.style = style
+        return c
+
+    # Column widths and merges must be set before the first row is written
+    ws.column_dimensions['A'].width = 8
+    ws.column_dimensions['B'].width = 10
+    for col in range(3, last_col + 1):
+        ws.column_dimensions[get_column_letter(col)].width = 15
+
+    year = timesheet.year
+    month = timesheet.month
+    _, days_in_month = calendar.monthrange(year, month)
+    total_row = HEADER_ROW + days_in_month + 1
+    grand_total_row = total_row + 1
+    ws.merged_cells.add(f"A{grand_total_row}:B{grand_total_row}")
+    if len(entries) > 1:
+        ws.merged_cells.add(f"C{grand_total_row}:{get_column_letter(last_col)}{grand_total_row}")
+
+    # Title
+    ws.append([cell(f"Cleaner: {timesheet.cleaner_name}", 'ts_title')])
+    ws.append([cell(f"Month: {timesheet.get_month_name()} {year}", 'ts_title')])
+    ws.append([])
+
+    # Headers
+    headers = ['Date', 'Day'] + [entry.company.name for entry in entries]
+    ws.append([cell(header, 'ts_header') for header in headers])
+
+    # Data rows
+    month_hours = [entry.get_month_hundredths() for entry in entries]
+    first_weekday = date(year, month, 1).weekday()
+    for day in range(1, days_in_month + 1):
+        row = [
+            cell(day, 'ts_bordered'),
+            cell(calendar.day_abbr[(first_weekday + day - 1) % 7], 'ts_bordered'),
+        ]
+        for hours_by_day in month_hours:
+            hours = hours_by_day[day - 1]
+            row.append(cell(to_float(hours) if hours else None, 'ts_day_hours'))
+        ws.append(row)
+
+    # Total row
+    grand_total = 0
+    row = [cell("TOTAL", 'ts_bold'), cell("", 'ts_bordered')]
+    for hours_by_day in month_hours:
+        total = sum(hours_by_day)
+        grand_total += total
+        row.append(cell(to_float(total), 'ts_total'))
+    ws.append(row)
+
+    # Grand Total row
+    row = [cell("GRAND TOTAL", 'ts_grand_total'), cell(None, 'ts_grand_total')]
+    if entries:
+        row.append(cell(to_float(grand_total), 'ts_grand_total'))
+        row.extend(cell(None, 'ts_grand_total') for _ in range(len(entries) - 1))
+    ws.append(row)
+
+    # Extra Hours section
+    if extra_hours:
+        ws.append([])
+        ws.append([cell("Extra Hours", 'ts_title')])
+        for eh in extra_hours:
+            ws.append([
+                eh.date.day if eh.date else '',
+                calendar.day_abbr[eh.date.weekday()] if eh.date else '',
+                cell(float(eh.hours), 'ts_hours'),
+                eh.description,
+            ])
+    return ws
+
+
+def build_timesheet_workbook(timesheet, entries=None, extra_hours=None):
+    """Build the standard single-sheet workbook for a timesheet"""
+    if entries is None:
+        entries = timesheet.entries.select_related('company').all()
+    if extra_hours is None:
+        extra_hours = timesheet.extra_hours.all()
+    wb = new_workbook()
+    write_timesheet_sheet(wb, timesheet, entries, extra_hours)
+    return wb
+
+
+def file_response(fileobj, filename, content_type=XLSX_CONTENT_TYPE):
+    """Stream an open xlsx (or other) file back as an attachment"""
+    response = FileResponse(
+        fileobj,
+        as_attachment=True,
+        filename=filename,
+        content_type=content_type,
+    )
+    response.block_size = STREAM_BLOCK_SIZE
+    return response
+
+
+def workbook_response(wb, filename):
+    """Save a workbook to a temporary file and stream it back as an attachment"""
+    spool = tempfile.TemporaryFile()
+    wb.save(spool)
+    spool.seek(0)
+    return file_response(spool, filename)
+
+
+def _with_export_relations(timesheets):
+    from .models import TimesheetEntry
+
+    return timesheets.prefetch_related(
+        Prefetch('entries', queryset=TimesheetEntry.objects.select_related('company')),
+        'extra_hours',
+    )
+
+
+def export_timesheets(year, month, cleaner=None):
+    """Timesheets for a month with everything the export layout needs prefetched"""
+    from .models import Timesheet
+
+    timesheets = Timesheet.objects.filter(year=year, month=month)
+    if cleaner:
+        timesheets = timesheets.filter(cleaner_name=cleaner)
+    return _with_export_relations(timesheets.order_by('cleaner_name', 'id'))
+
+
+def annual_timesheets(year, cleaner=None):
+    """
+    A year's timesheets ordered by cleaner and month, with everything the
+    export layout needs prefetched: three queries however many months and
+    cleaners there are
+    """
+    from .models import Timesheet
+
+    timesheets = Timesheet.objects.filter(year=year)
+    if cleaner:
+        timesheets = timesheets.filter(cleaner_name=cleaner)
+    return _with_export_relations(timesheets.order_by('cleaner_name', 'month', 'id'))
+
+
+def _unique_name(stem, used, ext='', max_length=None):
+    """stem + ext, with a numeric suffix if that name (case-insensitively) is already in `used`"""
+    candidate = f"{stem}{ext}"
+    counter = 2
+    while candidate.lower() in used:
+        suffix = f" ({counter})"
+        trimmed = stem[:max_length - len(suffix)] if max_length else stem
+        candidate = f"{trimmed}{suffix}{ext}"
+        counter += 1
+    used.add(candidate.lower())
+    return candidate
+
+
+def sheet_title(name, used):
+    """A valid, unique (within `used`) Excel sheet title for a cleaner"""
+    title = INVALID_TITLE_CHARS.sub('_', name).strip("' ")[:31] or "Sheet"
+    return _unique_name(title, used, max_length=31)
+
+
+def render_timesheet_xlsx(timesheet):
+    """Render a prefetched timesheet to xlsx bytes without touching the database"""
+    wb = new_workbook()
+    write_timesheet_sheet(wb, timesheet, timesheet.entries.all(), timesheet.extra_hours.all())
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def _render_named(timesheet):
+    return export_filename(timesheet), render_timesheet_xlsx(timesheet)
+
+
+def _init_export_worker():
+    import django
+    django.setup()
+
+
+def export_workers():
+    """Pool size for bulk exports: TIMESHEET_EXPORT_WORKERS, else one per CPU up to DEFAULT_MAX_WORKERS"""
+    workers = getattr(settings, 'TIMESHEET_EXPORT_WORKERS', None) or min(os.cpu_count() or 1, DEFAULT_MAX_WORKERS)
+    return max(1, workers)
+
+
+def map_in_pool(func, items, workers=None):
+    """
+    Yield func(item) for each item, in order, using a process pool for larger
+    batches. Workers are spawned (not forked) so they never share the
+    parent's database connections; items must be picklable. Views pass
+    workers=1: only the job queue and management commands start a pool.
+    """
+    items = list(items)
+    workers = min(workers or export_workers(), len(items))
+    # Spawning workers costs more than rendering a handful of sheets
+    if workers <= 1 or len(items) < POOL_MIN_ITEMS:
+        yield from map(func, items)
+        return
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_export_worker) as executor:
+        yield from executor.map(func, items)
+
+
+class _ChunkBuffer(io.RawIOBase):
+    """Unseekable write target that hands back whatever was written since the last drain"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(named_files):
+    """Yield a ZIP archive chunk by chunk from an iterable of (name, bytes)"""
+    buffer = _ChunkBuffer()
+    used = set()
+    # xlsx files are already deflated, so store them as-is
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+        for name, data in named_files:
+            stem, ext = os.path.splitext(name)
+            archive.writestr(_unique_name(stem, used, ext), data)
+            yield buffer.drain()
+    yield buffer.drain()
+
+
+def render_timesheets(timesheets, workers=None):
+    """Yield (filename, xlsx bytes) per timesheet, rendered across a process pool"""
+    return map_in_pool(_render_named, timesheets, workers)
+
+
+def iter_month_zip(timesheets, workers=None):
+    """ZIP chunks with one workbook per timesheet"""
+    return stream_zip(render_timesheets(timesheets, workers))
+
+
+def build_month_workbook(timesheets):
+    """A single workbook with one sheet per timesheet"""
+    wb = new_workbook()
+    used = set()
+    for timesheet in timesheets:
+        write_timesheet_sheet(
+            wb,
+            timesheet,
+            timesheet.entries.all(),
+            timesheet.extra_hours.all(),
+            title=sheet_title(timesheet.cleaner_name, used),
+        )
+    return wb
+
+
+def annual_export_filename(cleaner, year):
+    return f"{cleaner}_{year}.xlsx"
+
+
+def write_annual_summary_sheet(wb, cleaner, year, timesheets):
+    """Sheet with each company's scheduled hours per month, the extra hours and the monthly totals"""
+    ws = wb.create_sheet(title="Summary")
+    months = range(1, 13)
+
+    def cell(value, style=None):
+        c = WriteOnlyCell(ws, value=value)
+        if style:
+            c.style = style
+        return c
+
+    company_totals = {}
+    extra_totals = [0] * 12
+    for timesheet in timesheets:
+        for entry in timesheet.entries.all():
+            totals = company_totals.setdefault(entry.company.name, [0] * 12)
+            totals[timesheet.month - 1] += sum(entry.get_month_hundredths())
+        for eh in timesheet.extra_hours.all():
+            extra_totals[timesheet.month - 1] += to_hundredths(eh.hours)
+    month_totals = [sum(column) for column in zip(extra_totals, *company_totals.values())]
+
+    ws.column_dimensions['A'].width = 24
+    for col in range(2, 15):
+        ws.column_dimensions[get_column_letter(col)].width = 10
+
+    ws.append([cell(f"Cleaner: {cleaner}", 'ts_title')])
+    ws.append([cell(f"Year: {year}", 'ts_title')])
+    ws.append([])
+    headers = ['Company'] + [calendar.month_abbr[month] for month in months] + ['Total']
+    ws.append([cell(header, 'ts_header') for header in headers])
+
+    def hours_row(label, totals, label_style, style):
+        return (
+            [cell(label, label_style)]
+            + [cell(to_float(hours) if hours else None, style) for hours in totals]
+            + [cell(to_float(sum(totals)), 'ts_total')]
+        )
+
+    for name in sorted(company_totals, key=str.casefold):
+        ws.append(hours_row(name, company_totals[name], 'ts_bordered', 'ts_day_hours'))
+    if any(extra_totals):
+        ws.append(hours_row("Extra Hours", extra_totals, 'ts_bordered', 'ts_day_hours'))
+    row = hours_row("TOTAL", month_totals, 'ts_grand_total', 'ts_grand_total')
+    row[-1] = cell(to_float(sum(month_totals)), 'ts_grand_total')
+    ws.append(row)
+    return ws
+
+
+def build_annual_workbook(cleaner, year, timesheets):
+    """
+    One cleaner's year in a single workbook: the summary, then a sheet per
+    month in the standard layout. `timesheets` must come prefetched (see
+    annual_timesheets); nothing here queries the database.
+    """
+    timesheets = list(timesheets)
+    wb = new_workbook()
+    write_annual_summary_sheet(wb, cleaner, year, timesheets)
+    for timesheet in timesheets:
+        write_timesheet_sheet(
+            wb,
+            timesheet,
+            timesheet.entries.all(),
+            timesheet.extra_hours.all(),
+            title=timesheet.get_month_name(),
+        )
+    return wb
+
+
+def group_by_cleaner(timesheets):
+    """[(cleaner, [timesheets])] for timesheets ordered by cleaner"""
+    return [(cleaner, list(group)) for cleaner, group in groupby(timesheets, key=attrgetter('cleaner_name'))]
+
+
+def _render_annual(item):
+    cleaner, year, timesheets = item
+    buffer = io.BytesIO()
+    build_annual_workbook(cleaner, year, timesheets).save(buffer)
+    return annual_export_filename(cleaner, year), buffer.getvalue()
+
+
+def iter_annual_zip(year, timesheets, workers=None):
+    """ZIP chunks with one annual workbook per cleaner"""
+    items = [(cleaner, year, group) for cleaner, group in group_by_cleaner(timesheets)]
+    return stream_zip(map_in_pool(_render_annual, items, workers))
+
+
+def month_export_basename(year, month, cleaner=None):
+    name = f"Timesheets_{calendar.month_name[month]}_{year}"
+    if cleaner:
+        name = f"{name}_{cleaner}"
+    return name
+
+
+def zip_response(chunks, filename):
+    response = StreamingHttpResponse(chunks, content_type='application/zip')
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    return response
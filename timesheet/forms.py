@@ -1,49 +1,75 @@
 from django import forms
-from .models import Company, Timesheet, TimesheetEntry, ExtraHours
+from django.db.models import Q
+from .models import DAY_NAMES, WEEK_LABELS, Company, Timesheet, TimesheetEntry, ExtraHours
 from django.forms import formset_factory, modelformset_factory
 
-class CompanyForm(forms.ModelForm):
+def _hours_field():
+    # step 0.01 for 2 decimal places
+    return forms.DecimalField(
+        max_digits=5, decimal_places=2, min_value=0, required=False,
+        widget=forms.NumberInput(attrs={'step': '0.01', 'min': '0', 'class': 'hours-input'}),
+    )
+
+
+class CompanyPatternForm(forms.ModelForm):
+    """
+    One hours field per day of a 4-week rotation (named like the old
+    per-day columns), packed into Company.pattern on save. Only the first
+    cycle_weeks weeks are kept.
+    """
+    
     class Meta:
         model = Company
-        fields = [
-            'name', 'pattern_type', 'biweekly_start_date', 'is_active',
-            # Weekly hours
-            'mon_hours', 'tue_hours', 'wed_hours', 'thu_hours', 'fri_hours', 'sat_hours', 'sun_hours',
-            # Bi-weekly Week A
-            'mon_hours_week_a', 'tue_hours_week_a', 'wed_hours_week_a', 'thu_hours_week_a',
-            'fri_hours_week_a', 'sat_hours_week_a', 'sun_hours_week_a',
-            # Bi-weekly Week B
-            'mon_hours_week_b', 'tue_hours_week_b', 'wed_hours_week_b', 'thu_hours_week_b',
-            'fri_hours_week_b', 'sat_hours_week_b', 'sun_hours_week_b',
+        fields = ['name', 'cycle_weeks', 'cycle_start_date', 'is_active']
+    
+    @staticmethod
+    def day_field_name(week, weekday):
+        return f'{DAY_NAMES[weekday]}_hours_week_{WEEK_LABELS[week].lower()}'
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for week in range(len(WEEK_LABELS)):
+            for weekday in range(7):
+                self.fields[self.day_field_name(week, weekday)].initial = self.instance.get_hours(week, weekday)
+    
+    def weeks(self):
+        """[(week label, [bound fields Monday..Sunday])] for the templates"""
+        return [
+            (label, [self[self.day_field_name(week, weekday)] for weekday in range(7)])
+            for week, label in enumerate(WEEK_LABELS)
         ]
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        cycle_weeks = cleaned_data.get('cycle_weeks')
+        
+        if cycle_weeks and cycle_weeks > 1 and not cleaned_data.get('cycle_start_date'):
+            self.add_error('cycle_start_date', 'Start date is required for rotations of 2 or more weeks')
+        
+        return cleaned_data
+    
+    def save(self, commit=True):
+        self.instance.pattern = []
+        for week in range(self.instance.cycle_weeks):
+            for weekday in range(7):
+                self.instance.set_hours(week, weekday, self.cleaned_data.get(self.day_field_name(week, weekday)))
+        return super().save(commit)
+
+
+# The day fields, mon_hours_week_a .. sun_hours_week_d, in week order; set on
+# declared_fields too so CompanyForm inherits them
+for _week in range(len(WEEK_LABELS)):
+    for _weekday in range(len(DAY_NAMES)):
+        _name = CompanyPatternForm.day_field_name(_week, _weekday)
+        CompanyPatternForm.base_fields[_name] = CompanyPatternForm.declared_fields[_name] = _hours_field()
+
+
+class CompanyForm(CompanyPatternForm):
+    class Meta(CompanyPatternForm.Meta):
         widgets = {
             'name': forms.TextInput(attrs={'placeholder': 'Company Name'}),
-            'pattern_type': forms.Select(attrs={'class': 'pattern-select'}),
-            'biweekly_start_date': forms.DateInput(attrs={'type': 'date'}),
-            # Weekly hours - step 0.01 for 2 decimal places
-            'mon_hours': forms.NumberInput(attrs={'step': '0.01', 'min': '0', 'class': 'hours-input'}),
-            'tue_hours': forms.NumberInput(attrs={'step': '0.01', 'min': '0', 'class': 'hours-input'}),
-            'wed_hours': forms.NumberInput(attrs={'step': '0.01', 'min': '0', 'class': 'hours-input'}),
-            'thu_hours': forms.NumberInput(attrs={'step': '0.01', 'min': '0', 'class': 'hours-input'}),
-            'fri_hours': forms.NumberInput(attrs={'step': '0.01', 'min': '0', 'class': 'hours-input'}),
-            'sat_hours': forms.NumberInput(attrs={'step': '0.01', 'min': '0', 'class': 'hours-input'}),
-            'sun_hours': forms.NumberInput(attrs={'step': '0.01', 'min': '0', 'class': 'hours-input'}),
-            # Week A
-            'mon_hours_week_a': forms.NumberInput(attrs={'step': '0.01', 'min': '0', 'class': 'hours-input'}),
-            'tue_hours_week_a': forms.NumberInput(attrs={'step': '0.01', 'min': '0', 'class': 'hours-input'}),
-            'wed_hours_week_a': forms.NumberInput(attrs={'step': '0.01', 'min': '0', 'class': 'hours-input'}),
-            'thu_hours_week_a': forms.NumberInput(attrs={'step': '0.01', 'min': '0', 'class': 'hours-input'}),
-            'fri_hours_week_a': forms.NumberInput(attrs={'step': '0.01', 'min': '0', 'class': 'hours-input'}),
-            'sat_hours_week_a': forms.NumberInput(attrs={'step': '0.01', 'min': '0', 'class': 'hours-input'}),
-            'sun_hours_week_a': forms.NumberInput(attrs={'step': '0.01', 'min': '0', 'class': 'hours-input'}),
-            # Week B
-            'mon_hours_week_b': forms.NumberInput(attrs={'step': '0.01', 'min': '0', 'class': 'hours-input'}),
-            'tue_hours_week_b': forms.NumberInput(attrs={'step': '0.01', 'min': '0', 'class': 'hours-input'}),
-            'wed_hours_week_b': forms.NumberInput(attrs={'step': '0.01', 'min': '0', 'class': 'hours-input'}),
-            'thu_hours_week_b': forms.NumberInput(attrs={'step': '0.01', 'min': '0', 'class': 'hours-input'}),
-            'fri_hours_week_b': forms.NumberInput(attrs={'step': '0.01', 'min': '0', 'class': 'hours-input'}),
-            'sat_hours_week_b': forms.NumberInput(attrs={'step': '0.01', 'min': '0', 'class': 'hours-input'}),
-            'sun_hours_week_b': forms.NumberInput(attrs={'step': '0.01', 'min': '0', 'class': 'hours-input'}),
+            'cycle_weeks': forms.Select(attrs={'class': 'pattern-select'}),
+            'cycle_start_date': forms.DateInput(attrs={'type': 'date'}),
         }
 
     def clean_name(self):
@@ -57,16 +83,6 @@ class CompanyForm(forms.ModelForm):
                 raise forms.ValidationError(f'A company with the name "{name}" already exists.')
         return name
 
-    def clean(self):
-        cleaned_data = super().clean()
-        pattern_type = cleaned_data.get('pattern_type')
-        biweekly_start_date = cleaned_data.get('biweekly_start_date')
-        
-        if pattern_type == 'biweekly' and not biweekly_start_date:
-            self.add_error('biweekly_start_date', 'Start date is required for bi-weekly patterns')
-        
-        return cleaned_data
-
 
 class CompanySelectForm(forms.Form):
     company = forms.ModelChoiceField(
@@ -118,6 +134,52 @@ class ExtraHoursForm(forms.ModelForm):
         
         return cleaned_data
 
+class ExtraHoursEditForm(forms.ModelForm):
+    """One extra-hours row added or changed in place on the timesheet detail page"""
+    class Meta:
+        model = ExtraHours
+        fields = ['company', 'date', 'hours', 'description']
+    
+    def __init__(self, *args, timesheet, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.instance.timesheet = timesheet
+        # Rows keep their company if it has been deactivated since
+        self.fields['company'].queryset = Company.objects.filter(Q(is_active=True) | Q(pk=self.instance.company_id))
+        self.fields['date'].required = True
+    
+    def clean_date(self):
+        value = self.cleaned_data['date']
+        timesheet = self.instance.timesheet
+        if (value.year, value.month) != (timesheet.year, timesheet.month):
+            raise forms.ValidationError(f'Pick a date in {timesheet.get_month_name()} {timesheet.year}.')
+        return value
+    
+    def clean_hours(self):
+        value = self.cleaned_data['hours']
+        if value is None or value <= 0:
+            raise forms.ValidationError('Hours must be more than 0.')
+        return value
+
+
+class TimesheetEntryForm(forms.ModelForm):
+    """Adds a company to an existing timesheet, or swaps the company of one of its entries"""
+    class Meta:
+        model = TimesheetEntry
+        fields = ['company']
+    
+    def __init__(self, *args, timesheet, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.instance.timesheet = timesheet
+        # Rows keep their company if it has been deactivated since
+        self.fields['company'].queryset = Company.objects.filter(Q(is_active=True) | Q(pk=self.instance.company_id))
+    
+    def clean_company(self):
+        company = self.cleaned_data['company']
+        entries = self.instance.timesheet.entries.filter(company=company).exclude(pk=self.instance.pk)
+        if entries.exists():
+            raise forms.ValidationError(f'{company.name} is already on this timesheet.')
+        return company
+
 ExtraHoursFormSet = modelformset_factory(
     ExtraHours,
     form=ExtraHoursForm,
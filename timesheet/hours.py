@@ -0,0 +1,53 @@
+# timesheet/hours.py
+"""
+Hours arithmetic in integer hundredths of an hour.
+
+Every hours value the app stores has two decimal places (the DecimalFields,
+company patterns and entry snapshots), so as hundredths they add up exactly
+as plain ints, which is several times cheaper than Decimal. Values are
+converted with to_hundredths() on the way in and to_decimal() / to_float()
+only where they are displayed, serialized or saved.
+
+Rounding matches the Decimal code it replaces: to_hundredths() rounds half
+up like quantize(Decimal('0.01'), ROUND_HALF_UP), and since stored values
+never have more than two places, rounding each value and then adding gives
+the same total as adding Decimals and quantizing the sum.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db.models import F, IntegerField
+from django.db.models.functions import Cast, Round
+
+
+def to_hundredths(hours):
+    """Decimal, int, float or str hours -> int hundredths (None counts as 0)"""
+    if not hours:
+        return 0
+    if isinstance(hours, int):
+        return hours * 100
+    if not isinstance(hours, Decimal):
+        hours = Decimal(str(hours))
+    return int((hours * 100).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def to_decimal(hundredths):
+    """Int hundredths -> Decimal with two places, e.g. 250 -> Decimal('2.50')"""
+    return Decimal(hundredths).scaleb(-2)
+
+
+def to_float(hundredths):
+    return hundredths / 100
+
+
+def total(values):
+    """Sum of Decimal (or other) hours values, as hundredths"""
+    return sum(map(to_hundredths, values))
+
+
+def hundredths_of(field):
+    """
+    Query expression for a two-place hours column as int hundredths, for
+    values_list() / aggregates over many rows: the database does the
+    conversion, which is cheaper than building a Decimal per row
+    """
+    return Cast(Round(F(field) * 100), IntegerField())
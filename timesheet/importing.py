@@ -0,0 +1,260 @@
+# timesheet/importing.py
+"""
+Streaming importer for historical timesheets, used by the
+import_timesheets command.
+
+Input is read one row at a time, each row describing a whole timesheet:
+
+    CSV:   cleaner,year,month,companies,extra_hours
+           companies   - company names separated by ';'
+           extra_hours - items separated by ';', each 'date|hours|company|description'
+                         (date, company and description may be left empty)
+    JSONL: {"cleaner": ..., "year": ..., "month": ...,
+            "companies": [names], "extra_hours": [{"date", "hours", "company", "description"}]}
+
+Company names are matched case-insensitively against an index loaded once.
+Valid rows are written batch_size timesheets at a time, each batch in one
+transaction with bulk_create, so memory is bounded by the batch size.
+"""
+import csv
+import json
+from datetime import date
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .models import Company, ExtraHours, Timesheet, TimesheetEntry
+from .rollups import keys_filter, refresh_rollups
+from .hours import to_decimal, to_hundredths
+from .schedule import encode_hours
+from .schedule_cache import schedule_cache
+
+BATCH_SIZE = 1000
+# Errors kept with their line numbers; the rest are only counted
+MAX_ERRORS = 100
+MAX_HOURS = Decimal('999.99')
+CLEANER_NAME_MAX_LENGTH = Timesheet._meta.get_field('cleaner_name').max_length
+
+
+def read_rows(fileobj, fmt):
+    """Yield (line number, row dict) from a CSV or JSON-lines text stream"""
+    if fmt == 'csv':
+        reader = csv.DictReader(fileobj)
+        for row in reader:
+            yield reader.line_num, {
+                'cleaner': row.get('cleaner'),
+                'year': row.get('year'),
+                'month': row.get('month'),
+                'companies': [name for name in (row.get('companies') or '').split(';') if name.strip()],
+                'extra_hours': [_parse_extra_item(item) for item in (row.get('extra_hours') or '').split(';') if item.strip()],
+            }
+    elif fmt == 'jsonl':
+        for line_num, line in enumerate(fileobj, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_num, ValidationError(f"Invalid JSON: {e}")
+                continue
+            yield line_num, row
+    else:
+        raise ValueError(f"Unknown import format: {fmt}")
+
+
+def _parse_extra_item(item):
+    parts = (item.split('|') + ['', '', '', ''])[:4]
+    return {'date': parts[0], 'hours': parts[1], 'company': parts[2], 'description': parts[3]}
+
+
+class CompanyIndex:
+    """Case-insensitive name -> Company lookup, with month snapshots memoized"""
+
+    def __init__(self, companies=None):
+        if companies is None:
+            companies = Company.objects.all()
+        self.by_name = {company.name.strip().casefold(): company for company in companies}
+        self._versions = None
+        self._snapshots = {}
+
+    def get(self, name):
+        company = self.by_name.get(str(name).strip().casefold())
+        if company is None:
+            raise ValidationError(f"Unknown company: {name!r}")
+        return company
+
+    def month_snapshot(self, company, year, month):
+        """(encoded daily hundredths, total hundredths) of the company's pattern for the month"""
+        key = (company.pk, year, month)
+        snapshot = self._snapshots.get(key)
+        if snapshot is None:
+            if self._versions is None:
+                # One version lookup for the whole import
+                self._versions = schedule_cache.versions(self.by_name.values())
+            hours = schedule_cache.month_vector(company, year, month, self._versions.get(company.pk))
+            snapshot = self._snapshots[key] = (encode_hours(hours), sum(hours))
+        return snapshot
+
+
+def _int(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValidationError(f"Invalid {name}: {value!r}")
+
+
+def _hours(value):
+    try:
+        hours = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise ValidationError(f"Invalid hours: {value!r}")
+    if not hours.is_finite() or not Decimal('0') <= hours <= MAX_HOURS:
+        raise ValidationError(f"Hours out of range: {value!r}")
+    return hours.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def build_timesheet(row, index):
+    """
+    Validate one row. Returns a plain (timesheet fields, entry rows, extra
+    hours rows) tuple, or raises ValidationError; model instances are only
+    built when a batch is written.
+    """
+    if isinstance(row, ValidationError):
+        raise row
+    if not isinstance(row, dict):
+        raise ValidationError("Row must be an object")
+    cleaner = str(row.get('cleaner') or '').strip()
+    if not cleaner:
+        raise ValidationError("Missing cleaner")
+    if len(cleaner) > CLEANER_NAME_MAX_LENGTH:
+        raise ValidationError("Cleaner name is too long")
+    year = _int(row.get('year'), 'year')
+    month = _int(row.get('month'), 'month')
+    if not 1 <= month <= 12 or not 1900 <= year <= 9999:
+        raise ValidationError(f"Invalid month: {year}-{month}")
+
+    companies = row.get('companies') or []
+    if not isinstance(companies, list):
+        raise ValidationError("Companies must be a list of names")
+    extra_hours = row.get('extra_hours') or []
+    if not isinstance(extra_hours, list):
+        raise ValidationError("Extra hours must be a list")
+
+    total = 0
+    entries = {}
+    for name in companies:
+        company = index.get(name)
+        if company.pk not in entries:
+            entries[company.pk] = index.month_snapshot(company, year, month)
+            total += entries[company.pk][1]
+
+    extras = []
+    for item in extra_hours:
+        if not isinstance(item, dict):
+            raise ValidationError("Extra hours must be objects")
+        day = item.get('date') or None
+        if day:
+            try:
+                day = date.fromisoformat(str(day).strip())
+            except ValueError:
+                raise ValidationError(f"Invalid date: {day!r}")
+        hours = _hours(item.get('hours'))
+        company_id = index.get(item['company']).pk if item.get('company') else None
+        extras.append((company_id, day, hours, str(item.get('description') or '')))
+        total += to_hundredths(hours)
+
+    timesheet = (cleaner, year, month, to_decimal(total))
+    entries = [(company_id, snapshot, to_decimal(hours)) for company_id, (snapshot, hours) in entries.items()]
+    return timesheet, entries, extras
+
+
+@transaction.atomic
+def _write_batch(batch):
+    timesheets = Timesheet.objects.bulk_create([
+        Timesheet(cleaner_name=cleaner, year=year, month=month, total_hours=total)
+        for (cleaner, year, month, total), _, _ in batch
+    ])
+    entries = []
+    extras = []
+    for timesheet, (_, entry_rows, extra_rows) in zip(timesheets, batch):
+        pk = timesheet.pk
+        entries.extend(
+            TimesheetEntry(timesheet_id=pk, company_id=company_id, hours_snapshot=snapshot, total_hours=total)
+            for company_id, snapshot, total in entry_rows
+        )
+        extras.extend(
+            ExtraHours(timesheet_id=pk, company_id=company_id, date=day, hours=hours, description=description)
+            for company_id, day, hours, description in extra_rows
+        )
+    TimesheetEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+    ExtraHours.objects.bulk_create(extras, batch_size=BATCH_SIZE)
+    cleaner_keys = set()
+    company_keys = set()
+    for (cleaner, year, month, _), entry_rows, extra_rows in batch:
+        cleaner_keys.add((cleaner, year, month))
+        company_keys.update((row[0], year, month) for row in entry_rows)
+        company_keys.update((row[0], year, month) for row in extra_rows if row[0])
+    refresh_rollups(cleaner_keys, company_keys)
+    return len(entries), len(extras)
+
+
+def import_timesheets(rows, batch_size=BATCH_SIZE, dry_run=False, index=None, on_batch=None, max_errors=MAX_ERRORS):
+    """
+    Import (line number, row) pairs from read_rows(). Invalid rows, and rows
+    for a cleaner and month that already has a timesheet, are skipped and
+    counted in the returned stats as error_count; the first max_errors of
+    them are kept in stats['errors'] as (line number, message).
+    on_batch(stats) is called after every written batch.
+    """
+    index = index or CompanyIndex()
+    stats = {'rows': 0, 'timesheets': 0, 'entries': 0, 'extra_hours': 0, 'error_count': 0, 'errors': []}
+    batch = []
+    # (cleaner, year, month) -> line number, for the rows in the current batch
+    pending = {}
+
+    def error(line_num, message):
+        stats['error_count'] += 1
+        if len(stats['errors']) < max_errors:
+            stats['errors'].append((line_num, message))
+
+    def flush():
+        # Earlier batches are committed, so this also catches repeats across batches
+        existing = set(
+            Timesheet.objects.filter(keys_filter(pending, 'cleaner_name'))
+            .values_list('cleaner_name', 'year', 'month')
+        )
+        for key in existing:
+            error(pending[key], "A timesheet for this cleaner and month already exists")
+        batch[:] = [item for item in batch if item[0][:3] not in existing]
+        if not dry_run:
+            entry_count, extra_count = _write_batch(batch)
+        else:
+            entry_count = sum(len(entries) for _, entries, _ in batch)
+            extra_count = sum(len(extras) for _, _, extras in batch)
+        stats['timesheets'] += len(batch)
+        stats['entries'] += entry_count
+        stats['extra_hours'] += extra_count
+        batch.clear()
+        pending.clear()
+        if on_batch:
+            on_batch(stats)
+
+    for line_num, row in rows:
+        stats['rows'] += 1
+        try:
+            item = build_timesheet(row, index)
+            key = item[0][:3]
+            if key in pending:
+                raise ValidationError(f"Duplicate of line {pending[key]}")
+        except ValidationError as e:
+            error(line_num, '; '.join(e.messages))
+            continue
+        pending[key] = line_num
+        batch.append(item)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    stats['errors'].sort()
+    return stats
@@ -0,0 +1,233 @@
+# timesheet/jobs.py
+"""
+Database-backed queue for long-running exports.
+
+Views enqueue an ExportJob and return immediately; the run_export_worker
+command claims queued jobs and runs several at once in a thread pool (the
+month exports still render their workbooks in the process pool from
+timesheet/exports.py). Claiming is a conditional UPDATE, so any number of
+workers can poll the same table. Running jobs touch updated_at as they
+make progress, which lets a restarted worker requeue jobs whose worker died.
+"""
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from .exports import (
+    build_month_workbook, build_timesheet_workbook, export_filename, export_timesheets,
+    month_export_basename, render_timesheets, stream_zip,
+)
+from .models import ExportJob, Timesheet
+
+MONTH_FORMATS = ('zip', 'workbook')
+# Seconds between progress writes while a job runs
+PROGRESS_INTERVAL = 1.0
+
+
+def job_directory():
+    return Path(settings.TIMESHEET_EXPORT_JOB_DIR)
+
+
+def job_path(job):
+    """Where the finished file of `job` is stored"""
+    return job_directory() / f"job-{job.pk}{os.path.splitext(job.filename)[1]}"
+
+
+def enqueue_export(kind, params):
+    """Validate the parameters of an export and queue it"""
+    if kind == 'timesheet':
+        try:
+            timesheet_id = int(params.get('timesheet_id'))
+        except (TypeError, ValueError):
+            raise ValidationError("timesheet_id is required")
+        if not Timesheet.objects.filter(pk=timesheet_id).exists():
+            raise ValidationError(f"Unknown timesheet: {timesheet_id}")
+        params = {'timesheet_id': timesheet_id}
+    elif kind == 'month':
+        try:
+            year, month = int(params.get('year')), int(params.get('month'))
+        except (TypeError, ValueError):
+            raise ValidationError("year and month are required")
+        if not 1 <= month <= 12:
+            raise ValidationError("month must be between 1 and 12")
+        export_format = params.get('format') or 'zip'
+        if export_format not in MONTH_FORMATS:
+            raise ValidationError('format must be "zip" or "workbook"')
+        params = {'year': year, 'month': month, 'cleaner': params.get('cleaner') or None, 'format': export_format}
+    else:
+        raise ValidationError(f"Unknown export kind: {kind}")
+    return ExportJob.objects.create(kind=kind, params=params)
+
+
+def claim_next_job(worker_name):
+    """Mark the oldest queued job as running for this worker and return it, or None"""
+    while True:
+        pk = (
+            ExportJob.objects.filter(status='queued')
+            .order_by('created_at', 'pk').values_list('pk', flat=True).first()
+        )
+        if pk is None:
+            return None
+        claimed = ExportJob.objects.filter(pk=pk, status='queued').update(
+            status='running', worker=worker_name, started_at=timezone.now(), updated_at=timezone.now(),
+        )
+        if claimed:
+            return ExportJob.objects.get(pk=pk)
+        # Another worker got it first; try the next one
+
+
+class _Progress:
+    """Counts finished items and writes the count to the job at most every PROGRESS_INTERVAL seconds"""
+
+    def __init__(self, job):
+        self.job = job
+        self.count = 0
+        self.last_write = 0.0
+
+    def track(self, items):
+        for item in items:
+            yield item
+            self.count += 1
+            now = time.monotonic()
+            if now - self.last_write >= PROGRESS_INTERVAL:
+                self.last_write = now
+                ExportJob.objects.filter(pk=self.job.pk).update(progress=self.count, updated_at=timezone.now())
+
+
+def _set_total(job, total):
+    job.total = total
+    ExportJob.objects.filter(pk=job.pk).update(total=total, updated_at=timezone.now())
+
+
+def _write_file(job, filename, write):
+    """Create the job's file through a temporary name so readers never see a partial file"""
+    job.filename = filename
+    path = job_path(job)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + '.tmp')
+    try:
+        with open(tmp_path, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def _run_timesheet_export(job, progress):
+    timesheet = Timesheet.objects.get(pk=job.params['timesheet_id'])
+    _set_total(job, 1)
+    wb = build_timesheet_workbook(timesheet)
+    _write_file(job, export_filename(timesheet), wb.save)
+    progress.count = 1
+
+
+def _run_month_export(job, progress, workers=None):
+    params = job.params
+    timesheets = list(export_timesheets(params['year'], params['month'], params['cleaner']))
+    _set_total(job, len(timesheets))
+    basename = month_export_basename(params['year'], params['month'], params['cleaner'])
+    if params['format'] == 'workbook':
+        wb = build_month_workbook(progress.track(timesheets))
+        _write_file(job, f"{basename}.xlsx", wb.save)
+    else:
+        def write_zip(f):
+            for chunk in stream_zip(progress.track(render_timesheets(timesheets, workers))):
+                f.write(chunk)
+        _write_file(job, f"{basename}.zip", write_zip)
+
+
+def run_job(job, workers=None):
+    """Run a claimed job to completion, recording the result or the error on it"""
+    progress = _Progress(job)
+    try:
+        if job.kind == 'timesheet':
+            _run_timesheet_export(job, progress)
+        else:
+            _run_month_export(job, progress, workers)
+    except Exception as e:
+        ExportJob.objects.filter(pk=job.pk).update(
+            status='failed', error=f"{type(e).__name__}: {e}", progress=progress.count,
+            finished_at=timezone.now(), updated_at=timezone.now(),
+        )
+        return False
+    ExportJob.objects.filter(pk=job.pk).update(
+        status='done', filename=job.filename, progress=progress.count,
+        finished_at=timezone.now(), updated_at=timezone.now(),
+    )
+    return True
+
+
+def requeue_stale_jobs(max_age):
+    """Put running jobs without progress for `max_age` back in the queue (their worker died)"""
+    cutoff = timezone.now() - max_age
+    return ExportJob.objects.filter(status='running', updated_at__lt=cutoff).update(
+        status='queued', worker='', progress=0, updated_at=timezone.now(),
+    )
+
+
+def purge_finished_jobs(max_age):
+    """Delete finished jobs older than max_age together with their files"""
+    cutoff = timezone.now() - max_age
+    jobs = list(ExportJob.objects.filter(status__in=['done', 'failed'], finished_at__lt=cutoff))
+    for job in jobs:
+        if job.filename:
+            job_path(job).unlink(missing_ok=True)
+    ExportJob.objects.filter(pk__in=[job.pk for job in jobs]).delete()
+    return len(jobs)
+
+
+def _run_in_thread(job, workers, log):
+    try:
+        ok = run_job(job, workers)
+        log(f"Finished {job.get_kind_display().lower()} #{job.pk}: {'done' if ok else 'failed'}")
+        return ok
+    finally:
+        # Each thread has its own connection; don't leave it open
+        connection.close()
+
+
+def run_worker(concurrency=2, poll_interval=2.0, once=False, render_workers=None, log=None,
+               stop_event=None):
+    """
+    Claim and run jobs until stopped, at most `concurrency` at a time. With
+    once=True, return after the queue has been drained.
+    """
+    log = log or (lambda message: None)
+    stop_event = stop_event or threading.Event()
+    worker_name = f"{socket.gethostname()}:{os.getpid()}"
+    stale_after = timedelta(seconds=settings.TIMESHEET_EXPORT_JOB_STALE_SECONDS)
+    keep_for = timedelta(seconds=settings.TIMESHEET_EXPORT_JOB_TTL_SECONDS)
+
+    requeued = requeue_stale_jobs(stale_after)
+    if requeued:
+        log(f"Requeued {requeued} stale job(s)")
+
+    running = set()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while not stop_event.is_set():
+            running = {future for future in running if not future.done()}
+            job = None
+            if len(running) < concurrency:
+                close_old_connections()
+                job = claim_next_job(worker_name)
+            if job is not None:
+                log(f"Running {job}")
+                running.add(executor.submit(_run_in_thread, job, render_workers, log))
+                continue
+            if once and not running:
+                break
+            if not running:
+                purged = purge_finished_jobs(keep_for)
+                if purged:
+                    log(f"Purged {purged} finished job(s)")
+            stop_event.wait(poll_interval)
@@ -0,0 +1,246 @@
+# timesheet/loadtest.py
+"""
+HTTP load generator used by the loadtest command.
+
+Each simulated client is a thread with its own keep-alive connection and
+cookie jar, looping over a weighted mix of requests (timesheet list,
+timesheet detail, Excel download, timesheet creation) until the run ends.
+Latency is measured per request from send to last byte read. Samples taken
+during the warm-up are dropped so import time and cold caches do not skew
+the percentiles.
+
+The clients only speak plain HTTP/1.1, so they work against any server:
+the gunicorn started by the command or an already running deployment.
+"""
+import http.client
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+REQUEST_KINDS = ('list', 'detail', 'excel', 'create')
+DEFAULT_MIX = 'list=40,detail=40,excel=15,create=5'
+# Status each kind answers with when it works (creating a timesheet redirects to it)
+EXPECTED_STATUS = {'list': 200, 'detail': 200, 'excel': 200, 'create': 302}
+PERCENTILES = (50, 90, 95, 99)
+
+COMPANIES_PER_TIMESHEET = 3
+REQUEST_TIMEOUT = 60
+
+CSRF_TOKEN_RE = re.compile(rb'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+
+def parse_mix(value):
+    """'list=40,detail=40,...' -> {'list': 40, ...}; raises ValueError on unknown kinds or bad weights"""
+    mix = {}
+    for part in value.split(','):
+        if not part.strip():
+            continue
+        kind, _, weight = part.partition('=')
+        kind = kind.strip()
+        if kind not in REQUEST_KINDS:
+            raise ValueError(f"Unknown request kind '{kind}' (choose from {', '.join(REQUEST_KINDS)})")
+        try:
+            mix[kind] = float(weight)
+        except ValueError:
+            raise ValueError(f"Weight of '{kind}' must be a number")
+        if mix[kind] < 0:
+            raise ValueError(f"Weight of '{kind}' must not be negative")
+    if not any(mix.values()):
+        raise ValueError("The mix needs at least one positive weight")
+    return {kind: weight for kind, weight in mix.items() if weight}
+
+
+class LoadClient:
+    """One simulated user: a keep-alive connection plus the cookies the app sets"""
+
+    def __init__(self, base_url, targets, rng, name):
+        url = urlsplit(base_url)
+        self.connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=REQUEST_TIMEOUT)
+        self.prefix = url.path.rstrip('/')
+        self.targets = targets
+        self.rng = rng
+        self.name = name
+        self.cookies = {}
+        self.csrf_token = None
+        self.created = 0
+
+    def request(self, method, path, body=None, headers=None):
+        """Send one request and read the whole response; returns (status, body)"""
+        headers = dict(headers or {})
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f"{name}={value}" for name, value in self.cookies.items())
+        try:
+            self.connection.request(method, self.prefix + path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            content = response.read()
+        except (OSError, http.client.HTTPException):
+            # Start over on a fresh connection next time
+            self.connection.close()
+            raise
+        for header in response.msg.get_all('Set-Cookie') or ():
+            for name, morsel in SimpleCookie(header).items():
+                if morsel.value and morsel['max-age'] != '0':
+                    self.cookies[name] = morsel.value
+                else:
+                    self.cookies.pop(name, None)
+        return response.status, content
+
+    def prepare(self, mix):
+        """Fetch the CSRF token the create form needs, outside the measured requests"""
+        if 'create' in mix:
+            _, content = self.request('GET', '/create/')
+            match = CSRF_TOKEN_RE.search(content)
+            if match is None:
+                raise RuntimeError("No CSRF token on the create page")
+            self.csrf_token = match.group(1).decode()
+
+    def send(self, kind):
+        """Issue one request of the given kind; returns its HTTP status"""
+        if kind == 'list':
+            return self.request('GET', '/')[0]
+        if kind == 'detail':
+            return self.request('GET', f"/timesheet/{self.rng.choice(self.targets['timesheets'])}/")[0]
+        if kind == 'excel':
+            return self.request('GET', f"/timesheet/{self.rng.choice(self.targets['timesheets'])}/excel/")[0]
+
+        self.created += 1
+        companies = self.rng.sample(self.targets['companies'], min(COMPANIES_PER_TIMESHEET, len(self.targets['companies'])))
+        body = urlencode([
+            ('csrfmiddlewaretoken', self.csrf_token),
+            ('cleaner_name', f"{self.name}-{self.created}"),
+            ('month', self.rng.randint(1, 12)),
+            ('year', self.rng.randint(2024, 2026)),
+        ] + [('companies', pk) for pk in companies])
+        return self.request('POST', '/create/', body=body, headers={
+            'Content-Type': 'application/x-www-form-urlencoded',
+        })[0]
+
+    def close(self):
+        self.connection.close()
+
+
+def discover_targets(base_url):
+    """Ids of the timesheets and active companies the clients pick from, read through the app's own API"""
+    client = LoadClient(base_url, {}, random.Random(), 'discover')
+    try:
+        status, content = client.request('GET', '/api/timesheets/?fields=id&stream=1')
+        if status != 200:
+            raise RuntimeError(f"GET /api/timesheets/ answered {status}")
+        timesheets = [row['id'] for row in json.loads(content)['results']]
+        status, content = client.request('GET', '/api/company-patterns/')
+        if status != 200:
+            raise RuntimeError(f"GET /api/company-patterns/ answered {status}")
+        companies = [row['id'] for row in json.loads(content)['companies']]
+    finally:
+        client.close()
+    if not timesheets or not companies:
+        raise RuntimeError("The app has no timesheets or no active companies to load-test with")
+    return {'timesheets': timesheets, 'companies': companies}
+
+
+def _client_loop(client, kinds, weights, start_barrier, window, samples):
+    """Send requests until the window closes, appending (kind, started, seconds, status) to samples"""
+    start_barrier.wait()
+    warmup_end, deadline = window
+    rng = client.rng
+    while True:
+        started = time.perf_counter()
+        if started >= deadline:
+            break
+        kind = rng.choices(kinds, weights)[0]
+        try:
+            status = client.send(kind)
+        except (OSError, http.client.HTTPException):
+            status = None
+        if started >= warmup_end:
+            samples.append((kind, started, time.perf_counter() - started, status))
+
+
+def run_load(base_url, mix, clients=16, duration=30.0, warmup=5.0, seed=0, targets=None):
+    """
+    Drive `clients` concurrent clients against base_url for warmup + duration
+    seconds and return the summary of the measured part (see summarize())
+    """
+    targets = targets or discover_targets(base_url)
+    run_tag = uuid.uuid4().hex[:6]
+    load_clients = [
+        LoadClient(base_url, targets, random.Random(f"{seed}-{i}"), f"Load {run_tag} {i}")
+        for i in range(clients)
+    ]
+    for client in load_clients:
+        client.prepare(mix)
+
+    kinds, weights = list(mix), list(mix.values())
+    start_barrier = threading.Barrier(clients + 1)
+    window = [0.0, 0.0]
+    per_client = [[] for _ in load_clients]
+    threads = [
+        threading.Thread(target=_client_loop, args=(client, kinds, weights, start_barrier, window, samples), daemon=True)
+        for client, samples in zip(load_clients, per_client)
+    ]
+    for thread in threads:
+        thread.start()
+    now = time.perf_counter()
+    window[:] = [now + warmup, now + warmup + duration]
+    start_barrier.wait()
+    for thread in threads:
+        thread.join()
+    for client in load_clients:
+        client.close()
+
+    # Requests still running when the window closed are measured too
+    measured_until = max([window[1]] + [started + seconds for samples in per_client for _, started, seconds, _ in samples])
+    samples = [sample for client_samples in per_client for sample in client_samples]
+    return summarize(samples, measured_until - window[0])
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def _stats(samples, elapsed):
+    latencies = sorted(seconds * 1000 for _, _, seconds, _ in samples)
+    errors = sum(1 for kind, _, _, status in samples if status != EXPECTED_STATUS[kind])
+    statuses = {}
+    for _, _, _, status in samples:
+        key = str(status) if status is not None else 'connection error'
+        statuses[key] = statuses.get(key, 0) + 1
+    count = len(samples)
+    return {
+        'requests': count,
+        'errors': errors,
+        'error_rate': round(errors / count, 4) if count else None,
+        'rps': round(count / elapsed, 2) if elapsed else None,
+        'latency_ms': {
+            'mean': round(sum(latencies) / count, 2) if count else None,
+            **{f"p{pct}": _round(percentile(latencies, pct)) for pct in PERCENTILES},
+            'max': _round(latencies[-1] if latencies else None),
+        },
+        'statuses': dict(sorted(statuses.items())),
+    }
+
+
+def _round(value):
+    return None if value is None else round(value, 2)
+
+
+def summarize(samples, elapsed):
+    """Throughput, error rate and latency percentiles overall and per request kind"""
+    return {
+        'seconds': round(elapsed, 2),
+        'overall': _stats(samples, elapsed),
+        'by_kind': {
+            kind: _stats([sample for sample in samples if sample[0] == kind], elapsed)
+            for kind in REQUEST_KINDS
+            if any(sample[0] == kind for sample in samples)
+        },
+    }
@@ -0,0 +1,88 @@
+# timesheet/management/commands/benchmark.py
+import json
+import platform
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from timesheet.benchmarks import SCALES, run_suite
+from timesheet.seeding import seed
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the timesheet hot paths at several data scales and print JSON. "
+        "Runs against a throwaway test database, cache and export directories, never the real ones."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scales', default='small,medium',
+            help=f"Comma-separated scales to run ({', '.join(SCALES)})",
+        )
+        parser.add_argument('--repeat', type=int, default=5, help="Timed repeats per benchmark")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed for the data generator")
+        parser.add_argument('--output', help="Write JSON here instead of stdout")
+
+    def handle(self, *args, **options):
+        scales = [name.strip() for name in options['scales'].split(',') if name.strip()]
+        unknown = [name for name in scales if name not in SCALES]
+        if unknown:
+            raise CommandError(f"Unknown scale(s): {', '.join(unknown)}")
+
+        report = {
+            'meta': {
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'python': sys.version.split()[0],
+                'django': django.get_version(),
+                'platform': platform.platform(),
+                'database': connection.vendor,
+                'repeat': options['repeat'],
+            },
+            'scales': {},
+        }
+
+        workdir = Path(tempfile.mkdtemp(prefix='timesheet-benchmark-'))
+        isolated = override_settings(
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+            TIMESHEET_EXPORT_CACHE_DIR=str(workdir / 'exports'),
+            TIMESHEET_EXPORT_JOB_DIR=str(workdir / 'jobs'),
+            TIMESHEET_PROFILE_DIR=str(workdir / 'profiles'),
+        )
+        isolated.enable()
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            for name in scales:
+                call_command('flush', interactive=False, verbosity=0)
+                params = SCALES[name]
+                self.stderr.write(f"Seeding '{name}' scale...")
+                counts = seed(seed=options['seed'], **params)
+                self.stderr.write(f"Running '{name}' benchmarks...")
+                report['scales'][name] = {
+                    'params': params,
+                    'counts': counts,
+                    'results': run_suite(repeat=options['repeat']),
+                }
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            isolated.disable()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        else:
+            self.stdout.write(output)
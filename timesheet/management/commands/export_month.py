@@ -0,0 +1,45 @@
+# timesheet/management/commands/export_month.py
+import calendar
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from timesheet.exports import (
+    build_month_workbook, export_timesheets, iter_month_zip, month_export_basename,
+)
+
+
+class Command(BaseCommand):
+    help = "Export all timesheets of a month as a ZIP of workbooks or one multi-sheet workbook"
+
+    def add_arguments(self, parser):
+        parser.add_argument('year', type=int)
+        parser.add_argument('month', type=int)
+        parser.add_argument('--cleaner', help="Only export this cleaner's timesheet")
+        parser.add_argument('--format', choices=['zip', 'workbook'], default='zip')
+        parser.add_argument('--output', help="Output file (defaults to a name derived from the month)")
+        parser.add_argument('--workers', type=int, help="Worker processes for ZIP exports")
+
+    def handle(self, *args, **options):
+        year, month = options['year'], options['month']
+        if not 1 <= month <= 12:
+            raise CommandError("month must be between 1 and 12")
+
+        timesheets = list(export_timesheets(year, month, options['cleaner']))
+        if not timesheets:
+            raise CommandError(f"No timesheets for {calendar.month_name[month]} {year}")
+
+        ext = 'zip' if options['format'] == 'zip' else 'xlsx'
+        output = options['output'] or f"{month_export_basename(year, month, options['cleaner'])}.{ext}"
+
+        if options['format'] == 'workbook':
+            build_month_workbook(timesheets).save(output)
+        else:
+            with open(output, 'wb') as f:
+                for chunk in iter_month_zip(timesheets, options['workers']):
+                    f.write(chunk)
+
+        size_kb = os.path.getsize(output) / 1024
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {len(timesheets)} timesheet(s) to {output} ({size_kb:.1f} KB)"
+        ))
@@ -0,0 +1,68 @@
+# timesheet/management/commands/import_timesheets.py
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from timesheet.importing import BATCH_SIZE, import_timesheets, read_rows
+
+MAX_REPORTED_ERRORS = 20
+
+
+class Command(BaseCommand):
+    help = "Import timesheets from a CSV or JSON-lines file (see timesheet/importing.py for the format)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Input file, or '-' for stdin")
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help="Input format (defaults to the file extension)")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help="Timesheets written per transaction")
+        parser.add_argument('--dry-run', action='store_true', help="Validate without writing anything")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format']
+        if not fmt:
+            if path.endswith('.csv'):
+                fmt = 'csv'
+            elif path.endswith(('.jsonl', '.ndjson')):
+                fmt = 'jsonl'
+            else:
+                raise CommandError("Cannot tell the format from the file name; pass --format")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive")
+
+        start = time.perf_counter()
+
+        def progress(stats):
+            elapsed = time.perf_counter() - start
+            self.stderr.write(
+                f"  {stats['rows']} rows read, {stats['timesheets']} timesheets "
+                f"({stats['rows'] / elapsed:.0f} rows/s)"
+            )
+
+        fileobj = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        try:
+            stats = import_timesheets(
+                read_rows(fileobj, fmt),
+                batch_size=options['batch_size'],
+                dry_run=options['dry_run'],
+                on_batch=progress if options['verbosity'] >= 1 else None,
+            )
+        finally:
+            if fileobj is not sys.stdin:
+                fileobj.close()
+
+        for line_num, message in stats['errors'][:MAX_REPORTED_ERRORS]:
+            self.stderr.write(self.style.WARNING(f"Line {line_num}: {message}"))
+        if stats['error_count'] > MAX_REPORTED_ERRORS:
+            self.stderr.write(self.style.WARNING(f"... and {stats['error_count'] - MAX_REPORTED_ERRORS} more"))
+
+        elapsed = time.perf_counter() - start
+        verb = "Validated" if options['dry_run'] else "Imported"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {stats['timesheets']} timesheets, {stats['entries']} entries and "
+            f"{stats['extra_hours']} extra hours from {stats['rows']} rows in {elapsed:.1f}s "
+            f"({stats['error_count']} rows skipped)"
+        ))
@@ -0,0 +1,234 @@
+# timesheet/management/commands/loadtest.py
+import json
+import os
+import platform
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from timesheet.benchmarks import SCALES
+from timesheet.loadtest import DEFAULT_MIX, discover_targets, parse_mix, run_load
+
+WORKER_CLASSES = ('sync', 'gthread')
+# Seconds to wait for gunicorn to answer before giving up
+STARTUP_TIMEOUT = 60
+
+# The project settings with a throwaway database, cache and export directories
+SETTINGS_TEMPLATE = '''\
+from timesheet_project.settings import *
+
+DATABASES = {{'default': {{'ENGINE': 'django.db.backends.sqlite3', 'NAME': {database!r}}}}}
+ALLOWED_HOSTS = ['127.0.0.1', 'localhost']
+CACHES = {{'default': {{'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': {cache!r}}}}}
+TIMESHEET_EXPORT_CACHE_DIR = {exports!r}
+TIMESHEET_EXPORT_JOB_DIR = {jobs!r}
+TIMESHEET_PROFILE_DIR = {profiles!r}
+'''
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the app under gunicorn and print JSON: requests per second, latency "
+        "percentiles and error rate for a mix of list, detail, Excel and create requests. "
+        "Seeds a throwaway database and starts gunicorn itself unless --url is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            help="Test an already running server (e.g. http://127.0.0.1:8000) instead of starting one",
+        )
+        parser.add_argument(
+            '--workers', type=int, default=int(os.environ.get('WEB_CONCURRENCY', 4)),
+            help="gunicorn worker processes (default: $WEB_CONCURRENCY or 4)",
+        )
+        parser.add_argument('--worker-class', choices=WORKER_CLASSES, default='sync', help="gunicorn worker class")
+        parser.add_argument('--threads', type=int, default=1, help="Threads per gthread worker")
+        parser.add_argument('--clients', type=int, default=16, help="Concurrent clients")
+        parser.add_argument('--duration', type=float, default=30, help="Measured seconds")
+        parser.add_argument('--warmup', type=float, default=5, help="Seconds of load before measuring")
+        parser.add_argument(
+            '--mix', default=DEFAULT_MIX,
+            help=f"Relative weights of list, detail, excel and create requests (default: {DEFAULT_MIX})",
+        )
+        parser.add_argument(
+            '--scale', default='medium', choices=list(SCALES),
+            help="Size of the seeded database (see the benchmark command)",
+        )
+        parser.add_argument('--seed', type=int, default=0, help="Random seed for the data and the clients")
+        parser.add_argument('--output', help="Write JSON here instead of stdout")
+        parser.add_argument('--server-log', help="Keep gunicorn's output (and any server errors) in this file")
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options['mix'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options['clients'] < 1 or options['duration'] <= 0 or options['warmup'] < 0:
+            raise CommandError("--clients and --duration must be positive and --warmup not negative")
+
+        report = {
+            'meta': {
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'python': sys.version.split()[0],
+                'django': django.get_version(),
+                'platform': platform.platform(),
+                'cpus': os.cpu_count(),
+                'clients': options['clients'],
+                'duration': options['duration'],
+                'warmup': options['warmup'],
+                'mix': mix,
+            },
+        }
+
+        if options['url']:
+            report['meta']['server'] = {'url': options['url']}
+            report['results'] = self.run(options['url'], mix, options)
+        else:
+            if options['workers'] < 1 or options['threads'] < 1:
+                raise CommandError("--workers and --threads must be positive")
+            report['meta']['server'] = {
+                'gunicorn': {
+                    'workers': options['workers'],
+                    'worker_class': options['worker_class'],
+                    'threads': options['threads'],
+                },
+                'scale': options['scale'],
+                'params': SCALES[options['scale']],
+            }
+            workdir = Path(tempfile.mkdtemp(prefix='timesheet-loadtest-'))
+            try:
+                env = self.prepare_environment(workdir)
+                self.seed_database(env, options)
+                server, url = self.start_server(env, workdir, options)
+                try:
+                    report['results'] = self.run(url, mix, options)
+                finally:
+                    self.stop_server(server)
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def prepare_environment(self, workdir):
+        """Write the throwaway settings module and return the environment that selects it"""
+        (workdir / 'loadtest_settings.py').write_text(SETTINGS_TEMPLATE.format(
+            database=str(workdir / 'db.sqlite3'),
+            cache=str(workdir / 'cache'),
+            exports=str(workdir / 'exports'),
+            jobs=str(workdir / 'jobs'),
+            profiles=str(workdir / 'profiles'),
+        ))
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(workdir), str(settings.BASE_DIR), env.get('PYTHONPATH')]))
+        env['DJANGO_SETTINGS_MODULE'] = 'loadtest_settings'
+        return env
+
+    def seed_database(self, env, options):
+        params = SCALES[options['scale']]
+        manage = [sys.executable, str(settings.BASE_DIR / 'manage.py')]
+        self.stderr.write(f"Seeding '{options['scale']}' scale...")
+        for command in (
+            ['migrate', '--no-input', '-v', '0'],
+            [
+                'seed_data',
+                '--companies', str(params['companies']),
+                '--cleaners', str(params['cleaners']),
+                '--months', str(params['months']),
+                '--entries', str(params['entries_per_timesheet']),
+                '--extra-hours', str(params['extra_hours_per_timesheet']),
+                '--seed', str(options['seed']),
+            ],
+        ):
+            result = subprocess.run(manage + command, env=env, capture_output=True, text=True)
+            if result.returncode:
+                raise CommandError(f"{command[0]} failed:\n{result.stderr}")
+
+    def start_server(self, env, workdir, options):
+        """Start gunicorn on a free local port and wait until it answers"""
+        port = _free_port()
+        url = f"http://127.0.0.1:{port}"
+        log_path = Path(options['server_log'] or workdir / 'gunicorn.log')
+        workers = f"{options['workers']} {options['worker_class']} workers"
+        if options['worker_class'] == 'gthread':
+            workers += f", {options['threads']} threads each"
+        self.stderr.write(f"Starting gunicorn ({workers}) on {url}...")
+        with open(log_path, 'w') as log:
+            server = subprocess.Popen(
+                [
+                    sys.executable, '-m', 'gunicorn', 'timesheet_project.wsgi:application',
+                    '--bind', f"127.0.0.1:{port}",
+                    '--workers', str(options['workers']),
+                    '--worker-class', options['worker_class'],
+                    '--threads', str(options['threads']),
+                    '--timeout', '120',
+                ],
+                env=env, cwd=settings.BASE_DIR, stdout=log, stderr=subprocess.STDOUT,
+            )
+
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while True:
+            if server.poll() is not None:
+                raise CommandError(f"gunicorn exited with status {server.returncode}:\n{log_path.read_text()}")
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return server, url
+            except OSError:
+                if time.monotonic() > deadline:
+                    self.stop_server(server)
+                    raise CommandError(f"gunicorn did not start within {STARTUP_TIMEOUT}s:\n{log_path.read_text()}")
+                time.sleep(0.2)
+
+    def stop_server(self, server):
+        if server.poll() is None:
+            server.send_signal(signal.SIGTERM)
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+                server.wait()
+
+    def run(self, url, mix, options):
+        try:
+            targets = discover_targets(url)
+        except (OSError, RuntimeError) as e:
+            raise CommandError(f"Could not read timesheets and companies from {url}: {e}")
+        self.stderr.write(
+            f"Running {options['clients']} clients for {options['warmup']:g}s warm-up + "
+            f"{options['duration']:g}s against {len(targets['timesheets'])} timesheets..."
+        )
+        try:
+            results = run_load(
+                url, mix,
+                clients=options['clients'],
+                duration=options['duration'],
+                warmup=options['warmup'],
+                seed=options['seed'],
+                targets=targets,
+            )
+        except (OSError, RuntimeError) as e:
+            raise CommandError(f"Load test failed: {e}")
+        results['targets'] = {name: len(ids) for name, ids in targets.items()}
+        return results
@@ -0,0 +1,16 @@
+# timesheet/management/commands/rebuild_rollups.py
+from django.core.management.base import BaseCommand
+
+from timesheet.models import CleanerMonthRollup, CompanyMonthRollup
+from timesheet.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the month x company and month x cleaner rollups from scratch"
+
+    def handle(self, *args, **options):
+        rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {CompanyMonthRollup.objects.count()} company and "
+            f"{CleanerMonthRollup.objects.count()} cleaner month rollups"
+        ))
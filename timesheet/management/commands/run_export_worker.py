@@ -0,0 +1,32 @@
+# timesheet/management/commands/run_export_worker.py
+from django.core.management.base import BaseCommand, CommandError
+
+from timesheet.jobs import run_worker
+
+
+class Command(BaseCommand):
+    help = "Run queued export jobs (see timesheet/jobs.py) until interrupted"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=2, help="Jobs run at the same time")
+        parser.add_argument('--poll-interval', type=float, default=2.0, help="Seconds between queue checks when idle")
+        parser.add_argument('--render-workers', type=int,
+                            help="Processes each month ZIP export renders with (defaults to TIMESHEET_EXPORT_WORKERS)")
+        parser.add_argument('--once', action='store_true', help="Exit once the queue is empty")
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError("--concurrency must be positive")
+
+        self.stdout.write(f"Export worker started (concurrency {options['concurrency']})")
+        try:
+            run_worker(
+                concurrency=options['concurrency'],
+                poll_interval=options['poll_interval'],
+                once=options['once'],
+                render_workers=options['render_workers'],
+                log=self.stdout.write,
+            )
+        except KeyboardInterrupt:
+            # Jobs that were already running are finished before we get here
+            self.stdout.write("Export worker stopped")
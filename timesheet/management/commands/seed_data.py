@@ -0,0 +1,39 @@
+# timesheet/management/commands/seed_data.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from timesheet.seeding import SEED_PREFIX, clear_seeded, has_seeded, seed
+
+
+class Command(BaseCommand):
+    help = f"Seed synthetic companies, cleaners and timesheets (names start with '{SEED_PREFIX}')"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--companies', type=int, default=50)
+        parser.add_argument('--cleaners', type=int, default=20)
+        parser.add_argument('--months', type=int, default=12, help="Consecutive months ending this month")
+        parser.add_argument('--entries', type=int, default=5, help="Companies per timesheet")
+        parser.add_argument('--extra-hours', type=int, default=2, help="Max extra-hours rows per timesheet")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed")
+        parser.add_argument('--clear', action='store_true', help="Delete previously seeded data first")
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            clear_seeded()
+            self.stdout.write("Cleared previously seeded data")
+        elif has_seeded():
+            raise CommandError("Seeded data already exists; run with --clear to replace it")
+
+        start = time.perf_counter()
+        counts = seed(
+            companies=options['companies'],
+            cleaners=options['cleaners'],
+            months=options['months'],
+            entries_per_timesheet=options['entries'],
+            extra_hours_per_timesheet=options['extra_hours'],
+            seed=options['seed'],
+        )
+        elapsed = time.perf_counter() - start
+        summary = ", ".join(f"{count} {name.replace('_', ' ')}" for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Seeded {summary} in {elapsed:.1f}s"))
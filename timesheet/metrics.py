@@ -0,0 +1,197 @@
+# timesheet/metrics.py
+"""
+In-process request metrics.
+
+RequestMetricsMiddleware records, per URL name, the request latency, the
+number of SQL queries and the time spent in SQL into fixed-bucket
+histograms. The numbers are per process: with several gunicorn workers each
+worker reports its own view of the traffic it served.
+"""
+import bisect
+import os
+import random
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+# Upper bounds of the histogram buckets; the last bucket is unbounded
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """Fixed-bucket histogram with interpolated quantile estimates"""
+
+    __slots__ = ('bounds', 'counts', 'count', 'total', 'max')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """Estimate the q-quantile by interpolating inside the bucket that contains it"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.bounds[i - 1] if i > 0 else 0
+                upper = self.bounds[i] if i < len(self.bounds) else self.max
+                upper = min(upper, self.max)
+                fraction = (rank - seen) / bucket_count
+                return lower + (upper - lower) * fraction
+            seen += bucket_count
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': round(self.total, 3),
+            'max': round(self.max, 3),
+            **{f"p{int(q * 100)}": _round(self.quantile(q)) for q in QUANTILES},
+        }
+
+
+def _round(value):
+    return None if value is None else round(value, 3)
+
+
+class ViewMetrics:
+    __slots__ = ('latency_ms', 'queries', 'sql_ms')
+
+    def __init__(self):
+        self.latency_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.sql_ms = Histogram(LATENCY_BUCKETS_MS)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+        self.started = time.time()
+
+    def record(self, view, latency_ms, queries, sql_ms):
+        with self._lock:
+            metrics = self._views.get(view)
+            if metrics is None:
+                metrics = self._views[view] = ViewMetrics()
+            metrics.latency_ms.observe(latency_ms)
+            metrics.queries.observe(queries)
+            metrics.sql_ms.observe(sql_ms)
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+            self.started = time.time()
+
+    def snapshot(self):
+        with self._lock:
+            views = {
+                name: {
+                    'latency_ms': m.latency_ms.snapshot(),
+                    'queries': m.queries.snapshot(),
+                    'sql_ms': m.sql_ms.snapshot(),
+                }
+                for name, m in sorted(self._views.items())
+            }
+        return {'pid': os.getpid(), 'since': self.started, 'views': views}
+
+    def prometheus(self):
+        """Render the metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            items = sorted(self._views.items())
+            for metric, attr, scale, help_text in (
+                ('timesheet_request_duration_seconds', 'latency_ms', 1000, 'Request latency'),
+                ('timesheet_request_sql_seconds', 'sql_ms', 1000, 'Time spent in SQL per request'),
+                ('timesheet_request_queries', 'queries', 1, 'SQL queries per request'),
+            ):
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} histogram")
+                for name, m in items:
+                    hist = getattr(m, attr)
+                    cumulative = 0
+                    for bound, count in zip(hist.bounds, hist.counts):
+                        cumulative += count
+                        lines.append(f'{metric}_bucket{{view="{name}",le="{bound / scale:g}"}} {cumulative}')
+                    lines.append(f'{metric}_bucket{{view="{name}",le="+Inf"}} {hist.count}')
+                    lines.append(f'{metric}_sum{{view="{name}"}} {hist.total / scale:g}')
+                    lines.append(f'{metric}_count{{view="{name}"}} {hist.count}')
+
+            metric = 'timesheet_request_duration_quantile_seconds'
+            lines.append(f"# HELP {metric} Estimated request latency quantiles")
+            lines.append(f"# TYPE {metric} gauge")
+            for name, m in items:
+                for q in QUANTILES:
+                    value = m.latency_ms.quantile(q)
+                    if value is not None:
+                        lines.append(f'{metric}{{view="{name}",quantile="{q:g}"}} {value / 1000:g}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+class _QueryTimer:
+    """execute_wrapper that counts queries and accumulates their duration"""
+
+    __slots__ = ('count', 'seconds')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+
+
+class RequestMetricsMiddleware:
+    """
+    Record latency, query count and SQL time for a sample of requests.
+
+    TIMESHEET_METRICS_SAMPLE_RATE (0.0-1.0) controls the fraction of requests
+    measured; unsampled requests only pay for one random() call.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'TIMESHEET_METRICS_SAMPLE_RATE', 1.0)
+
+    def __call__(self, request):
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        timer = _QueryTimer()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        latency_ms = (time.perf_counter() - start) * 1000
+
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name if match else None) or '<unresolved>'
+        registry.record(view, latency_ms, timer.count, timer.seconds * 1000)
+        return response
@@ -0,0 +1,188 @@
+# Generated by Django 4.2.28 on 2026-10-17 06:20
+
+from calendar import monthrange
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations, models
+
+DAYS = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+
+
+def _entry_total(company, year, month):
+    # Self-contained copy of the day-by-day rules so the migration does not
+    # depend on the current model or schedule code
+    total = Decimal('0.00')
+    for day in range(1, monthrange(year, month)[1] + 1):
+        current_date = date(year, month, day)
+        weekday = current_date.weekday()
+        if company.pattern_type == 'weekly':
+            total += getattr(company, f'{DAYS[weekday]}_hours')
+        elif company.biweekly_start_date:
+            days_diff = (current_date - company.biweekly_start_date).days
+            is_week_a = days_diff < 0 or (days_diff // 7) % 2 == 0
+            suffix = 'a' if is_week_a else 'b'
+            total += getattr(company, f'{DAYS[weekday]}_hours_week_{suffix}')
+    return total.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def backfill_totals(apps, schema_editor):
+    Timesheet = apps.get_model('timesheet', 'Timesheet')
+    TimesheetEntry = apps.get_model('timesheet', 'TimesheetEntry')
+    ExtraHours = apps.get_model('timesheet', 'ExtraHours')
+
+    totals = {}
+    entries = list(TimesheetEntry.objects.select_related('timesheet', 'company'))
+    for entry in entries:
+        entry.total_hours = _entry_total(entry.company, entry.timesheet.year, entry.timesheet.month)
+        totals[entry.timesheet_id] = totals.get(entry.timesheet_id, Decimal('0.00')) + entry.total_hours
+    TimesheetEntry.objects.bulk_update(entries, ['total_hours'], batch_size=500)
+
+    for eh in ExtraHours.objects.all():
+        totals[eh.timesheet_id] = totals.get(eh.timesheet_id, Decimal('0.00')) + eh.hours
+
+    timesheets = list(Timesheet.objects.all())
+    for timesheet in timesheets:
+        timesheet.total_hours = totals.get(timesheet.pk, Decimal('0.00'))
+    Timesheet.objects.bulk_update(timesheets, ['total_hours'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timesheet', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timesheet',
+            name='total_hours',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=9),
+        ),
+        migrations.AddField(
+            model_name='timesheetentry',
+            name='total_hours',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=7),
+        ),
+        migrations.AlterField(
+            model_name='company',
+            name='fri_hours',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.AlterField(
+            model_name='company',
+            name='fri_hours_week_a',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.AlterField(
+            model_name='company',
+            name='fri_hours_week_b',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.AlterField(
+            model_name='company',
+            name='mon_hours',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.AlterField(
+            model_name='company',
+            name='mon_hours_week_a',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.AlterField(
+            model_name='company',
+            name='mon_hours_week_b',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.AlterField(
+            model_name='company',
+            name='sat_hours',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.AlterField(
+            model_name='company',
+            name='sat_hours_week_a',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.AlterField(
+            model_name='company',
+            name='sat_hours_week_b',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.AlterField(
+            model_name='company',
+            name='sun_hours',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.AlterField(
+            model_name='company',
+            name='sun_hours_week_a',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.AlterField(
+            model_name='company',
+            name='sun_hours_week_b',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.AlterField(
+            model_name='company',
+            name='thu_hours',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.AlterField(
+            model_name='company',
+            name='thu_hours_week_a',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.AlterField(
+            model_name='company',
+            name='thu_hours_week_b',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.AlterField(
+            model_name='company',
+            name='tue_hours',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.AlterField(
+            model_name='company',
+            name='tue_hours_week_a',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.AlterField(
+            model_name='company',
+            name='tue_hours_week_b',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.AlterField(
+            model_name='company',
+            name='wed_hours',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.AlterField(
+            model_name='company',
+            name='wed_hours_week_a',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.AlterField(
+            model_name='company',
+            name='wed_hours_week_b',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.AlterField(
+            model_name='extrahours',
+            name='date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='extrahours',
+            name='hours',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.AlterField(
+            model_name='timesheet',
+            name='month',
+            field=models.IntegerField(choices=[(1, 'January'), (2, 'February'), (3, 'March'), (4, 'April'), (5, 'May'), (6, 'June'), (7, 'July'), (8, 'August'), (9, 'September'), (10, 'October'), (11, 'November'), (12, 'December')]),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
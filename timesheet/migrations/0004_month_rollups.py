@@ -0,0 +1,86 @@
+# Generated by Django 4.2.28 on 2026-10-17 06:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_rollups(apps, schema_editor):
+    """Build the rollups from the stored totals (same aggregation as timesheet.rollups)"""
+    Timesheet = apps.get_model('timesheet', 'Timesheet')
+    TimesheetEntry = apps.get_model('timesheet', 'TimesheetEntry')
+    ExtraHours = apps.get_model('timesheet', 'ExtraHours')
+    CleanerMonthRollup = apps.get_model('timesheet', 'CleanerMonthRollup')
+    CompanyMonthRollup = apps.get_model('timesheet', 'CompanyMonthRollup')
+    
+    cleaner_rows = (
+        Timesheet.objects.values('cleaner_name', 'year', 'month')
+        .annotate(hours=models.Sum('total_hours'), timesheet_count=models.Count('id'))
+        .order_by()
+    )
+    CleanerMonthRollup.objects.bulk_create([CleanerMonthRollup(**row) for row in cleaner_rows], batch_size=500)
+    
+    totals = {}
+    entry_rows = (
+        TimesheetEntry.objects.values_list('company_id', 'timesheet__year', 'timesheet__month')
+        .annotate(hours=models.Sum('total_hours'), timesheet_count=models.Count('timesheet_id', distinct=True))
+        .order_by()
+    )
+    for company_id, year, month, hours, count in entry_rows:
+        totals[company_id, year, month] = [hours, count]
+    extra_rows = (
+        ExtraHours.objects.filter(company__isnull=False)
+        .values_list('company_id', 'timesheet__year', 'timesheet__month')
+        .annotate(hours=models.Sum('hours'))
+        .order_by()
+    )
+    for company_id, year, month, hours in extra_rows:
+        totals.setdefault((company_id, year, month), [0, 0])[0] += hours
+    CompanyMonthRollup.objects.bulk_create([
+        CompanyMonthRollup(company_id=company_id, year=year, month=month, hours=hours, timesheet_count=count)
+        for (company_id, year, month), (hours, count) in totals.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timesheet', '0003_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CleanerMonthRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cleaner_name', models.CharField(max_length=200)),
+                ('year', models.IntegerField()),
+                ('month', models.IntegerField()),
+                ('hours', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('timesheet_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CompanyMonthRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField()),
+                ('month', models.IntegerField()),
+                ('hours', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('timesheet_count', models.IntegerField(default=0)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='month_rollups', to='timesheet.company')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='cleanermonthrollup',
+            constraint=models.UniqueConstraint(fields=('year', 'month', 'cleaner_name'), name='unique_cleaner_month_rollup'),
+        ),
+        migrations.AddConstraint(
+            model_name='companymonthrollup',
+            constraint=models.UniqueConstraint(fields=('year', 'month', 'company'), name='unique_company_month_rollup'),
+        ),
+        migrations.AddIndex(
+            model_name='timesheet',
+            index=models.Index(fields=['year', 'month'], name='timesheet_year_month_idx'),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
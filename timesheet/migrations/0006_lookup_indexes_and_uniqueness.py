@@ -0,0 +1,178 @@
+# Generated by Django 4.2.28 on 2026-10-17 06:45
+
+from decimal import Decimal
+
+from django.db import migrations, models
+import django.db.models.functions.text
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Trim
+
+CHUNK_SIZE = 500
+
+
+def _chunks(items):
+    for i in range(0, len(items), CHUNK_SIZE):
+        yield items[i:i + CHUNK_SIZE]
+
+
+def rebuild_rollups(apps, schema_editor):
+    """Rebuild the rollups from the stored totals (a frozen copy of the 0004 backfill)"""
+    Timesheet = apps.get_model('timesheet', 'Timesheet')
+    TimesheetEntry = apps.get_model('timesheet', 'TimesheetEntry')
+    ExtraHours = apps.get_model('timesheet', 'ExtraHours')
+    CleanerMonthRollup = apps.get_model('timesheet', 'CleanerMonthRollup')
+    CompanyMonthRollup = apps.get_model('timesheet', 'CompanyMonthRollup')
+    
+    CleanerMonthRollup.objects.all().delete()
+    CompanyMonthRollup.objects.all().delete()
+    
+    cleaner_rows = (
+        Timesheet.objects.values('cleaner_name', 'year', 'month')
+        .annotate(hours=models.Sum('total_hours'), timesheet_count=models.Count('id'))
+        .order_by()
+    )
+    CleanerMonthRollup.objects.bulk_create([CleanerMonthRollup(**row) for row in cleaner_rows], batch_size=500)
+    
+    totals = {}
+    entry_rows = (
+        TimesheetEntry.objects.values_list('company_id', 'timesheet__year', 'timesheet__month')
+        .annotate(hours=models.Sum('total_hours'), timesheet_count=models.Count('timesheet_id', distinct=True))
+        .order_by()
+    )
+    for company_id, year, month, hours, count in entry_rows:
+        totals[company_id, year, month] = [hours, count]
+    extra_rows = (
+        ExtraHours.objects.filter(company__isnull=False)
+        .values_list('company_id', 'timesheet__year', 'timesheet__month')
+        .annotate(hours=models.Sum('hours'))
+        .order_by()
+    )
+    for company_id, year, month, hours in extra_rows:
+        totals.setdefault((company_id, year, month), [0, 0])[0] += hours
+    CompanyMonthRollup.objects.bulk_create([
+        CompanyMonthRollup(company_id=company_id, year=year, month=month, hours=hours, timesheet_count=count)
+        for (company_id, year, month), (hours, count) in totals.items()
+    ], batch_size=500)
+
+
+def deduplicate(apps, schema_editor):
+    """
+    Make existing data satisfy the new unique constraints.
+
+    Companies whose names only differ in case or surrounding spaces are
+    renamed to "<name> (<id>)" rather than merged, since their patterns may
+    differ. Timesheets of the same cleaner and month are merged into the
+    oldest one: extra hours move over, and entries move over unless the
+    oldest timesheet already has that company.
+    """
+    Company = apps.get_model('timesheet', 'Company')
+    Timesheet = apps.get_model('timesheet', 'Timesheet')
+    TimesheetEntry = apps.get_model('timesheet', 'TimesheetEntry')
+    ExtraHours = apps.get_model('timesheet', 'ExtraHours')
+    
+    seen = set()
+    for company in Company.objects.order_by('pk'):
+        key = company.name.strip().upper()
+        if key in seen:
+            suffix = f" ({company.pk})"
+            company.name = company.name.strip()[:200 - len(suffix)] + suffix
+            company.save(update_fields=['name'])
+        seen.add(company.name.strip().upper())
+    
+    # Trimmed names move timesheets to other cleaner rollup keys
+    renamed = False
+    for timesheet in Timesheet.objects.exclude(cleaner_name=Trim('cleaner_name')):
+        timesheet.cleaner_name = timesheet.cleaner_name.strip()
+        timesheet.save(update_fields=['cleaner_name'])
+        renamed = True
+    
+    # Timesheet id -> id of the oldest timesheet with the same key
+    keep_for = {}
+    previous_key = keep = None
+    rows = (
+        Timesheet.objects.order_by('cleaner_name', 'year', 'month', 'pk')
+        .values_list('pk', 'cleaner_name', 'year', 'month').iterator(chunk_size=CHUNK_SIZE)
+    )
+    for pk, *key in rows:
+        if key == previous_key:
+            keep_for[pk] = keep
+        else:
+            previous_key, keep = key, pk
+    merged = bool(keep_for)
+    
+    for others in _chunks(sorted(keep_for)):
+        others_of = {}
+        for pk in others:
+            others_of.setdefault(keep_for[pk], []).append(pk)
+        taken = set(
+            TimesheetEntry.objects.filter(timesheet_id__in=others_of).values_list('timesheet_id', 'company_id')
+        )
+        dropped = []
+        entries = TimesheetEntry.objects.filter(timesheet_id__in=others).order_by('pk')
+        for pk, timesheet_id, company_id in entries.values_list('pk', 'timesheet_id', 'company_id'):
+            key = (keep_for[timesheet_id], company_id)
+            if key in taken:
+                dropped.append(pk)
+            taken.add(key)
+        TimesheetEntry.objects.filter(pk__in=dropped).delete()
+        for keep, pks in others_of.items():
+            TimesheetEntry.objects.filter(timesheet_id__in=pks).update(timesheet_id=keep)
+            ExtraHours.objects.filter(timesheet_id__in=pks).update(timesheet_id=keep)
+        Timesheet.objects.filter(pk__in=others).delete()
+        
+        def total_of(model, field):
+            return Coalesce(
+                Subquery(
+                    model.objects.filter(timesheet_id=OuterRef('pk')).order_by()
+                    .values('timesheet_id').annotate(total=models.Sum(field)).values('total')
+                ),
+                Value(Decimal('0.00')),
+                output_field=models.DecimalField(max_digits=10, decimal_places=2),
+            )
+        Timesheet.objects.filter(pk__in=others_of).update(
+            total_hours=total_of(TimesheetEntry, 'total_hours') + total_of(ExtraHours, 'hours')
+        )
+    
+    if merged or renamed:
+        rebuild_rollups(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timesheet', '0005_export_jobs'),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate, migrations.RunPython.noop),
+        # Only possible once deduplicate has renamed companies with the same name
+        migrations.AlterField(
+            model_name='company',
+            name='name',
+            field=models.CharField(max_length=200, unique=True),
+        ),
+        migrations.RemoveIndex(
+            model_name='timesheet',
+            name='timesheet_year_month_idx',
+        ),
+        migrations.AddIndex(
+            model_name='company',
+            index=models.Index(fields=['is_active', 'name'], name='company_active_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='extrahours',
+            index=models.Index(fields=['timesheet', 'date'], name='extrahours_timesheet_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timesheet',
+            index=models.Index(fields=['-year', '-month', 'cleaner_name'], name='timesheet_ordering_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='company',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Upper('name'), name='unique_company_name_ci', violation_error_message='A company with this name already exists.'),
+        ),
+        migrations.AddConstraint(
+            model_name='timesheet',
+            constraint=models.UniqueConstraint(fields=('cleaner_name', 'year', 'month'), name='unique_timesheet_cleaner_month'),
+        ),
+    ]
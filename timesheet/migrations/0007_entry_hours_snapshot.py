@@ -0,0 +1,98 @@
+# Generated by Django 4.2.28 on 2026-10-17 07:15
+
+from calendar import monthrange
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations, models
+
+CHUNK_SIZE = 500
+DAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+# Frozen copies of the timesheet.schedule helpers as they were when this
+# migration was written, so later changes to the app cannot alter it
+ZERO = Decimal('0.00')
+TWO_PLACES = Decimal('0.01')
+
+
+class CompiledSchedule:
+    """Daily hours repeating from `anchor` (or by weekday), with lead_slots before the anchor"""
+
+    def __init__(self, slots, anchor=None, lead_slots=None):
+        self.slots = tuple(slots)
+        self.anchor = anchor
+        self.lead_slots = tuple(lead_slots) if lead_slots is not None else None
+
+    def month_vector(self, year, month):
+        _, n_days = monthrange(year, month)
+        start = date(year, month, 1)
+        lead = 0 if self.anchor is None else max(0, min((self.anchor - start).days, n_days))
+        vector = [self.lead_slots[(start.weekday() + i) % 7] for i in range(lead)]
+        period = len(self.slots)
+        for i in range(lead, n_days):
+            day = date.fromordinal(start.toordinal() + i)
+            offset = day.weekday() if self.anchor is None else (day - self.anchor).days % period
+            vector.append(self.slots[offset])
+        return vector
+
+
+def encode_hours(hours):
+    return ','.join(str(int(h * 100)) if h else '' for h in hours)
+
+
+def total_of(hours):
+    return sum(hours, ZERO).quantize(TWO_PLACES, rounding=ROUND_HALF_UP)
+
+
+def _schedule(company):
+    """The company's pattern as it is now (same rules as schedule.compile_company)"""
+    if company.pattern_type == 'weekly':
+        return CompiledSchedule([getattr(company, f'{day}_hours') for day in DAYS])
+    start = company.biweekly_start_date
+    if not start:
+        return CompiledSchedule([ZERO] * 7)
+    week_a = [getattr(company, f'{day}_hours_week_a') for day in DAYS]
+    week_b = [getattr(company, f'{day}_hours_week_b') for day in DAYS]
+    first = start.weekday()
+    slots = [week_a[(first + k) % 7] for k in range(7)] + [week_b[(first + k) % 7] for k in range(7)]
+    return CompiledSchedule(slots, anchor=start, lead_slots=week_a)
+
+
+def snapshot_entries(apps, schema_editor):
+    """Freeze every existing entry at its company's current pattern, which is what its total reflects"""
+    Company = apps.get_model('timesheet', 'Company')
+    TimesheetEntry = apps.get_model('timesheet', 'TimesheetEntry')
+    
+    schedules = {company.pk: _schedule(company) for company in Company.objects.all()}
+    months = {}
+    # Entry ids per distinct snapshot; a weekly pattern only has 14 distinct months
+    groups = defaultdict(list)
+    rows = TimesheetEntry.objects.values_list('pk', 'company_id', 'timesheet__year', 'timesheet__month')
+    for pk, company_id, year, month in rows.iterator(chunk_size=CHUNK_SIZE):
+        key = (company_id, year, month)
+        if key not in months:
+            hours = schedules[company_id].month_vector(year, month)
+            months[key] = (encode_hours(hours), total_of(hours))
+        groups[months[key]].append(pk)
+    for (snapshot, total), pks in groups.items():
+        for i in range(0, len(pks), CHUNK_SIZE):
+            TimesheetEntry.objects.filter(pk__in=pks[i:i + CHUNK_SIZE]).update(
+                hours_snapshot=snapshot, total_hours=total,
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timesheet', '0006_lookup_indexes_and_uniqueness'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timesheetentry',
+            name='hours_snapshot',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.RunPython(snapshot_entries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 4.2.28 on 2026-10-17 08:02
+
+from django.db import migrations, models
+
+DAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+WEEKLY_FIELDS = [f'{day}_hours' for day in DAYS]
+WEEK_A_FIELDS = [f'{field}_week_a' for field in WEEKLY_FIELDS]
+WEEK_B_FIELDS = [f'{field}_week_b' for field in WEEKLY_FIELDS]
+
+
+def _hundredths(value):
+    return int(round(value * 100))
+
+
+def to_rotation(apps, schema_editor):
+    """Weekly companies become 1-week rotations, bi-weekly ones 2-week rotations (week A, week B)"""
+    Company = apps.get_model('timesheet', 'Company')
+    companies = list(Company.objects.all())
+    for company in companies:
+        if company.pattern_type == 'weekly':
+            company.cycle_weeks = 1
+            fields = WEEKLY_FIELDS
+        else:
+            company.cycle_weeks = 2
+            fields = WEEK_A_FIELDS + WEEK_B_FIELDS
+        company.pattern = [_hundredths(getattr(company, field)) for field in fields]
+    Company.objects.bulk_update(companies, ['cycle_weeks', 'pattern'], batch_size=500)
+
+
+def from_rotation(apps, schema_editor):
+    """Reverse of to_rotation; rotations longer than two weeks keep their first two weeks"""
+    Company = apps.get_model('timesheet', 'Company')
+    companies = list(Company.objects.all())
+    for company in companies:
+        pattern = list(company.pattern) + [0] * 14
+        if company.cycle_weeks == 1:
+            company.pattern_type = 'weekly'
+            fields = WEEKLY_FIELDS
+        else:
+            company.pattern_type = 'biweekly'
+            fields = WEEK_A_FIELDS + WEEK_B_FIELDS
+        for field, value in zip(fields, pattern):
+            setattr(company, field, value / 100)
+    Company.objects.bulk_update(
+        companies, ['pattern_type'] + WEEKLY_FIELDS + WEEK_A_FIELDS + WEEK_B_FIELDS, batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timesheet', '0007_entry_hours_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='cycle_weeks',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'Weekly'), (2, 'Bi-Weekly'), (3, '3-Week Rotation'), (4, '4-Week Rotation')], default=1),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='pattern',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RenameField(
+            model_name='company',
+            old_name='biweekly_start_date',
+            new_name='cycle_start_date',
+        ),
+        migrations.AlterField(
+            model_name='company',
+            name='cycle_start_date',
+            field=models.DateField(blank=True, help_text='Date when week A starts (for rotations of 2 or more weeks)', null=True),
+        ),
+        migrations.RunPython(to_rotation, from_rotation),
+        migrations.RemoveField(model_name='company', name='pattern_type'),
+    ] + [
+        migrations.RemoveField(model_name='company', name=field)
+        for field in WEEKLY_FIELDS + WEEK_A_FIELDS + WEEK_B_FIELDS
+    ]
@@ -1,87 +1,115 @@
 from django.db import models
-from decimal import Decimal, ROUND_HALF_UP
+from django.db.models.functions import Upper
+from django.utils import timezone
+from decimal import Decimal
+
+from .hours import hundredths_of, to_decimal, to_hundredths
+from .schedule import decode_hours, encode_hours
+from .schedule_cache import schedule_cache
+
+DAY_NAMES = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+WEEK_LABELS = 'ABCD'
+
+
+def _day_hours_property(week, weekday):
+    """Accessor for one day of the pattern under the old per-day field names"""
+    def getter(self):
+        return self.get_hours(week, weekday)
+    
+    def setter(self, value):
+        self.set_hours(week, weekday, value)
+    return property(getter, setter)
+
 
 class Company(models.Model):
-    PATTERN_CHOICES = [
-        ('weekly', 'Weekly'),
-        ('biweekly', 'Bi-Weekly'),
+    CYCLE_CHOICES = [
+        (1, 'Weekly'),
+        (2, 'Bi-Weekly'),
+        (3, '3-Week Rotation'),
+        (4, '4-Week Rotation'),
     ]
     
     name = models.CharField(max_length=200, unique = True)
-    pattern_type = models.CharField(max_length=10, choices=PATTERN_CHOICES, default='weekly')
-    
-    # Weekly hours (0-7 days) - Changed to 2 decimal places
-    mon_hours = models.DecimalField(max_digits=5, decimal_places=2, default=0)
-    tue_hours = models.DecimalField(max_digits=5, decimal_places=2, default=0)
-    wed_hours = models.DecimalField(max_digits=5, decimal_places=2, default=0)
-    thu_hours = models.DecimalField(max_digits=5, decimal_places=2, default=0)
-    fri_hours = models.DecimalField(max_digits=5, decimal_places=2, default=0)
-    sat_hours = models.DecimalField(max_digits=5, decimal_places=2, default=0)
-    sun_hours = models.DecimalField(max_digits=5, decimal_places=2, default=0)
-    
-    # Bi-weekly pattern (for alternating weeks) - Changed to 2 decimal places
-    mon_hours_week_a = models.DecimalField(max_digits=5, decimal_places=2, default=0)
-    tue_hours_week_a = models.DecimalField(max_digits=5, decimal_places=2, default=0)
-    wed_hours_week_a = models.DecimalField(max_digits=5, decimal_places=2, default=0)
-    thu_hours_week_a = models.DecimalField(max_digits=5, decimal_places=2, default=0)
-    fri_hours_week_a = models.DecimalField(max_digits=5, decimal_places=2, default=0)
-    sat_hours_week_a = models.DecimalField(max_digits=5, decimal_places=2, default=0)
-    sun_hours_week_a = models.DecimalField(max_digits=5, decimal_places=2, default=0)
-    
-    mon_hours_week_b = models.DecimalField(max_digits=5, decimal_places=2, default=0)
-    tue_hours_week_b = models.DecimalField(max_digits=5, decimal_places=2, default=0)
-    wed_hours_week_b = models.DecimalField(max_digits=5, decimal_places=2, default=0)
-    thu_hours_week_b = models.DecimalField(max_digits=5, decimal_places=2, default=0)
-    fri_hours_week_b = models.DecimalField(max_digits=5, decimal_places=2, default=0)
-    sat_hours_week_b = models.DecimalField(max_digits=5, decimal_places=2, default=0)
-    sun_hours_week_b = models.DecimalField(max_digits=5, decimal_places=2, default=0)
-    
-    biweekly_start_date = models.DateField(null=True, blank=True, help_text="Date when Week A starts (for bi-weekly patterns)")
+    # Weeks in the rotation; week 1 starts on cycle_start_date
+    cycle_weeks = models.PositiveSmallIntegerField(choices=CYCLE_CHOICES, default=1)
+    # Hours in hundredths of an hour, 7 per week of the cycle, Monday first:
+    # pattern[week * 7 + weekday]
+    pattern = models.JSONField(default=list, blank=True)
+    
+    cycle_start_date = models.DateField(null=True, blank=True, help_text="Date when week A starts (for rotations of 2 or more weeks)")
     
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         verbose_name_plural = "Companies"
         ordering = ['name']
+        constraints = [
+            # UPPER() matches the name__iexact lookups on PostgreSQL, so they can use it
+            models.UniqueConstraint(
+                Upper('name'), name='unique_company_name_ci',
+                violation_error_message='A company with this name already exists.',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['is_active', 'name'], name='company_active_name_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.name} ({self.get_pattern_type_display()})"
-    
-    def get_weekly_hours(self):
-        """Get standard weekly hours dict with Decimal"""
-        return {
-            0: self.mon_hours,
-            1: self.tue_hours,
-            2: self.wed_hours,
-            3: self.thu_hours,
-            4: self.fri_hours,
-            5: self.sat_hours,
-            6: self.sun_hours,
-        }
-    
-    def get_biweekly_hours(self, is_week_a=True):
-        """Get bi-weekly hours based on which week it is"""
-        if is_week_a:
-            return {
-                0: self.mon_hours_week_a,
-                1: self.tue_hours_week_a,
-                2: self.wed_hours_week_a,
-                3: self.thu_hours_week_a,
-                4: self.fri_hours_week_a,
-                5: self.sat_hours_week_a,
-                6: self.sun_hours_week_a,
-            }
-        else:
-            return {
-                0: self.mon_hours_week_b,
-                1: self.tue_hours_week_b,
-                2: self.wed_hours_week_b,
-                3: self.thu_hours_week_b,
-                4: self.fri_hours_week_b,
-                5: self.sat_hours_week_b,
-                6: self.sun_hours_week_b,
-            }
+        return f"{self.name} ({self.get_cycle_weeks_display()})"
+    
+    @property
+    def is_rotation(self):
+        return self.cycle_weeks > 1
+    
+    def get_pattern(self):
+        """The pattern as cycle_weeks * 7 hundredths, padded with zeros"""
+        size = self.cycle_weeks * 7
+        pattern = list(self.pattern or ())[:size]
+        return pattern + [0] * (size - len(pattern))
+    
+    def get_hours(self, week, weekday):
+        pattern = self.pattern or ()
+        index = week * 7 + weekday
+        return to_decimal(pattern[index] if index < len(pattern) else 0)
+    
+    def set_hours(self, week, weekday, hours):
+        pattern = list(self.pattern or ())
+        index = week * 7 + weekday
+        pattern.extend([0] * (index + 1 - len(pattern)))
+        pattern[index] = to_hundredths(hours)
+        self.pattern = pattern
+    
+    def get_weeks(self):
+        """[(label, [hours Monday..Sunday], total)] for each week of the cycle"""
+        pattern = self.get_pattern()
+        weeks = []
+        for week in range(self.cycle_weeks):
+            hundredths = pattern[week * 7:week * 7 + 7]
+            weeks.append((WEEK_LABELS[week], [to_decimal(h) for h in hundredths], to_decimal(sum(hundredths))))
+        return weeks
+    
+    def get_days(self):
+        """[(day, [hours in each week of the cycle], total)] for Monday..Sunday"""
+        pattern = self.get_pattern()
+        days = []
+        for weekday, day in enumerate(DAY_NAMES):
+            hundredths = pattern[weekday::7]
+            days.append((day, [to_decimal(h) for h in hundredths], to_decimal(sum(hundredths))))
+        return days
+    
+    def get_schedule(self):
+        """This company's pattern as a CompiledSchedule, shared through schedule_cache"""
+        return schedule_cache.schedule(self)
+
+
+# The old per-day fields, kept as accessors: mon_hours .. sun_hours and
+# *_week_a are the first week of the pattern, *_week_b the second
+for _weekday, _day in enumerate(DAY_NAMES):
+    setattr(Company, f'{_day}_hours', _day_hours_property(0, _weekday))
+    setattr(Company, f'{_day}_hours_week_a', _day_hours_property(0, _weekday))
+    setattr(Company, f'{_day}_hours_week_b', _day_hours_property(1, _weekday))
 
 
 class Timesheet(models.Model):
@@ -95,9 +123,25 @@ class Timesheet(models.Model):
     month = models.IntegerField(choices=MONTH_CHOICES)
     year = models.IntegerField()
     created_at = models.DateTimeField(auto_now_add=True)
+    # Also bumped whenever the stored totals are refreshed, i.e. when entries
+    # or extra hours change
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    # Materialized total of all entries and extra hours, kept up to date by
+    # the handlers in timesheet/signals.py
+    total_hours = models.DecimalField(max_digits=9, decimal_places=2, default=0, editable=False)
     
     class Meta:
         ordering = ['-year', '-month', 'cleaner_name']
+        constraints = [
+            # Also serves the cleaner filters
+            models.UniqueConstraint(fields=['cleaner_name', 'year', 'month'], name='unique_timesheet_cleaner_month'),
+        ]
+        indexes = [
+            # Matches Meta.ordering; also serves year / month lookups (list
+            # filters, exports and rollup refreshes)
+            models.Index(fields=['-year', '-month', 'cleaner_name'], name='timesheet_ordering_idx'),
+        ]
     
     def __str__(self):
         return f"{self.cleaner_name} - {self.get_month_display()} {self.year}"
@@ -106,92 +150,110 @@ class Timesheet(models.Model):
         return self.get_month_display()
     
     def get_total_hours(self):
-        from decimal import Decimal
-        total = Decimal('0.00')
+        total = 0
         for entry in self.entries.all():
-            total += entry.get_total_hours()
+            total += sum(entry.get_month_hundredths())
         for eh in self.extra_hours.all():
-            total += eh.hours
-        return total.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+            total += to_hundredths(eh.hours)
+        return to_decimal(total)
+    
+    @staticmethod
+    def refresh_totals(timesheet_ids):
+        """Recompute the stored total_hours of the given timesheets from their stored entry totals"""
+        timesheet_ids = set(timesheet_ids)
+        if not timesheet_ids:
+            return
+        totals = dict.fromkeys(timesheet_ids, 0)
+        entry_sums = (
+            TimesheetEntry.objects.filter(timesheet_id__in=timesheet_ids)
+            .values('timesheet_id').annotate(total=models.Sum(hundredths_of('total_hours')))
+        )
+        extra_sums = (
+            ExtraHours.objects.filter(timesheet_id__in=timesheet_ids)
+            .values('timesheet_id').annotate(total=models.Sum(hundredths_of('hours')))
+        )
+        for row in list(entry_sums) + list(extra_sums):
+            totals[row['timesheet_id']] += row['total']
+        
+        now = timezone.now()
+        timesheets = list(Timesheet.objects.filter(pk__in=timesheet_ids).only('pk'))
+        for timesheet in timesheets:
+            timesheet.total_hours = to_decimal(totals[timesheet.pk])
+            timesheet.updated_at = now
+        Timesheet.objects.bulk_update(timesheets, ['total_hours', 'updated_at'], batch_size=500)
 
 
 class TimesheetEntry(models.Model):
     timesheet = models.ForeignKey(Timesheet, on_delete=models.CASCADE, related_name='entries')
     company = models.ForeignKey(Company, on_delete=models.CASCADE)
     
+    # Hours for each day of the timesheet's month, frozen from the company's
+    # pattern when the entry is saved for the first time (encode_hours format).
+    # Later pattern changes only reach it through take_snapshot().
+    hours_snapshot = models.TextField(default='', editable=False)
+    # Materialized get_total_hours(), kept up to date by timesheet/signals.py
+    total_hours = models.DecimalField(max_digits=7, decimal_places=2, default=0, editable=False)
+    
     class Meta:
         verbose_name_plural = "Timesheet Entries"
     
     def __str__(self):
         return f"{self.timesheet} - {self.company.name}"
     
-    def get_total_hours(self):
-        """Calculate total hours for this entry based on company's pattern"""
-        from calendar import monthrange
-        from datetime import date
-        from decimal import Decimal
-        
-        year = self.timesheet.year
-        month = self.timesheet.month
-        _, days_in_month = monthrange(year, month)
-        
-        total = Decimal('0.00')
-        
-        for day in range(1, days_in_month + 1):
-            current_date = date(year, month, day)
-            weekday = current_date.weekday()
-            
-            if self.company.pattern_type == 'weekly':
-                hours = self.company.get_weekly_hours()[weekday]
-                total += hours
+    def get_schedule(self):
+        """Compiled schedule of the company's pattern (cached on this entry)"""
+        if getattr(self, '_schedule', None) is None:
+            self._schedule = self.company.get_schedule()
+        return self._schedule
+    
+    def _schedule_month(self, version=None):
+        return schedule_cache.month_vector(self.company, self.timesheet.year, self.timesheet.month, version)
+    
+    def take_snapshot(self, version=None):
+        """Freeze the company's current pattern for the timesheet's month into this entry"""
+        self._month_hundredths = self._schedule_month(version)
+        self.hours_snapshot = encode_hours(self._month_hundredths)
+        self.total_hours = to_decimal(sum(self._month_hundredths))
+    
+    def get_month_hundredths(self):
+        """Hundredths of an hour for every day of the timesheet's month (index 0 is the 1st)"""
+        if getattr(self, '_month_hundredths', None) is None:
+            if self.hours_snapshot:
+                self._month_hundredths = decode_hours(self.hours_snapshot)
             else:
-                # Bi-weekly logic - repeats every 2 weeks
-                if self.company.biweekly_start_date:
-                    # Calculate days difference from start date
-                    days_diff = (current_date - self.company.biweekly_start_date).days
-                    
-                    # If negative, we're before start date - use week A as default
-                    if days_diff < 0:
-                        is_week_a = True
-                    else:
-                        # Calculate which 2-week period we're in
-                        # Week 0-6: Week A, Week 7-13: Week B, Week 14-20: Week A, etc.
-                        two_week_period = days_diff // 7  # Which week number (0, 1, 2, 3...)
-                        is_week_a = (two_week_period % 2) == 0  # Even weeks are A, odd are B
-                    
-                    hours = self.company.get_biweekly_hours(is_week_a)[weekday]
-                    total += hours
-        
-        return total.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+                self._month_hundredths = self._schedule_month()
+        return self._month_hundredths
+    
+    def get_month_hours(self):
+        """get_month_hundredths() as Decimals"""
+        return [to_decimal(h) for h in self.get_month_hundredths()]
+    
+    def get_total_hours(self):
+        """Total hours for this entry's month, from the snapshot once it has been taken"""
+        return to_decimal(sum(self.get_month_hundredths()))
+    
+    @staticmethod
+    def retake_snapshots(entries):
+        """
+        take_snapshot() for already-loaded entries (with timesheet and company)
+        and store the ones whose hours changed in bulk; returns those
+        """
+        entries = list(entries)
+        versions = schedule_cache.versions(entry.company for entry in entries)
+        changed = []
+        for entry in entries:
+            previous = entry.hours_snapshot
+            entry.take_snapshot(versions.get(entry.company_id))
+            if entry.hours_snapshot != previous:
+                changed.append(entry)
+        TimesheetEntry.objects.bulk_update(changed, ['hours_snapshot', 'total_hours'], batch_size=500)
+        return changed
     
     def get_daily_hours(self, day):
         """Get hours for a specific day"""
-        from calendar import monthrange
-        from datetime import date
-        
-        year = self.timesheet.year
-        month = self.timesheet.month
-        
-        try:
-            current_date = date(year, month, day)
-        except ValueError:
-            return Decimal('0.00')
-        
-        weekday = current_date.weekday()
-        
-        if self.company.pattern_type == 'weekly':
-            return self.company.get_weekly_hours()[weekday]
-        else:
-            if self.company.biweekly_start_date:
-                days_diff = (current_date - self.company.biweekly_start_date).days
-                
-                if days_diff < 0:
-                    is_week_a = True
-                else:
-                    two_week_period = days_diff // 7
-                    is_week_a = (two_week_period % 2) == 0
-                
-                return self.company.get_biweekly_hours(is_week_a)[weekday]
+        month_hundredths = self.get_month_hundredths()
+        if 1 <= day <= len(month_hundredths):
+            return to_decimal(month_hundredths[day - 1])
         return Decimal('0.00')
 
 
@@ -205,7 +267,90 @@ class ExtraHours(models.Model):
     class Meta:
         verbose_name_plural = "Extra Hours"
         ordering = ['date']
+        indexes = [
+            # Per-timesheet prefetches, which come back ordered by date
+            models.Index(fields=['timesheet', 'date'], name='extrahours_timesheet_date_idx'),
+        ]
     
     def __str__(self):
         date_str = self.date.strftime('%Y-%m-%d') if self.date else 'No date'
-        return f"{date_str}: {self.hours} hrs - {self.description[:30]}"
\ No newline at end of file
+        return f"{date_str}: {self.hours} hrs - {self.description[:30]}"
+
+
+class CompanyMonthRollup(models.Model):
+    """Hours billed to a company in a month (entries plus extra hours), kept up to date by timesheet/rollups.py"""
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='month_rollups')
+    year = models.IntegerField()
+    month = models.IntegerField()
+    hours = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    timesheet_count = models.IntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['year', 'month', 'company'], name='unique_company_month_rollup'),
+        ]
+    
+    def __str__(self):
+        return f"{self.company_id} {self.year}-{self.month:02d}: {self.hours}"
+
+
+class CleanerMonthRollup(models.Model):
+    """Hours worked by a cleaner in a month, kept up to date by timesheet/rollups.py"""
+    cleaner_name = models.CharField(max_length=200)
+    year = models.IntegerField()
+    month = models.IntegerField()
+    hours = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    timesheet_count = models.IntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['year', 'month', 'cleaner_name'], name='unique_cleaner_month_rollup'),
+        ]
+    
+    def __str__(self):
+        return f"{self.cleaner_name} {self.year}-{self.month:02d}: {self.hours}"
+
+
+class ExportJob(models.Model):
+    """An export queued for the run_export_worker command (see timesheet/jobs.py)"""
+    KIND_CHOICES = [
+        ('timesheet', 'Timesheet workbook'),
+        ('month', 'Month export'),
+    ]
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    params = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    progress = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)
+    filename = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Doubles as the heartbeat of running jobs
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='exportjob_status_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.pk} ({self.status})"
+
+
+class VersionCounter(models.Model):
+    """A version counter of timesheet/versions.py; bumped with an atomic UPDATE ... SET value = value + 1"""
+    name = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField()
+    
+    def __str__(self):
+        return f"{self.name} = {self.value}"
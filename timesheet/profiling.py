@@ -0,0 +1,248 @@
+# timesheet/profiling.py
+"""
+Opt-in per-request profiling for staff users.
+
+A staff user adds ?_profile=1 to any URL (or sends an `X-Profile: 1` header)
+and ProfilingMiddleware runs that request under cProfile, recording every
+SQL query with its duration and the application frames that issued it. The
+.pstats file and a JSON summary are saved in TIMESHEET_PROFILE_DIR and the
+response gets an X-Profile-URL header pointing at the summary page.
+
+Requests without the trigger only pay for a header lookup and a substring
+test on the query string. The trigger is ignored unless the user is an
+active staff member, so anonymous users cannot turn profiling on.
+"""
+import cProfile
+import json
+import os
+import pstats
+import re
+import time
+import traceback
+import uuid
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.urls import reverse
+from django.utils import timezone
+
+PROFILE_PARAM = '_profile'
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_URL_HEADER = 'X-Profile-URL'
+
+PROFILE_ID_RE = re.compile(r'^\d{8}T\d{6}-[0-9a-f]{8}$')
+# Summaries keep at most this many queries and functions
+MAX_QUERIES = 2000
+TOP_FUNCTIONS = 40
+TOP_DUPLICATES = 20
+# Application frames kept per query, innermost last
+STACK_DEPTH = 6
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(APP_DIR) + os.sep
+# Middleware that wraps every query and says nothing about where it came from
+SKIPPED_FILES = {os.path.join(APP_DIR, name) for name in ('profiling.py', 'metrics.py')}
+
+
+def profile_directory():
+    return Path(settings.TIMESHEET_PROFILE_DIR)
+
+
+def _short_path(filename):
+    if filename.startswith(PROJECT_ROOT):
+        return filename[len(PROJECT_ROOT):]
+    marker = f"{os.sep}site-packages{os.sep}"
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    return filename
+
+
+def app_stack():
+    """The project's own frames on the current stack (outside site-packages and the middleware)"""
+    frames = [
+        f"{_short_path(frame.filename)}:{frame.lineno} in {frame.name}"
+        for frame in traceback.extract_stack()
+        if frame.filename.startswith(PROJECT_ROOT)
+        and 'site-packages' not in frame.filename
+        and frame.filename not in SKIPPED_FILES
+    ]
+    return frames[-STACK_DEPTH:]
+
+
+class QueryRecorder:
+    """execute_wrapper that keeps each query with its duration and where in the app it ran from"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'ms': round((time.perf_counter() - start) * 1000, 3),
+                'many': many,
+                'origin': app_stack(),
+            })
+
+
+def wants_profile(request):
+    """True if the request asks to be profiled and comes from an active staff user"""
+    if PROFILE_HEADER not in request.META and PROFILE_PARAM not in request.META.get('QUERY_STRING', ''):
+        return False
+    if request.GET.get(PROFILE_PARAM) in (None, '', '0') and request.META.get(PROFILE_HEADER) in (None, '', '0'):
+        return False
+    user = getattr(request, 'user', None)
+    return bool(user is not None and user.is_active and user.is_staff)
+
+
+def profile_request(request, get_response):
+    """Run get_response under cProfile and query capture, save the result and link it from the response"""
+    recorder = QueryRecorder()
+    profiler = cProfile.Profile()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler (a debugger, coverage) already owns this thread
+            return get_response(request)
+        start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            response = get_response(request)
+            if response.streaming:
+                # Streamed bodies (ZIP exports) are generated here so they show up in the profile
+                response.streaming_content = [b''.join(response.streaming_content)]
+        finally:
+            wall, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+            profiler.disable()
+
+    profile_id = save_profile(request, response, profiler, recorder.queries, wall, cpu)
+    response[PROFILE_URL_HEADER] = reverse('profile_detail', args=[profile_id])
+    return response
+
+
+def _function_rows(stats, key):
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][key], reverse=True)[:TOP_FUNCTIONS]
+    return [
+        {
+            'function': f"{_short_path(filename)}:{line}({name})",
+            'calls': calls if calls == primitive_calls else f"{calls}/{primitive_calls}",
+            'tottime_ms': round(tottime * 1000, 3),
+            'cumtime_ms': round(cumtime * 1000, 3),
+        }
+        for (filename, line, name), (primitive_calls, calls, tottime, cumtime, _) in rows
+    ]
+
+
+def _duplicate_queries(queries):
+    """Statements run more than once, with how often and how long they took in total"""
+    groups = {}
+    for query in queries:
+        group = groups.setdefault(query['sql'], {'sql': query['sql'], 'count': 0, 'ms': 0.0, 'origin': query['origin']})
+        group['count'] += 1
+        group['ms'] += query['ms']
+    duplicates = [group for group in groups.values() if group['count'] > 1]
+    duplicates.sort(key=lambda group: (group['count'], group['ms']), reverse=True)
+    for group in duplicates:
+        group['ms'] = round(group['ms'], 3)
+    return duplicates[:TOP_DUPLICATES]
+
+
+def save_profile(request, response, profiler, queries, wall, cpu):
+    """Write <id>.pstats and <id>.json to the profile directory and return the new id"""
+    directory = profile_directory()
+    directory.mkdir(parents=True, exist_ok=True)
+    now = timezone.now()
+    profile_id = f"{now:%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+    profiler.dump_stats(str(directory / f"{profile_id}.pstats"))
+
+    stats = pstats.Stats(profiler)
+    match = getattr(request, 'resolver_match', None)
+    summary = {
+        'id': profile_id,
+        'created': now.isoformat(),
+        'method': request.method,
+        'path': request.get_full_path(),
+        'view': (match.view_name if match else None) or '<unresolved>',
+        'user': request.user.get_username(),
+        'status': response.status_code,
+        'wall_ms': round(wall * 1000, 3),
+        'cpu_ms': round(cpu * 1000, 3),
+        'function_calls': stats.total_calls,
+        'query_count': len(queries),
+        'sql_ms': round(sum(query['ms'] for query in queries), 3),
+        'queries': queries[:MAX_QUERIES],
+        'duplicate_queries': _duplicate_queries(queries),
+        'cumulative': _function_rows(stats, 3),
+        'internal': _function_rows(stats, 2),
+    }
+    tmp = directory / f"{profile_id}.json.tmp"
+    with open(tmp, 'w') as fh:
+        json.dump(summary, fh)
+    os.replace(tmp, directory / f"{profile_id}.json")
+    prune_profiles()
+    return profile_id
+
+
+def prune_profiles():
+    """Delete all but the newest TIMESHEET_PROFILE_KEEP profiles (ids sort by time)"""
+    keep = settings.TIMESHEET_PROFILE_KEEP
+    ids = sorted((path.stem for path in profile_directory().glob('*.json')), reverse=True)
+    for profile_id in ids[keep:]:
+        for suffix in ('.json', '.pstats'):
+            try:
+                os.remove(profile_directory() / f"{profile_id}{suffix}")
+            except FileNotFoundError:
+                pass
+
+
+def pstats_path(profile_id):
+    """Path of a saved .pstats file, or None for unknown or malformed ids"""
+    if not PROFILE_ID_RE.match(profile_id):
+        return None
+    path = profile_directory() / f"{profile_id}.pstats"
+    return path if path.exists() else None
+
+
+def load_summary(profile_id):
+    """The saved summary of a profile, or None for unknown or malformed ids"""
+    if not PROFILE_ID_RE.match(profile_id):
+        return None
+    try:
+        with open(profile_directory() / f"{profile_id}.json") as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return None
+
+
+def list_profiles():
+    """Summaries of the saved profiles, newest first, without their query and function lists"""
+    profiles = []
+    for path in sorted(profile_directory().glob('*.json'), reverse=True):
+        summary = load_summary(path.stem)
+        if summary is not None:
+            for key in ('queries', 'duplicate_queries', 'cumulative', 'internal'):
+                summary.pop(key, None)
+            profiles.append(summary)
+    return profiles
+
+
+class ProfilingMiddleware:
+    """
+    Profile requests that opt in with ?_profile=1 or X-Profile: 1, for staff
+    users only. Must come after AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not wants_profile(request):
+            return self.get_response(request)
+        return profile_request(request, self.get_response)
@@ -0,0 +1,140 @@
+# timesheet/rollups.py
+"""
+Month x company and month x cleaner rollups of billed hours.
+
+Rollups are derived from the materialized total_hours columns. Whenever
+something changes, only the affected keys are recomputed: a key is
+(company_id, year, month) or (cleaner_name, year, month), and refreshing it
+re-aggregates just that slice and upserts its row. The signal handlers and
+the bulk write paths pass in the keys they touched.
+"""
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from .hours import hundredths_of, to_decimal
+from .models import CleanerMonthRollup, CompanyMonthRollup, ExtraHours, Timesheet, TimesheetEntry
+
+
+def timesheet_keys(timesheet_ids):
+    """(cleaner keys, company keys) currently covered by the given timesheets"""
+    timesheet_ids = set(timesheet_ids)
+    if not timesheet_ids:
+        return set(), set()
+    cleaner_keys = set(
+        Timesheet.objects.filter(pk__in=timesheet_ids).values_list('cleaner_name', 'year', 'month')
+    )
+    company_keys = set(
+        TimesheetEntry.objects.filter(timesheet_id__in=timesheet_ids)
+        .values_list('company_id', 'timesheet__year', 'timesheet__month')
+    )
+    company_keys.update(
+        ExtraHours.objects.filter(timesheet_id__in=timesheet_ids, company__isnull=False)
+        .values_list('company_id', 'timesheet__year', 'timesheet__month')
+    )
+    return cleaner_keys, company_keys
+
+
+def keys_filter(keys, field, prefix=''):
+    """Q matching any (value, year, month) key, with one clause per month"""
+    by_month = defaultdict(set)
+    for value, year, month in keys:
+        by_month[year, month].add(value)
+    return reduce(or_, (
+        Q(**{f'{prefix}year': year, f'{prefix}month': month, f'{field}__in': values})
+        for (year, month), values in by_month.items()
+    ))
+
+
+def _cleaner_rollups(timesheets):
+    rows = (
+        timesheets.values('cleaner_name', 'year', 'month')
+        .annotate(hours=Sum('total_hours'), timesheet_count=Count('id'))
+        .order_by()
+    )
+    return [CleanerMonthRollup(**row) for row in rows]
+
+
+def _company_rollups(entries, extras):
+    totals = {}
+    entries = (
+        entries.values_list('company_id', 'timesheet__year', 'timesheet__month')
+        .annotate(hours=Sum(hundredths_of('total_hours')), timesheet_count=Count('timesheet_id', distinct=True))
+        .order_by()
+    )
+    for company_id, year, month, hours, timesheet_count in entries:
+        totals[company_id, year, month] = [hours, timesheet_count]
+    extras = (
+        extras.filter(company__isnull=False)
+        .values_list('company_id', 'timesheet__year', 'timesheet__month')
+        .annotate(hours=Sum(hundredths_of('hours')))
+        .order_by()
+    )
+    for company_id, year, month, hours in extras:
+        totals.setdefault((company_id, year, month), [0, 0])[0] += hours
+    # timesheet_count counts timesheets with a scheduled entry for the company
+    return [
+        CompanyMonthRollup(company_id=company_id, year=year, month=month, hours=to_decimal(hours), timesheet_count=count)
+        for (company_id, year, month), (hours, count) in totals.items()
+    ]
+
+
+def _upsert(model, rollups, keys, key_of, field, unique_fields):
+    """
+    Write the recomputed rollups for keys in place and delete the keys that
+    no longer aggregate to anything. Upserting rather than delete + insert
+    lets two transactions refresh the same key without one of them hitting
+    the unique constraint.
+    """
+    with transaction.atomic():
+        model.objects.bulk_create(
+            rollups, batch_size=500, update_conflicts=True,
+            unique_fields=unique_fields, update_fields=['hours', 'timesheet_count'],
+        )
+        stale = keys - {key_of(rollup) for rollup in rollups}
+        if stale:
+            model.objects.filter(keys_filter(stale, field)).delete()
+
+
+def refresh_cleaner_rollups(keys):
+    keys = set(keys)
+    if not keys:
+        return
+    rollups = _cleaner_rollups(Timesheet.objects.filter(keys_filter(keys, 'cleaner_name')))
+    _upsert(
+        CleanerMonthRollup, rollups, keys, lambda rollup: (rollup.cleaner_name, rollup.year, rollup.month),
+        'cleaner_name', ['year', 'month', 'cleaner_name'],
+    )
+
+
+def refresh_company_rollups(keys):
+    keys = set(keys)
+    if not keys:
+        return
+    related_filter = keys_filter(keys, 'company_id', 'timesheet__')
+    rollups = _company_rollups(
+        TimesheetEntry.objects.filter(related_filter), ExtraHours.objects.filter(related_filter),
+    )
+    _upsert(
+        CompanyMonthRollup, rollups, keys, lambda rollup: (rollup.company_id, rollup.year, rollup.month),
+        'company_id', ['year', 'month', 'company'],
+    )
+
+
+def refresh_rollups(cleaner_keys=(), company_keys=()):
+    refresh_cleaner_rollups(cleaner_keys)
+    refresh_company_rollups(company_keys)
+
+
+@transaction.atomic
+def rebuild_rollups():
+    """Recompute every rollup row from scratch"""
+    CleanerMonthRollup.objects.all().delete()
+    CompanyMonthRollup.objects.all().delete()
+    CleanerMonthRollup.objects.bulk_create(_cleaner_rollups(Timesheet.objects.all()), batch_size=500)
+    CompanyMonthRollup.objects.bulk_create(
+        _company_rollups(TimesheetEntry.objects.all(), ExtraHours.objects.all()), batch_size=500,
+    )
@@ -0,0 +1,130 @@
+# timesheet/schedule.py
+"""
+Compiled schedule engine.
+
+A company's pattern is compiled once into a flat list of slots (7 per week
+of its rotation) so a whole month can be produced with simple indexing, and
+monthly totals can be computed from how often each slot occurs in the month.
+Slots, vectors and totals are int hundredths of an hour (see hours.py).
+"""
+from calendar import monthrange
+from datetime import date
+
+
+def _slot_counts(offset, n_days, period):
+    """Count how often each slot of a `period`-long cycle occurs in n_days days starting at slot `offset`"""
+    full, rem = divmod(n_days, period)
+    counts = [full] * period
+    for i in range(rem):
+        counts[(offset + i) % period] += 1
+    return counts
+
+
+class CompiledSchedule:
+    """A company pattern flattened into a repeating cycle of daily hours"""
+
+    __slots__ = ('slots', 'anchor', 'lead_slots')
+
+    def __init__(self, slots, anchor=None, lead_slots=None):
+        # slots: hundredths per day of the cycle, indexed from `anchor`
+        # (or from a Monday when there is no anchor, i.e. by weekday)
+        self.slots = tuple(slots)
+        self.anchor = anchor
+        # Weekday-indexed hundredths used for days before the anchor date
+        self.lead_slots = tuple(lead_slots) if lead_slots is not None else None
+
+    @property
+    def period(self):
+        return len(self.slots)
+
+    def _split(self, start, n_days):
+        """Split [start, start + n_days) into days before the anchor and days on/after it"""
+        if self.anchor is None:
+            return 0, n_days
+        lead = (self.anchor - start).days
+        lead = max(0, min(lead, n_days))
+        return lead, n_days - lead
+
+    def _offset(self, day):
+        if self.anchor is None:
+            return day.weekday()
+        return (day - self.anchor).days % self.period
+
+    def hours_for_date(self, day):
+        """Hundredths for a single date"""
+        if self.anchor is not None and day < self.anchor:
+            return self.lead_slots[day.weekday()]
+        return self.slots[self._offset(day)]
+
+    def range_vector(self, start, n_days):
+        """Hundredths for each of n_days consecutive days starting at `start`"""
+        lead, rest = self._split(start, n_days)
+        vector = []
+        if lead:
+            first = start.weekday()
+            vector.extend(self.lead_slots[(first + i) % 7] for i in range(lead))
+        if rest:
+            slots = self.slots
+            period = len(slots)
+            offset = self._offset(date.fromordinal(start.toordinal() + lead))
+            vector.extend(slots[(offset + i) % period] for i in range(rest))
+        return vector
+
+    def range_total(self, start, n_days):
+        """Total hundredths over n_days consecutive days, from slot occurrence counts"""
+        lead, rest = self._split(start, n_days)
+        total = 0
+        if lead:
+            counts = _slot_counts(start.weekday(), lead, 7)
+            total += sum(hours * count for hours, count in zip(self.lead_slots, counts))
+        if rest:
+            offset = self._offset(date.fromordinal(start.toordinal() + lead))
+            counts = _slot_counts(offset, rest, len(self.slots))
+            total += sum(hours * count for hours, count in zip(self.slots, counts))
+        return total
+
+    def month_vector(self, year, month):
+        """Hundredths for every day of the month (index 0 is the 1st)"""
+        _, days_in_month = monthrange(year, month)
+        return self.range_vector(date(year, month, 1), days_in_month)
+
+    def month_total(self, year, month):
+        """Total hundredths for the month"""
+        _, days_in_month = monthrange(year, month)
+        return self.range_total(date(year, month, 1), days_in_month)
+
+    def cycle_totals(self):
+        """Total hundredths per 7-day week of the cycle, in cycle order"""
+        return [sum(self.slots[i:i + 7]) for i in range(0, len(self.slots), 7)]
+
+
+def encode_hours(hundredths):
+    """
+    Daily hundredths -> compact text: the numbers separated by commas, with
+    zero days left empty (a weekday-only month is about 60 characters)
+    """
+    return ','.join(str(h) if h else '' for h in hundredths)
+
+
+def decode_hours(text):
+    """Inverse of encode_hours"""
+    return [int(value) if value else 0 for value in text.split(',')]
+
+
+def compile_company(company):
+    """Compile a Company's N-week rotation into a CompiledSchedule"""
+    pattern = company.get_pattern()
+    if company.cycle_weeks == 1:
+        return CompiledSchedule(pattern)
+
+    start = company.cycle_start_date
+    if not start:
+        # No cycle start means the rotation is never applied
+        return CompiledSchedule([0] * 7)
+
+    # Day k of the cycle is in week k // 7 and falls on weekday
+    # (start.weekday() + k) % 7, which is where the pattern stores it
+    first = start.weekday()
+    slots = [pattern[(k // 7) * 7 + (first + k) % 7] for k in range(len(pattern))]
+    # Days before the start date fall back to week A
+    return CompiledSchedule(slots, anchor=start, lead_slots=pattern[:7])
@@ -0,0 +1,122 @@
+# timesheet/schedule_cache.py
+"""
+Process-wide LRU cache of compiled company schedules.
+
+Entries are keyed on the company's version counter ('company:<id>' in
+versions.py, bumped whenever the company is saved or deleted) rather than
+invalidated: the counters live in the database, so a save in one
+gunicorn worker makes every worker miss on its next lookup, and the stale
+entries simply age out. Besides the CompiledSchedule itself, month vectors
+are kept per (company_id, version, year, month).
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .schedule import compile_company
+from .versions import get_version, get_versions
+
+DEFAULT_MAX_ENTRIES = 16384
+
+
+def version_name(company_id):
+    return f'company:{company_id}'
+
+
+class ScheduleCache:
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _max_entries(self):
+        if self.max_entries is not None:
+            return self.max_entries
+        return getattr(settings, 'TIMESHEET_SCHEDULE_CACHE_SIZE', DEFAULT_MAX_ENTRIES)
+
+    def _get(self, key, build):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+        # Built outside the lock; two threads may both build the same entry
+        value = build()
+        with self._lock:
+            self._entries[key] = value
+            max_entries = self._max_entries()
+            while len(self._entries) > max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def versions(self, companies):
+        """{company_id: version} for several companies with one query"""
+        ids = {company.pk for company in companies if company.pk is not None}
+        versions = get_versions([version_name(pk) for pk in ids])
+        return {pk: versions[version_name(pk)] for pk in ids}
+
+    def schedule(self, company, version=None):
+        """The company's CompiledSchedule; unsaved companies are compiled every time"""
+        if company.pk is None:
+            return compile_company(company)
+        if version is None:
+            version = get_version(version_name(company.pk))
+        return self._get((company.pk, version), lambda: compile_company(company))
+
+    def month_vector(self, company, year, month, version=None):
+        """Hundredths for every day of the month as a tuple (index 0 is the 1st)"""
+        if company.pk is None:
+            return tuple(compile_company(company).month_vector(year, month))
+        if version is None:
+            version = get_version(version_name(company.pk))
+        return self._get(
+            (company.pk, version, year, month),
+            lambda: tuple(self.schedule(company, version).month_vector(year, month)),
+        )
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self._max_entries(),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            }
+    
+    def prometheus(self):
+        """The counters in the Prometheus text exposition format"""
+        stats = self.stats()
+        lines = []
+        for name, kind, help_text in (
+            ('hits', 'counter', 'Schedule cache lookups served from memory'),
+            ('misses', 'counter', 'Schedule cache lookups that compiled a schedule or month'),
+            ('evictions', 'counter', 'Schedule cache entries dropped to stay under max_entries'),
+            ('entries', 'gauge', 'Schedule cache entries held'),
+        ):
+            metric = f'timesheet_schedule_cache_{name}' + ('_total' if kind == 'counter' else '')
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {kind}")
+            lines.append(f"{metric} {stats[name]}")
+        return '\n'.join(lines) + '\n'
+
+
+
+schedule_cache = ScheduleCache()
\ No newline at end of file
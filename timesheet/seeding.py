@@ -0,0 +1,113 @@
+# timesheet/seeding.py
+"""
+Synthetic data generator used by the seed_data and benchmark commands.
+
+Everything it creates is prefixed with SEED_PREFIX so seeded rows can be
+told apart from (and cleared without touching) real data.
+"""
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from .models import Company, Timesheet
+from .services import create_timesheet_with_entries
+from .versions import bump_version
+
+SEED_PREFIX = "Seed"
+
+def _random_hours(rng, workday_chance=0.6):
+    if rng.random() > workday_chance:
+        return Decimal('0.00')
+    return Decimal(rng.choice([100, 150, 200, 250, 300, 375, 400, 450, 600])) / 100
+
+
+def seed_companies(count, rng, biweekly_ratio=0.3):
+    """Create `count` companies, roughly biweekly_ratio of them bi-weekly"""
+    companies = []
+    for i in range(count):
+        company = Company(name=f"{SEED_PREFIX} Company {i + 1:04d}")
+        if rng.random() < biweekly_ratio:
+            company.cycle_weeks = 2
+            company.cycle_start_date = date(2023, 1, 2) + timedelta(days=rng.randint(0, 13))
+            for weekday in range(7):
+                company.set_hours(0, weekday, _random_hours(rng))
+                company.set_hours(1, weekday, _random_hours(rng))
+        else:
+            for weekday in range(7):
+                company.set_hours(0, weekday, _random_hours(rng))
+        companies.append(company)
+    companies = Company.objects.bulk_create(companies, batch_size=500)
+    # bulk_create skips the signal that normally does this
+    bump_version('company')
+    return companies
+
+
+def iter_months(year, month, count):
+    """(year, month) pairs for `count` consecutive months ending at year/month, oldest first"""
+    months = []
+    for _ in range(count):
+        months.append((year, month))
+        month -= 1
+        if month == 0:
+            year, month = year - 1, 12
+    return reversed(months)
+
+
+def seed(companies=50, cleaners=20, months=12, entries_per_timesheet=5,
+         extra_hours_per_timesheet=2, end_year=None, end_month=None, seed=0):
+    """
+    Create companies plus one timesheet per cleaner per month, each with
+    `entries_per_timesheet` companies and up to `extra_hours_per_timesheet`
+    extra-hours rows. Returns a dict of counts.
+    """
+    rng = random.Random(seed)
+    today = date.today()
+    end_year = end_year or today.year
+    end_month = end_month or today.month
+
+    company_objs = seed_companies(companies, rng)
+    by_id = {company.pk: company for company in company_objs}
+    ids = list(by_id)
+
+    timesheet_count = 0
+    entry_count = 0
+    extra_count = 0
+    for year, month in iter_months(end_year, end_month, months):
+        for c in range(cleaners):
+            chosen = rng.sample(ids, min(entries_per_timesheet, len(ids)))
+            extra_hours = [
+                {
+                    'company_id': rng.choice(chosen),
+                    'date': date(year, month, rng.randint(1, 28)),
+                    'hours': Decimal(rng.randint(50, 400)) / 100,
+                    'description': "Seeded extra hours",
+                }
+                for _ in range(rng.randint(0, extra_hours_per_timesheet))
+            ]
+            create_timesheet_with_entries(
+                f"{SEED_PREFIX} Cleaner {c + 1:03d}", month, year, chosen, extra_hours, companies=by_id,
+            )
+            timesheet_count += 1
+            entry_count += len(chosen)
+            extra_count += len(extra_hours)
+
+    return {
+        'companies': len(company_objs),
+        'timesheets': timesheet_count,
+        'entries': entry_count,
+        'extra_hours': extra_count,
+    }
+
+
+def has_seeded():
+    """True if seed() has already run; its names would clash with the existing rows"""
+    return (
+        Company.objects.filter(name__startswith=f"{SEED_PREFIX} ").exists()
+        or Timesheet.objects.filter(cleaner_name__startswith=f"{SEED_PREFIX} ").exists()
+    )
+
+
+def clear_seeded():
+    """Delete everything created by seed()"""
+    Timesheet.objects.filter(cleaner_name__startswith=f"{SEED_PREFIX} ").delete()
+    Company.objects.filter(name__startswith=f"{SEED_PREFIX} ").delete()
@@ -0,0 +1,239 @@
+# timesheet/services.py
+"""
+Reusable service functions for timesheets, shared by the views, management
+commands and anything else that needs to create or query timesheets in bulk.
+"""
+from calendar import monthrange
+from datetime import date, timedelta
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .hours import hundredths_of, to_decimal, to_hundredths
+from .models import Company, ExtraHours, Timesheet, TimesheetEntry
+from .rollups import refresh_rollups, timesheet_keys
+from .schedule import decode_hours
+from .schedule_cache import schedule_cache
+from .versions import bump_version
+
+
+def _as_ids(values):
+    ids = []
+    for value in values:
+        try:
+            ids.append(int(value))
+        except (TypeError, ValueError):
+            raise ValidationError(f'Invalid company id: {value!r}')
+    return ids
+
+
+@transaction.atomic
+def create_timesheet_with_entries(cleaner_name, month, year, company_ids, extra_hours=(), companies=None):
+    """
+    Create a timesheet with one entry per company and optional extra hours in
+    a single transaction.
+
+    extra_hours is an iterable of dicts with 'hours' and optional 'date',
+    'company_id' and 'description'. `companies` may be a pre-loaded
+    {id: Company} mapping to skip the lookup (used by bulk importers).
+
+    Stored totals and rollups are computed here because bulk_create
+    bypasses the signal handlers in timesheet/signals.py.
+    """
+    company_ids = list(dict.fromkeys(_as_ids(company_ids)))
+    extra_hours = list(extra_hours)
+    extra_company_ids = _as_ids(eh['company_id'] for eh in extra_hours if eh.get('company_id'))
+
+    if companies is None:
+        companies = Company.objects.in_bulk(set(company_ids) | set(extra_company_ids))
+    missing = [pk for pk in company_ids + extra_company_ids if pk not in companies]
+    if missing:
+        raise ValidationError(f'Unknown company id(s): {", ".join(map(str, sorted(set(missing))))}')
+
+    if Timesheet.objects.filter(cleaner_name=cleaner_name, month=month, year=year).exists():
+        raise ValidationError('This cleaner already has a timesheet for that month.')
+
+    timesheet = Timesheet(cleaner_name=cleaner_name, month=month, year=year)
+    entries = [TimesheetEntry(timesheet=timesheet, company=companies[pk]) for pk in company_ids]
+    extras = [
+        ExtraHours(
+            timesheet=timesheet,
+            company=companies[int(eh['company_id'])] if eh.get('company_id') else None,
+            date=eh.get('date') or None,
+            hours=eh['hours'],
+            description=eh.get('description', ''),
+        )
+        for eh in extra_hours
+    ]
+
+    # One version lookup for all the companies instead of one per entry
+    versions = schedule_cache.versions(entry.company for entry in entries)
+    total = 0
+    for entry in entries:
+        entry.take_snapshot(versions.get(entry.company_id))
+        total += sum(entry.get_month_hundredths())
+    for eh in extras:
+        total += to_hundredths(eh.hours)
+    timesheet.total_hours = to_decimal(total)
+    timesheet.save()
+
+    TimesheetEntry.objects.bulk_create(entries, batch_size=500)
+    ExtraHours.objects.bulk_create(extras, batch_size=500)
+    refresh_rollups(
+        [(cleaner_name, year, month)],
+        [(pk, year, month) for pk in set(company_ids) | set(extra_company_ids)],
+    )
+    return timesheet
+
+
+@transaction.atomic
+def resync_with_company_patterns(timesheet_ids):
+    """
+    Re-take the pattern snapshots of the given timesheets' entries from
+    their companies' current patterns, then refresh the stored totals and
+    rollups. Returns the number of entries whose hours changed.
+    """
+    entries = list(
+        TimesheetEntry.objects.filter(timesheet_id__in=set(timesheet_ids)).select_related('timesheet', 'company')
+    )
+    changed = TimesheetEntry.retake_snapshots(entries)
+    timesheet_ids = {entry.timesheet_id for entry in changed}
+    Timesheet.refresh_totals(timesheet_ids)
+    refresh_rollups(*timesheet_keys(timesheet_ids))
+    for timesheet_id in timesheet_ids:
+        transaction.on_commit(lambda name=f'timesheet:{timesheet_id}': bump_version(name))
+    return len(changed)
+
+
+def _months_between(start, end):
+    """(year, month) pairs for every month overlapping start..end"""
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def hours_in_range(start, end, cleaner=None, company_ids=None, per_day=False):
+    """
+    Scheduled and extra hours per cleaner and per company for start..end
+    (inclusive), across as many months as the range covers.
+
+    Scheduled hours come from the entries' pattern snapshots. Rows are read
+    as flat tuples; only months cut by the range, or per-day output, need a
+    snapshot decoded, and each distinct one is decoded once. Dated extra
+    hours count when their date is in the range; undated ones count when
+    their timesheet's month starts inside the range. Everything is added up
+    in hundredths (see hours.py) and returned as Decimals.
+    """
+    if end < start:
+        raise ValidationError('end must not be before start')
+
+    months = set(_months_between(start, end))
+    # Months wholly inside the range can use the stored entry totals
+    whole_months = {
+        (year, month) for year, month in months
+        if start <= date(year, month, 1) and date(year, month, monthrange(year, month)[1]) <= end
+    }
+    # Flat rows instead of model instances: building thousands of entries
+    # dominated the run time
+    ts_filter = {'year__gte': start.year, 'year__lte': end.year}
+    if cleaner:
+        ts_filter['cleaner_name'] = cleaner
+    timesheets = {
+        pk: (name, year, month)
+        for pk, name, year, month in Timesheet.objects.filter(**ts_filter)
+        .values_list('pk', 'cleaner_name', 'year', 'month')
+        if (year, month) in months
+    }
+    related_filter = {f'timesheet__{key}': value for key, value in ts_filter.items()}
+    if company_ids:
+        related_filter['company_id__in'] = company_ids
+    entries = [
+        row for row in TimesheetEntry.objects.filter(**related_filter)
+        .values_list('timesheet_id', 'company_id', hundredths_of('total_hours'), 'hours_snapshot')
+        if row[0] in timesheets
+    ]
+    extras = [
+        row for row in ExtraHours.objects.filter(**related_filter)
+        .values_list('timesheet_id', 'company_id', 'date', hundredths_of('hours'))
+        if row[0] in timesheets
+    ]
+    company_names = dict(
+        Company.objects.filter(pk__in={row[1] for row in entries} | {row[1] for row in extras if row[1]})
+        .values_list('pk', 'name')
+    )
+
+    windows = {}
+
+    def window(snapshot, year, month):
+        """(first day, per-day vector, total) of a month snapshot clipped to the range"""
+        key = (snapshot, year, month)
+        if key not in windows:
+            first = max(start, date(year, month, 1))
+            last = min(end, date(year, month, monthrange(year, month)[1]))
+            vector = decode_hours(snapshot)[first.day - 1:last.day]
+            windows[key] = (first, vector, sum(vector))
+        return windows[key]
+
+    cleaners = {}
+    company_totals = {}
+    grand_total = 0
+
+    def result_for(timesheet_id):
+        return cleaners.setdefault(timesheets[timesheet_id][0], {
+            'total': 0, 'scheduled': 0, 'extra': 0, 'companies': {}, 'days': {},
+        })
+
+    def add_company(result, company_id, hours):
+        name = company_names[company_id]
+        result['companies'][name] = result['companies'].get(name, 0) + hours
+        company_totals[name] = company_totals.get(name, 0) + hours
+
+    for timesheet_id, company_id, total, snapshot in entries:
+        _, year, month = timesheets[timesheet_id]
+        if per_day or (year, month) not in whole_months:
+            first, vector, total = window(snapshot, year, month)
+        result = result_for(timesheet_id)
+        result['scheduled'] += total
+        add_company(result, company_id, total)
+        if per_day:
+            for offset, hours in enumerate(vector):
+                if hours:
+                    day = (first + timedelta(days=offset)).isoformat()
+                    result['days'][day] = result['days'].get(day, 0) + hours
+
+    for timesheet_id, company_id, day, hours in extras:
+        _, year, month = timesheets[timesheet_id]
+        if day:
+            if not start <= day <= end:
+                continue
+        elif not start <= date(year, month, 1) <= end:
+            continue
+        result = result_for(timesheet_id)
+        result['extra'] += hours
+        if company_id:
+            add_company(result, company_id, hours)
+        if per_day and day:
+            result['days'][day.isoformat()] = result['days'].get(day.isoformat(), 0) + hours
+
+    def as_decimals(totals):
+        return {key: to_decimal(hours) for key, hours in sorted(totals.items())}
+
+    for result in cleaners.values():
+        grand_total += result['scheduled'] + result['extra']
+        result['total'] = to_decimal(result['scheduled'] + result['extra'])
+        result['scheduled'] = to_decimal(result['scheduled'])
+        result['extra'] = to_decimal(result['extra'])
+        result['companies'] = {name: to_decimal(hours) for name, hours in result['companies'].items()}
+        if per_day:
+            result['days'] = as_decimals(result['days'])
+        else:
+            del result['days']
+
+    return {
+        'start': start,
+        'end': end,
+        'total': to_decimal(grand_total),
+        'companies': as_decimals(company_totals),
+        'cleaners': dict(sorted(cleaners.items())),
+    }
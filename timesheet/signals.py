@@ -0,0 +1,118 @@
+# timesheet/signals.py
+"""
+Keep the materialized total_hours columns on TimesheetEntry and Timesheet
+and the month rollups in timesheet/rollups.py in sync with the data they
+are derived from, and bump the version counters in timesheet/versions.py
+when the data behind them changes. Versions are bumped on commit, so a
+request that reads one after it has changed also sees the new data.
+
+Entries snapshot their company's pattern when they are created, so editing
+a company does not change any stored hours; see
+services.resync_with_company_patterns for applying a pattern change.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Company, ExtraHours, Timesheet, TimesheetEntry
+from .rollups import refresh_rollups, timesheet_keys
+from .schedule_cache import version_name
+from .versions import bump_version
+
+
+@receiver(post_save, sender=TimesheetEntry)
+@receiver(post_delete, sender=TimesheetEntry)
+@receiver(post_save, sender=ExtraHours)
+@receiver(post_delete, sender=ExtraHours)
+def refresh_timesheet_total(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    timesheet_ids = {instance.timesheet_id}
+    # A moved row also changes the total of the timesheet it came from
+    previous = getattr(instance, '_previous_timesheet_id', None)
+    if previous and previous != instance.timesheet_id:
+        timesheet_ids.add(previous)
+    Timesheet.refresh_totals(timesheet_ids)
+    for timesheet_id in timesheet_ids:
+        transaction.on_commit(lambda name=f'timesheet:{timesheet_id}': bump_version(name))
+    
+    cleaner_keys, company_keys = timesheet_keys(timesheet_ids)
+    # The row's company (old and new) may no longer appear in those timesheets
+    company_ids = {instance.company_id, getattr(instance, '_previous_company_id', None)} - {None}
+    company_keys.update((company_id, year, month) for company_id in company_ids for _, year, month in cleaner_keys)
+    refresh_rollups(cleaner_keys, company_keys)
+
+
+@receiver(pre_save, sender=TimesheetEntry)
+@receiver(pre_save, sender=ExtraHours)
+def remember_previous_timesheet(sender, instance, raw=False, **kwargs):
+    if raw or not instance.pk:
+        return
+    instance._previous_timesheet_id, instance._previous_company_id = (
+        sender.objects.filter(pk=instance.pk).values_list('timesheet_id', 'company_id').first() or (None, None)
+    )
+
+
+@receiver(pre_save, sender=TimesheetEntry)
+def set_entry_snapshot(sender, instance, raw=False, **kwargs):
+    # Runs after remember_previous_timesheet
+    if raw:
+        return
+    previous = (getattr(instance, '_previous_timesheet_id', None), getattr(instance, '_previous_company_id', None))
+    if not instance.hours_snapshot or previous != (instance.timesheet_id, instance.company_id):
+        # New entries, and entries moved to another timesheet or company,
+        # take the company's current pattern; others keep their snapshot
+        instance.take_snapshot()
+    else:
+        instance.total_hours = instance.get_total_hours()
+
+
+@receiver(pre_save, sender=Timesheet)
+def remember_previous_month(sender, instance, raw=False, **kwargs):
+    if raw or not instance.pk:
+        return
+    instance._previous_key = (
+        sender.objects.filter(pk=instance.pk).values_list('cleaner_name', 'year', 'month').first()
+    )
+
+
+@receiver(post_save, sender=Timesheet)
+def refresh_timesheet_entries(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(lambda name=f'timesheet:{instance.pk}': bump_version(name))
+    if created:
+        # New timesheets have no rows yet
+        refresh_rollups([(instance.cleaner_name, instance.year, instance.month)])
+        return
+    # Edits may change cleaner, month or year
+    previous = getattr(instance, '_previous_key', None)
+    if previous and previous[1:] != (instance.year, instance.month):
+        # The snapshots are of the old month
+        entries = list(instance.entries.select_related('company'))
+        for entry in entries:
+            entry.timesheet = instance
+        TimesheetEntry.retake_snapshots(entries)
+    Timesheet.refresh_totals([instance.pk])
+    
+    cleaner_keys, company_keys = timesheet_keys([instance.pk])
+    if previous:
+        _, year, month = previous
+        cleaner_keys.add(previous)
+        company_keys.update((company_id, year, month) for company_id, _, _ in list(company_keys))
+    refresh_rollups(cleaner_keys, company_keys)
+
+
+@receiver(post_delete, sender=Timesheet)
+def remove_timesheet_rollup(sender, instance, **kwargs):
+    transaction.on_commit(lambda name=f'timesheet:{instance.pk}': bump_version(name))
+    # Entries and extra hours were deleted (and their company rollups refreshed) first
+    refresh_rollups([(instance.cleaner_name, instance.year, instance.month)])
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_delete, sender=Company)
+def bump_company_version(sender, instance, raw=False, **kwargs):
+    transaction.on_commit(lambda: bump_version('company'))
+    # Retires this company's entries in schedule_cache in every process
+    transaction.on_commit(lambda name=version_name(instance.pk): bump_version(name))
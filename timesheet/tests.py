@@ -1,3 +1,1085 @@
-from django.test import TestCase
+# timesheet/tests.py
+import io
+import os
+import random
+import shutil
+import tempfile
+import time
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import QuerySet
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from openpyxl import load_workbook
+
+from . import jobs
+from .export_cache import ExportCache
+from .exports import (
+    DEFAULT_MAX_WORKERS, POOL_MIN_ITEMS, annual_timesheets, build_annual_workbook, export_workers,
+)
+from .forms import CompanyForm
+from .hours import to_decimal, to_float, to_hundredths, total as hours_total
+from .importing import import_timesheets, read_rows
+from .models import (
+    CleanerMonthRollup, Company, CompanyMonthRollup, ExportJob, ExtraHours, Timesheet, TimesheetEntry,
+    VersionCounter,
+)
+from .profiling import wants_profile
+from .rollups import rebuild_rollups, refresh_rollups
+from .schedule import CompiledSchedule, compile_company, decode_hours, encode_hours
+from .schedule_cache import ScheduleCache, schedule_cache
+from .services import create_timesheet_with_entries, hours_in_range, resync_with_company_patterns
+from .versions import bump_version, get_version, get_versions
+from .views import TimesheetListView
+
+
+class MigrationTestCase(TransactionTestCase):
+    """Creates data at migrate_from with create_data(apps), then migrates to the latest migration"""
+
+    migrate_from = [('timesheet', '0001_initial')]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        self.migrate_to = executor.loader.graph.leaf_nodes('timesheet')
+        executor.migrate(self.migrate_from)
+        self.create_data(executor.loader.project_state(self.migrate_from).apps)
+
+    def tearDown(self):
+        MigrationExecutor(connection).migrate(self.migrate_to)
+
+    def create_data(self, apps):
+        raise NotImplementedError
+
+    def migrate(self):
+        """Run the remaining migrations and return the resulting app registry"""
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(self.migrate_to)
+        return executor.loader.project_state(self.migrate_to).apps
+
+
+class DuplicateCompanyNameMigrationTests(MigrationTestCase):
+    """Migrating data with duplicate company names (as in the shipped db.sqlite3) from 0001"""
+
+    def create_data(self, apps):
+        Company = apps.get_model('timesheet', 'Company')
+        Timesheet = apps.get_model('timesheet', 'Timesheet')
+        TimesheetEntry = apps.get_model('timesheet', 'TimesheetEntry')
+        ExtraHours = apps.get_model('timesheet', 'ExtraHours')
+
+        self.first = Company.objects.create(name='Oris Dental', mon_hours=Decimal('2.5'))
+        self.second = Company.objects.create(name='Oris Dental', fri_hours=Decimal('1.5'))
+        timesheet = Timesheet.objects.create(cleaner_name='Kim', month=3, year=2025)
+        TimesheetEntry.objects.create(timesheet=timesheet, company=self.first)
+        TimesheetEntry.objects.create(timesheet=timesheet, company=self.second)
+        # A second timesheet for the same cleaner and month, merged by 0006
+        duplicate = Timesheet.objects.create(cleaner_name='Kim ', month=3, year=2025)
+        TimesheetEntry.objects.create(timesheet=duplicate, company=self.first)
+        ExtraHours.objects.create(timesheet=duplicate, company=self.first, date=date(2025, 3, 8), hours=Decimal('2.0'))
+
+    def test_duplicates_are_renamed_before_names_become_unique(self):
+        apps = self.migrate()
+        Company = apps.get_model('timesheet', 'Company')
+        Timesheet = apps.get_model('timesheet', 'Timesheet')
+        CleanerMonthRollup = apps.get_model('timesheet', 'CleanerMonthRollup')
+        CompanyMonthRollup = apps.get_model('timesheet', 'CompanyMonthRollup')
+
+        names = dict(Company.objects.values_list('pk', 'name'))
+        self.assertEqual(names, {self.first.pk: 'Oris Dental', self.second.pk: f'Oris Dental ({self.second.pk})'})
+        # March 2025: five Mondays at 2.5 and four Fridays at 1.5, plus the merged extra hours
+        self.assertEqual(Timesheet.objects.get().total_hours, Decimal('20.50'))
+        self.assertEqual(
+            list(CleanerMonthRollup.objects.values_list('cleaner_name', 'hours', 'timesheet_count')),
+            [('Kim', Decimal('20.50'), 1)],
+        )
+        self.assertEqual(
+            dict(CompanyMonthRollup.objects.values_list('company_id', 'hours')),
+            {self.first.pk: Decimal('14.50'), self.second.pk: Decimal('6.00')},
+        )
+
+
+class TrimmedCleanerNameMigrationTests(MigrationTestCase):
+    """Cleaner names that 0006 only trims, with nothing to merge"""
+
+    def create_data(self, apps):
+        Company = apps.get_model('timesheet', 'Company')
+        Timesheet = apps.get_model('timesheet', 'Timesheet')
+        TimesheetEntry = apps.get_model('timesheet', 'TimesheetEntry')
+        company = Company.objects.create(name='Acme', mon_hours=Decimal('2.5'))
+        TimesheetEntry.objects.create(
+            timesheet=Timesheet.objects.create(cleaner_name=' Lee ', month=3, year=2025), company=company,
+        )
+
+    def test_cleaner_rollups_follow_the_trimmed_names(self):
+        apps = self.migrate()
+        CleanerMonthRollup = apps.get_model('timesheet', 'CleanerMonthRollup')
+        self.assertEqual(
+            list(CleanerMonthRollup.objects.values_list('cleaner_name', 'year', 'month', 'hours')),
+            [('Lee', 2025, 3, Decimal('12.50'))],
+        )
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CacheIsolatedTestCase(TestCase):
+    """
+    TestCase with a private cache. Version bumps wait for a commit that never
+    comes inside a TestCase, so both caches start empty for every test.
+    """
+
+    def setUp(self):
+        cache.clear()
+        schedule_cache.clear()
+
+
+class TimesheetDetailCacheTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.company = Company(name='Acme')
+        self.company.set_hours(0, 0, Decimal('2.5'))
+        self.company.save()
+        self.timesheet = Timesheet.objects.create(cleaner_name='Kim', month=3, year=2025)
+        TimesheetEntry.objects.create(timesheet=self.timesheet, company=self.company)
+        self.extra = ExtraHours.objects.create(
+            timesheet=self.timesheet, date=date(2025, 3, 8), hours=Decimal('1.00'), description='Windows',
+        )
+
+    def test_detail_shows_an_edit_made_after_it_was_cached(self):
+        url = reverse('timesheet_detail', args=[self.timesheet.pk])
+        self.assertContains(self.client.get(url), 'Windows')
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.client.post(
+                reverse('update_extra_hours', args=[self.timesheet.pk, self.extra.pk]),
+                {'date': '2025-03-08', 'hours': '3.00', 'description': 'Carpets'},
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['grand_total'], '15.50')
+        # The version is only bumped once the edit has been committed
+        self.assertTrue(callbacks)
+
+        response = self.client.get(url)
+        self.assertContains(response, 'Carpets')
+        self.assertNotContains(response, 'Windows')
+
+
+class CompanyPreviewTests(CacheIsolatedTestCase):
+    def preview(self, company):
+        response = self.client.get(reverse('company_preview'), {'company_id': company.pk})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_weekly_company_has_old_and_new_keys(self):
+        company = Company(name='Weekly')
+        company.set_hours(0, 0, Decimal('2.5'))
+        company.save()
+        data = self.preview(company)
+        self.assertEqual(data['cycle_weeks'], 1)
+        self.assertEqual([week['label'] for week in data['weeks']], ['A'])
+        self.assertEqual(data['weeks'][0]['hours']['mon'], 2.5)
+        self.assertEqual(data['pattern_type'], 'weekly')
+        self.assertEqual(data['weekly']['mon'], 2.5)
+        self.assertEqual(data['weekly']['tue'], 0.0)
+        self.assertEqual(set(data['biweekly_b']), {'mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun'})
+
+    def test_biweekly_company_has_old_and_new_keys(self):
+        company = Company(name='Biweekly', cycle_weeks=2, cycle_start_date=date(2025, 3, 3))
+        company.set_hours(0, 0, Decimal('1.5'))
+        company.set_hours(1, 4, Decimal('3'))
+        company.save()
+        data = self.preview(company)
+        self.assertEqual(data['cycle_start_date'], '2025-03-03')
+        self.assertEqual([week['hours']['fri'] for week in data['weeks']], [0.0, 3.0])
+        self.assertEqual(data['pattern_type'], 'biweekly')
+        self.assertEqual(data['biweekly_a']['mon'], 1.5)
+        self.assertEqual(data['biweekly_b']['fri'], 3.0)
+
+    def test_longer_rotations_only_have_the_new_keys(self):
+        company = Company.objects.create(name='Rotation', cycle_weeks=3, cycle_start_date=date(2025, 3, 3))
+        data = self.preview(company)
+        self.assertEqual(len(data['weeks']), 3)
+        self.assertNotIn('pattern_type', data)
+
+
+class ExportCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_open_files_survive_eviction(self):
+        cache = ExportCache(self.directory, max_bytes=0)
+        put = cache.put('first', lambda f: f.write(b'first'))
+        got = cache.get('first')
+        # A zero budget evicts everything but the file just written
+        cache.put('second', lambda f: f.write(b'second'))
+        self.assertFalse(os.path.exists(cache.path_for('first')))
+        with put, got:
+            self.assertEqual(put.read(), b'first')
+            self.assertEqual(got.read(), b'first')
+        self.assertIsNone(cache.get('first'))
+
+
+class ExcelExportTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        exports = override_settings(TIMESHEET_EXPORT_CACHE_DIR=directory)
+        exports.enable()
+        self.addCleanup(exports.disable)
+        self.company = Company.objects.create(name='Acme')
+        self.timesheet = Timesheet.objects.create(cleaner_name='Kim', month=3, year=2025)
+        TimesheetEntry.objects.create(timesheet=self.timesheet, company=self.company)
+        self.url = reverse('generate_excel', args=[self.timesheet.pk])
+
+    def test_last_modified_follows_the_timesheet_not_its_companies(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.timesheet.refresh_from_db()
+        self.assertEqual(response['Last-Modified'], http_date(int(self.timesheet.updated_at.timestamp())))
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'PK'))
+
+        Company.objects.filter(pk=self.company.pk).update(updated_at=timezone.now() + timedelta(days=1))
+        self.assertEqual(self.client.get(self.url)['Last-Modified'], response['Last-Modified'])
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
+class WantsProfileTests(SimpleTestCase):
+    def request(self, query='', staff=True, **headers):
+        request = RequestFactory().get(f'/?{query}', **headers)
+        request.user = SimpleNamespace(is_active=True, is_staff=staff)
+        return request
+
+    def test_trigger_values(self):
+        self.assertTrue(wants_profile(self.request('_profile=1')))
+        self.assertTrue(wants_profile(self.request(HTTP_X_PROFILE='1')))
+        self.assertFalse(wants_profile(self.request()))
+        self.assertFalse(wants_profile(self.request('_profile=0')))
+        self.assertFalse(wants_profile(self.request('_profile=')))
+        self.assertFalse(wants_profile(self.request(HTTP_X_PROFILE='0')))
+        self.assertFalse(wants_profile(self.request('_profile=1', staff=False)))
+
+
+class ImportTimesheetsTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        company = Company(name='Acme')
+        company.set_hours(0, 0, Decimal('2.5'))
+        company.save()
+
+    def run_import(self, text):
+        return import_timesheets(read_rows(io.StringIO(text), 'jsonl'))
+
+    def test_valid_rows_are_written_with_their_totals(self):
+        stats = self.run_import(
+            '{"cleaner": "Kim", "year": 2025, "month": 3, "companies": ["acme"],'
+            ' "extra_hours": [{"date": "2025-03-08", "hours": "1.25"}]}\n'
+        )
+        self.assertEqual((stats['timesheets'], stats['entries'], stats['extra_hours'], stats['errors']), (1, 1, 1, []))
+        timesheet = Timesheet.objects.get()
+        self.assertEqual(timesheet.total_hours, Decimal('13.75'))
+        self.assertEqual(timesheet.entries.get().total_hours, Decimal('12.50'))
+
+    def test_companies_must_be_a_list(self):
+        stats = self.run_import(
+            '{"cleaner": "Kim", "year": 2025, "month": 3, "companies": "Acme"}\n'
+            '{"cleaner": "Lee", "year": 2025, "month": 3, "extra_hours": {"hours": 1}}\n'
+            '{"cleaner": "Max", "year": 2025, "month": 3, "companies": ["Acme"]}\n'
+        )
+        self.assertEqual(stats['errors'], [(1, 'Companies must be a list of names'), (2, 'Extra hours must be a list')])
+        self.assertEqual(list(Timesheet.objects.values_list('cleaner_name', flat=True)), ['Max'])
+
+    def test_only_a_sample_of_the_errors_is_kept(self):
+        rows = ((line_num, {'cleaner': ''}) for line_num in range(1, 10001))
+        stats = import_timesheets(rows, max_errors=5)
+        self.assertEqual(stats['error_count'], 10000)
+        self.assertEqual(stats['errors'], [(line_num, 'Missing cleaner') for line_num in range(1, 6)])
+
+
+class BulkExportTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        company = Company.objects.create(name='Acme')
+        for i in range(POOL_MIN_ITEMS + 1):
+            timesheet = Timesheet.objects.create(cleaner_name=f'Cleaner {i}', month=3, year=2025)
+            TimesheetEntry.objects.create(timesheet=timesheet, company=company)
+
+    @mock.patch('timesheet.exports.ProcessPoolExecutor', side_effect=AssertionError("no pool in requests"))
+    def test_month_zip_renders_in_the_request_process(self, pool):
+        response = self.client.get(reverse('export_month'), {'year': 2025, 'month': 3})
+        self.assertEqual(response.status_code, 200)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(len(archive.namelist()), POOL_MIN_ITEMS + 1)
+        pool.assert_not_called()
+
+    @override_settings(TIMESHEET_EXPORT_WORKERS=None)
+    def test_default_pool_size_is_capped(self):
+        with mock.patch('timesheet.exports.os.cpu_count', return_value=64):
+            self.assertEqual(export_workers(), DEFAULT_MAX_WORKERS)
+
+
+class TimesheetApiTests(CacheIsolatedTestCase):
+    def test_detail_serializes_hours_as_floats(self):
+        company = Company(name='Acme')
+        company.set_hours(0, 0, Decimal('2.5'))
+        company.save()
+        timesheet = Timesheet.objects.create(cleaner_name='Kim', month=3, year=2025)
+        TimesheetEntry.objects.create(timesheet=timesheet, company=company)
+        ExtraHours.objects.create(timesheet=timesheet, date=date(2025, 3, 8), hours=Decimal('1.25'))
+
+        data = self.client.get(reverse('api_timesheet_detail', args=[timesheet.pk])).json()
+        self.assertEqual(data['total_hours'], 13.75)
+        self.assertEqual(data['entries'][0]['total_hours'], 12.5)
+        self.assertEqual(data['extra_hours'][0]['hours'], 1.25)
+        # March 2025 starts on a Saturday
+        self.assertEqual(data['days'][:3], [0.0, 0.0, 2.5])
+        self.assertEqual(data['days'][7], 1.25)
+
+
+def make_company(name, weeks, cycle_start_date=None, save=True):
+    """Company whose rotation is `weeks`: one {weekday: hours} dict per week, week A first"""
+    company = Company(name=name, cycle_weeks=len(weeks), cycle_start_date=cycle_start_date)
+    for week, hours in enumerate(weeks):
+        for weekday, value in hours.items():
+            company.set_hours(week, weekday, Decimal(value))
+    if save:
+        company.save()
+    return company
+
+
+class HoursTests(SimpleTestCase):
+    def test_to_hundredths_rounds_half_up(self):
+        self.assertEqual(to_hundredths(Decimal('2.5')), 250)
+        self.assertEqual(to_hundredths(Decimal('2.505')), 251)
+        self.assertEqual(to_hundredths(Decimal('0.125')), 13)
+        self.assertEqual(to_hundredths(3), 300)
+        self.assertEqual(to_hundredths(1.1), 110)
+        self.assertEqual(to_hundredths('0.75'), 75)
+        self.assertEqual(to_hundredths(None), 0)
+
+    def test_conversions_back(self):
+        self.assertEqual(to_decimal(250), Decimal('2.50'))
+        self.assertEqual(str(to_decimal(5)), '0.05')
+        self.assertEqual(to_float(1375), 13.75)
+        self.assertEqual(hours_total([Decimal('0.10')] * 3 + [Decimal('0.70')]), 100)
+
+
+class ScheduleTests(SimpleTestCase):
+    # March 2025 starts on a Saturday; its Mondays are the 3rd, 10th, 17th, 24th and 31st
+    MONDAYS = [3, 10, 17, 24, 31]
+
+    def month(self, company, year=2025, month=3):
+        return compile_company(company).month_vector(year, month)
+
+    def test_weekly_pattern_repeats_by_weekday(self):
+        company = make_company('Weekly', [{0: '2.5', 5: '1'}], save=False)
+        vector = self.month(company)
+        self.assertEqual(len(vector), 31)
+        self.assertEqual([day for day, h in enumerate(vector, 1) if h == 250], self.MONDAYS)
+        self.assertEqual([day for day, h in enumerate(vector, 1) if h == 100], [1, 8, 15, 22, 29])
+        self.assertEqual(compile_company(company).month_total(2025, 3), sum(vector))
+
+    def test_biweekly_rotation_alternates_from_the_start_date(self):
+        company = make_company('Biweekly', [{0: '1'}, {0: '2'}], cycle_start_date=date(2025, 3, 3), save=False)
+        vector = self.month(company)
+        self.assertEqual([vector[day - 1] for day in self.MONDAYS], [100, 200, 100, 200, 100])
+
+    def test_rotation_started_mid_week_keeps_weekdays(self):
+        # Week A runs Wednesday 5th to Tuesday 11th, week B from Wednesday 12th
+        company = make_company(
+            'Midweek', [{0: '1', 2: '3'}, {0: '2', 2: '4'}], cycle_start_date=date(2025, 3, 5), save=False,
+        )
+        vector = self.month(company)
+        self.assertEqual([vector[day - 1] for day in (5, 12, 19, 26)], [300, 400, 300, 400])
+        self.assertEqual([vector[day - 1] for day in (10, 17, 24, 31)], [100, 200, 100, 200])
+
+    def test_days_before_the_start_date_use_week_a(self):
+        company = make_company('Later', [{0: '1'}, {0: '2'}], cycle_start_date=date(2025, 3, 17), save=False)
+        vector = self.month(company)
+        # 3rd and 10th fall before the start, then the rotation runs A, B, A
+        self.assertEqual([vector[day - 1] for day in self.MONDAYS], [100, 100, 100, 200, 100])
+        self.assertEqual(self.month(company, 2025, 1), self.month(make_company('A', [{0: '1'}], save=False), 2025, 1))
+
+    def test_longer_rotation(self):
+        company = make_company('Three', [{0: '1'}, {0: '2'}, {0: '3'}], cycle_start_date=date(2025, 3, 3), save=False)
+        vector = self.month(company)
+        self.assertEqual([vector[day - 1] for day in self.MONDAYS], [100, 200, 300, 100, 200])
+
+    def test_rotation_without_start_date_has_no_hours(self):
+        company = make_company('Unstarted', [{0: '1'}, {0: '2'}], save=False)
+        self.assertEqual(set(self.month(company)), {0})
+
+    def test_range_total_matches_the_vector(self):
+        rng = random.Random(0)
+        for _ in range(200):
+            weeks = rng.randint(1, 4)
+            slots = [rng.choice([0, 0, 50, 125, 250]) for _ in range(7 * weeks)]
+            anchor = date(2025, 1, 1) + timedelta(days=rng.randint(0, 120)) if weeks > 1 else None
+            schedule = CompiledSchedule(slots, anchor=anchor, lead_slots=slots[:7] if anchor else None)
+            start = date(2025, 1, 1) + timedelta(days=rng.randint(0, 150))
+            n_days = rng.randint(1, 70)
+            self.assertEqual(schedule.range_total(start, n_days), sum(schedule.range_vector(start, n_days)))
+
+    def test_snapshot_round_trip(self):
+        vector = self.month(make_company('Weekly', [{0: '2.5'}], save=False))
+        self.assertEqual(decode_hours(encode_hours(vector)), vector)
+
+
+class SignalTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.acme = make_company('Acme', [{0: '2.5'}])
+        self.globex = make_company('Globex', [{4: '1.5'}])
+        self.timesheet = Timesheet.objects.create(cleaner_name='Kim', month=3, year=2025)
+
+    def rollups(self):
+        cleaners = dict(
+            ((name, year, month), (hours, count))
+            for name, year, month, hours, count in CleanerMonthRollup.objects.values_list(
+                'cleaner_name', 'year', 'month', 'hours', 'timesheet_count')
+        )
+        companies = dict(
+            ((company_id, year, month), hours)
+            for company_id, year, month, hours in CompanyMonthRollup.objects.values_list(
+                'company_id', 'year', 'month', 'hours').exclude(hours=0)
+        )
+        return cleaners, companies
+
+    def test_totals_and_rollups_follow_entries_and_extra_hours(self):
+        entry = TimesheetEntry.objects.create(timesheet=self.timesheet, company=self.acme)
+        self.assertEqual(entry.total_hours, Decimal('12.50'))
+        extra = ExtraHours.objects.create(
+            timesheet=self.timesheet, company=self.globex, date=date(2025, 3, 8), hours=Decimal('2.00'),
+        )
+        self.timesheet.refresh_from_db()
+        self.assertEqual(self.timesheet.total_hours, Decimal('14.50'))
+        self.assertEqual(self.rollups(), (
+            {('Kim', 2025, 3): (Decimal('14.50'), 1)},
+            {(self.acme.pk, 2025, 3): Decimal('12.50'), (self.globex.pk, 2025, 3): Decimal('2.00')},
+        ))
+
+        extra.delete()
+        entry.company = self.globex
+        entry.save()
+        self.timesheet.refresh_from_db()
+        # Four Fridays in March 2025
+        self.assertEqual(self.timesheet.total_hours, Decimal('6.00'))
+        self.assertEqual(self.rollups(), (
+            {('Kim', 2025, 3): (Decimal('6.00'), 1)},
+            {(self.globex.pk, 2025, 3): Decimal('6.00')},
+        ))
+
+    def test_moving_a_row_refreshes_both_timesheets(self):
+        other = Timesheet.objects.create(cleaner_name='Lee', month=3, year=2025)
+        extra = ExtraHours.objects.create(timesheet=self.timesheet, date=date(2025, 3, 8), hours=Decimal('2.00'))
+        extra.timesheet = other
+        extra.save()
+        totals = dict(Timesheet.objects.values_list('cleaner_name', 'total_hours'))
+        self.assertEqual(totals, {'Kim': Decimal('0.00'), 'Lee': Decimal('2.00')})
+        self.assertEqual(self.rollups()[0][('Lee', 2025, 3)], (Decimal('2.00'), 1))
+
+    def test_changing_the_month_retakes_the_snapshots(self):
+        TimesheetEntry.objects.create(timesheet=self.timesheet, company=self.acme)
+        self.timesheet.month = 4
+        self.timesheet.save()
+        self.timesheet.refresh_from_db()
+        # Four Mondays in April 2025
+        self.assertEqual(self.timesheet.total_hours, Decimal('10.00'))
+        self.assertEqual(self.rollups(), (
+            {('Kim', 2025, 4): (Decimal('10.00'), 1)},
+            {(self.acme.pk, 2025, 4): Decimal('10.00')},
+        ))
+
+    def test_pattern_changes_wait_for_a_resync(self):
+        entry = TimesheetEntry.objects.create(timesheet=self.timesheet, company=self.acme)
+        self.acme.set_hours(0, 0, Decimal('3'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.acme.save()
+        entry.refresh_from_db()
+        self.assertEqual(entry.total_hours, Decimal('12.50'))
+
+        self.assertEqual(resync_with_company_patterns([self.timesheet.pk]), 1)
+        entry.refresh_from_db()
+        self.timesheet.refresh_from_db()
+        self.assertEqual((entry.total_hours, self.timesheet.total_hours), (Decimal('15.00'), Decimal('15.00')))
+        self.assertEqual(self.rollups()[1], {(self.acme.pk, 2025, 3): Decimal('15.00')})
+
+    def test_versions_are_bumped_on_commit(self):
+        name = f'timesheet:{self.timesheet.pk}'
+        before = get_version(name), get_version('company')
+        with self.captureOnCommitCallbacks() as callbacks:
+            TimesheetEntry.objects.create(timesheet=self.timesheet, company=self.acme)
+            self.acme.save()
+        # Nothing changes until the transaction commits
+        self.assertEqual((get_version(name), get_version('company')), before)
+        for callback in callbacks:
+            callback()
+        after = get_version(name), get_version('company')
+        self.assertGreater(after[0], before[0])
+        self.assertGreater(after[1], before[1])
+
+    def test_deleting_a_timesheet_removes_its_rollups(self):
+        TimesheetEntry.objects.create(timesheet=self.timesheet, company=self.acme)
+        self.timesheet.delete()
+        self.assertEqual(self.rollups(), ({}, {}))
+
+
+class TimesheetEditTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.acme = make_company('Acme', [{0: '2.5'}])
+        self.globex = make_company('Globex', [{4: '1.5'}])
+        self.timesheet = Timesheet.objects.create(cleaner_name='Kim', month=3, year=2025)
+        self.entry = TimesheetEntry.objects.create(timesheet=self.timesheet, company=self.acme)
+
+    def post(self, name, *args, **data):
+        return self.client.post(reverse(name, args=[self.timesheet.pk, *args]), data)
+
+    def test_add_entry(self):
+        response = self.post('add_entry', company=self.globex.pk)
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual(data['grand_total'], '18.50')
+        self.assertEqual(data['entry']['company'], 'Globex')
+        self.assertEqual(len(data['cells']), 31)
+        self.assertEqual(data['cells'][6], {'entry': data['entry']['id'], 'day': 7, 'hours': '1.50'})
+
+    def test_add_entry_rejects_a_company_already_on_the_timesheet(self):
+        response = self.post('add_entry', company=self.acme.pk)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('already on this timesheet', response.json()['error'])
+        self.assertEqual(self.timesheet.entries.count(), 1)
+
+    def test_update_entry_only_sends_changed_days(self):
+        response = self.post('update_entry', self.entry.pk, company=self.globex.pk)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['grand_total'], '6.00')
+        # Five Mondays lose their hours and four Fridays gain some
+        self.assertEqual([cell['day'] for cell in data['cells']], [3, 7, 10, 14, 17, 21, 24, 28, 31])
+
+    def test_delete_entry(self):
+        response = self.post('delete_entry', self.entry.pk)
+        self.assertEqual(response.json(), {'grand_total': '0.00', 'removed_entry': self.entry.pk})
+        self.assertFalse(TimesheetEntry.objects.exists())
+
+    def test_extra_hours_round_trip(self):
+        response = self.post('add_extra_hours', date='2025-03-08', hours='1.25', description='Windows')
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual((data['grand_total'], data['extra_hours']['hours']), ('13.75', '1.25'))
+
+        extra_pk = data['extra_hours']['id']
+        response = self.post('update_extra_hours', extra_pk, date='2025-03-09', hours='2', company=self.acme.pk)
+        self.assertEqual(response.json()['extra_hours']['company'], 'Acme')
+        self.assertEqual(response.json()['grand_total'], '14.50')
+
+        response = self.post('delete_extra_hours', extra_pk)
+        self.assertEqual(response.json(), {'grand_total': '12.50', 'removed_extra_hours': extra_pk})
+
+    def test_extra_hours_must_be_in_the_month_and_positive(self):
+        response = self.post('add_extra_hours', date='2025-04-01', hours='1')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Pick a date in March 2025', response.json()['error'])
+        response = self.post('add_extra_hours', date='2025-03-01', hours='0')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ExtraHours.objects.exists())
+
+    def test_rows_of_other_timesheets_are_not_found(self):
+        other = Timesheet.objects.create(cleaner_name='Lee', month=3, year=2025)
+        response = self.client.post(reverse('delete_entry', args=[other.pk, self.entry.pk]))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.client.get(reverse('delete_entry', args=[self.timesheet.pk, self.entry.pk])).status_code, 405)
+
+
+class RollupTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.acme = make_company('Acme', [{0: '2.5'}])
+        self.timesheet = Timesheet.objects.create(cleaner_name='Kim', month=3, year=2025)
+        TimesheetEntry.objects.create(timesheet=self.timesheet, company=self.acme)
+
+    def test_refreshing_a_key_twice_updates_its_row_in_place(self):
+        cleaner_key, company_key = ('Kim', 2025, 3), (self.acme.pk, 2025, 3)
+        cleaner_row = CleanerMonthRollup.objects.get()
+        company_row = CompanyMonthRollup.objects.get()
+        # As left behind by another transaction's refresh: the rows already exist
+        CleanerMonthRollup.objects.update(hours=0, timesheet_count=0)
+        CompanyMonthRollup.objects.update(hours=0)
+        with mock.patch('django.db.models.query.QuerySet.delete', side_effect=AssertionError("deleted")):
+            refresh_rollups([cleaner_key], [company_key])
+            refresh_rollups([cleaner_key], [company_key])
+        cleaner_row.refresh_from_db()
+        company_row.refresh_from_db()
+        self.assertEqual((cleaner_row.hours, cleaner_row.timesheet_count), (Decimal('12.50'), 1))
+        self.assertEqual((company_row.hours, company_row.timesheet_count), (Decimal('12.50'), 1))
+
+    def test_keys_without_data_are_deleted(self):
+        TimesheetEntry.objects.all().delete()
+        self.assertFalse(CompanyMonthRollup.objects.exists())
+        self.timesheet.delete()
+        self.assertFalse(CleanerMonthRollup.objects.exists())
+
+    def test_rebuild_matches_the_incremental_rollups(self):
+        other = make_company('Globex', [{4: '1.5'}])
+        ExtraHours.objects.create(timesheet=self.timesheet, company=other, date=date(2025, 3, 8), hours=Decimal('2'))
+        before = (
+            sorted(CleanerMonthRollup.objects.values_list('cleaner_name', 'year', 'month', 'hours', 'timesheet_count')),
+            sorted(CompanyMonthRollup.objects.values_list('company_id', 'year', 'month', 'hours', 'timesheet_count')),
+        )
+        rebuild_rollups()
+        after = (
+            sorted(CleanerMonthRollup.objects.values_list('cleaner_name', 'year', 'month', 'hours', 'timesheet_count')),
+            sorted(CompanyMonthRollup.objects.values_list('company_id', 'year', 'month', 'hours', 'timesheet_count')),
+        )
+        self.assertEqual(before, after)
+        self.assertEqual(after[1], [(self.acme.pk, 2025, 3, Decimal('12.50'), 1), (other.pk, 2025, 3, Decimal('2.00'), 0)])
+
+
+class DashboardTests(CacheIsolatedTestCase):
+    def test_hours_per_month_with_the_change_on_the_compared_year(self):
+        acme = make_company('Acme', [{0: '2.5'}])
+        for year in (2024, 2025):
+            timesheet = Timesheet.objects.create(cleaner_name='Kim', month=3, year=year)
+            TimesheetEntry.objects.create(timesheet=timesheet, company=acme)
+
+        response = self.client.get(reverse('dashboard'), {'year': 2025})
+        self.assertEqual(response.status_code, 200)
+        context = response.context
+        self.assertEqual(context['compare'], 2024)
+        [row] = context['rows']
+        self.assertEqual(row['name'], 'Acme')
+        # Five Mondays in March 2025, four in March 2024
+        self.assertEqual(row['months'][2], Decimal('12.50'))
+        self.assertEqual((row['total'], row['compare_total']), (Decimal('12.50'), Decimal('10.00')))
+        self.assertEqual(row['change'], Decimal('25.0'))
+
+        response = self.client.get(reverse('dashboard'), {'year': 2025, 'by': 'cleaner'})
+        self.assertEqual([row['name'] for row in response.context['rows']], ['Kim'])
+
+
+class VersionTests(CacheIsolatedTestCase):
+    def test_counters_start_from_the_clock_and_only_go_up(self):
+        before = int(time.time() * 1000)
+        first = get_version('example')
+        self.assertGreaterEqual(first, before)
+        self.assertEqual(get_version('example'), first)
+        self.assertEqual(bump_version('example'), first + 1)
+        self.assertEqual(bump_version('example'), first + 2)
+        self.assertEqual(get_versions(['example', 'other'])['example'], first + 2)
+
+    def test_bumping_a_missing_counter_creates_it(self):
+        self.assertGreater(bump_version('fresh'), 0)
+        self.assertEqual(VersionCounter.objects.filter(name='fresh').count(), 1)
+
+
+class ScheduleCacheTests(CacheIsolatedTestCase):
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = ScheduleCache(max_entries=2)
+        companies = [make_company(name, [{0: '1'}]) for name in ('A', 'B', 'C')]
+        cache.schedule(companies[0])
+        cache.schedule(companies[1])
+        cache.schedule(companies[0])
+        cache.schedule(companies[2])
+        stats = cache.stats()
+        self.assertEqual((stats['entries'], stats['hits'], stats['misses'], stats['evictions']), (2, 1, 3, 1))
+        # B was the least recently used
+        cache.schedule(companies[0])
+        cache.schedule(companies[1])
+        self.assertEqual((cache.stats()['hits'], cache.stats()['misses']), (2, 4))
+
+    def test_saving_a_company_invalidates_its_entries(self):
+        cache = ScheduleCache()
+        company = make_company('Acme', [{0: '2.5'}])
+        self.assertEqual(cache.month_vector(company, 2025, 3)[2], 250)
+        company.set_hours(0, 0, Decimal('3'))
+        # Until the save commits, the old version (and vector) is still current
+        with self.captureOnCommitCallbacks(execute=True):
+            company.save()
+        self.assertEqual(cache.month_vector(company, 2025, 3)[2], 300)
+        self.assertEqual(cache.stats()['hits'], 0)
+        self.assertEqual(cache.month_vector(company, 2025, 3)[2], 300)
+        self.assertEqual(cache.stats()['hits'], 1)
+
+
+class CreateTimesheetTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.acme = make_company('Acme', [{0: '2.5'}])
+        self.globex = make_company('Globex', [{4: '1.5'}])
+
+    def test_entries_extra_hours_totals_and_rollups_in_one_call(self):
+        # Snapshots use one batched version lookup, never one per entry
+        with mock.patch('timesheet.schedule_cache.get_version', side_effect=AssertionError("per-entry lookup")):
+            timesheet = create_timesheet_with_entries(
+                'Kim', 3, 2025, [self.acme.pk, str(self.globex.pk), self.acme.pk],
+                extra_hours=[{'hours': Decimal('2'), 'date': date(2025, 3, 8), 'company_id': self.globex.pk}],
+            )
+        self.assertEqual(timesheet.total_hours, Decimal('20.50'))
+        self.assertEqual(
+            dict(timesheet.entries.values_list('company__name', 'total_hours')),
+            {'Acme': Decimal('12.50'), 'Globex': Decimal('6.00')},
+        )
+        self.assertEqual(CleanerMonthRollup.objects.get().hours, Decimal('20.50'))
+        self.assertEqual(
+            dict(CompanyMonthRollup.objects.values_list('company_id', 'hours')),
+            {self.acme.pk: Decimal('12.50'), self.globex.pk: Decimal('8.00')},
+        )
+
+    def test_unknown_companies_and_repeated_months_are_rejected(self):
+        with self.assertRaisesMessage(ValidationError, 'Unknown company id(s): 999'):
+            create_timesheet_with_entries('Kim', 3, 2025, [self.acme.pk, 999])
+        with self.assertRaisesMessage(ValidationError, 'Invalid company id'):
+            create_timesheet_with_entries('Kim', 3, 2025, ['acme'])
+        create_timesheet_with_entries('Kim', 3, 2025, [self.acme.pk])
+        with self.assertRaisesMessage(ValidationError, 'already has a timesheet'):
+            create_timesheet_with_entries('Kim', 3, 2025, [self.globex.pk])
+        self.assertEqual(TimesheetEntry.objects.count(), 1)
+
+
+class SeedDataTests(CacheIsolatedTestCase):
+    def seed(self, *args):
+        call_command('seed_data', '--companies', '3', '--cleaners', '2', '--months', '1', '--entries', '2', *args,
+                     stdout=io.StringIO())
+
+    def test_seeding_twice_needs_clear(self):
+        self.seed()
+        self.assertEqual((Company.objects.count(), Timesheet.objects.count()), (3, 2))
+        with self.assertRaisesMessage(CommandError, '--clear'):
+            self.seed()
+        self.seed('--clear', '--seed', '1')
+        self.assertEqual((Company.objects.count(), Timesheet.objects.count()), (3, 2))
+
+
+class CompanyFormTests(CacheIsolatedTestCase):
+    def test_day_fields_round_trip_through_the_pattern(self):
+        company = make_company('Acme', [{0: '2.5'}, {4: '1.5'}], cycle_start_date=date(2025, 3, 3))
+        form = CompanyForm(instance=company)
+        self.assertEqual(len([name for name in form.fields if '_hours_week_' in name]), 28)
+        self.assertEqual(form['mon_hours_week_a'].initial, Decimal('2.50'))
+        self.assertEqual(form['fri_hours_week_b'].initial, Decimal('1.50'))
+
+        data = {'name': 'Acme', 'cycle_weeks': 2, 'cycle_start_date': '2025-03-03', 'is_active': 'on',
+                'tue_hours_week_b': '3.25', 'sun_hours_week_d': '9.00'}
+        form = CompanyForm(data, instance=company)
+        self.assertTrue(form.is_valid(), form.errors)
+        company = form.save()
+        self.assertEqual(company.get_hours(1, 1), Decimal('3.25'))
+        # Weeks past cycle_weeks are dropped
+        self.assertEqual(len(company.pattern), 14)
+
+
+@mock.patch.object(TimesheetListView, 'page_size', 2)
+class TimesheetListTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        # Three pages over a year and month boundary; 'J. Doe' has a dot like the cursor separator
+        for name, month, year in [('Kim', 12, 2024), ('Lee', 1, 2025), ('Ann', 1, 2025),
+                                  ('J. Doe', 1, 2025), ('Kim', 1, 2025)]:
+            Timesheet.objects.create(cleaner_name=name, month=month, year=year)
+
+    def page(self, **params):
+        response = self.client.get(reverse('timesheet_list'), params)
+        self.assertEqual(response.status_code, 200)
+        context = response.context
+        names = [f'{t.cleaner_name} {t.month}/{t.year}' for t in context['timesheets']]
+        return names, context['prev_cursor'], context['next_cursor']
+
+    def test_pages_follow_the_ordering_both_ways(self):
+        names, prev_cursor, next_cursor = self.page()
+        self.assertEqual(names, ['Ann 1/2025', 'J. Doe 1/2025'])
+        self.assertIsNone(prev_cursor)
+        self.assertEqual(next_cursor, '2025.1.J. Doe')
+
+        names, prev_cursor, next_cursor = self.page(after=next_cursor)
+        self.assertEqual(names, ['Kim 1/2025', 'Lee 1/2025'])
+        last_page_cursor = next_cursor
+
+        names, prev_cursor, next_cursor = self.page(after=last_page_cursor)
+        self.assertEqual(names, ['Kim 12/2024'])
+        self.assertIsNone(next_cursor)
+
+        names, prev_cursor, next_cursor = self.page(before=prev_cursor)
+        self.assertEqual(names, ['Kim 1/2025', 'Lee 1/2025'])
+        names, prev_cursor, next_cursor = self.page(before=prev_cursor)
+        self.assertEqual(names, ['Ann 1/2025', 'J. Doe 1/2025'])
+        self.assertIsNone(prev_cursor)
+
+    def test_filters_apply_to_every_page(self):
+        names, _, next_cursor = self.page(cleaner='Kim')
+        self.assertEqual(names, ['Kim 1/2025', 'Kim 12/2024'])
+        self.assertIsNone(next_cursor)
+        self.assertEqual(self.page(year=2024)[0], ['Kim 12/2024'])
+
+    def test_malformed_cursors_show_the_first_page(self):
+        for cursor in ('', 'x', '2025.1', 'a.b.Kim'):
+            self.assertEqual(self.page(after=cursor)[0], ['Ann 1/2025', 'J. Doe 1/2025'])
+
+    def test_cursor_links_are_url_encoded(self):
+        response = self.client.get(reverse('timesheet_list'))
+        self.assertContains(response, 'after=2025.1.J.%20Doe')
+
+
+class HoursInRangeTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.acme = make_company('Acme', [{0: '2.5'}])
+        self.globex = make_company('Globex', [{4: '1.5'}])
+        create_timesheet_with_entries('Kim', 3, 2025, [self.acme.pk, self.globex.pk], [
+            {'company_id': self.acme.pk, 'date': date(2025, 3, 8), 'hours': Decimal('1.25')},
+        ])
+        create_timesheet_with_entries('Kim', 4, 2025, [self.acme.pk], [{'hours': Decimal('2.00')}])
+        create_timesheet_with_entries('Lee', 3, 2025, [self.globex.pk])
+
+    def test_range_cutting_a_month(self):
+        data = hours_in_range(date(2025, 3, 15), date(2025, 4, 30))
+        # March 17, 24 and 31 are Mondays, 21 and 28 Fridays; all of April counts,
+        # including its undated extra hours, but not the extra hours on March 8
+        kim = data['cleaners']['Kim']
+        self.assertEqual((kim['scheduled'], kim['extra'], kim['total']),
+                         (Decimal('20.50'), Decimal('2.00'), Decimal('22.50')))
+        self.assertEqual(kim['companies'], {'Acme': Decimal('17.50'), 'Globex': Decimal('3.00')})
+        self.assertEqual(data['cleaners']['Lee']['total'], Decimal('3.00'))
+        self.assertEqual(data['companies'], {'Acme': Decimal('17.50'), 'Globex': Decimal('6.00')})
+        self.assertEqual(data['total'], Decimal('25.50'))
+
+    def test_whole_months_match_the_stored_totals(self):
+        data = hours_in_range(date(2025, 3, 1), date(2025, 4, 30))
+        self.assertEqual(data['cleaners']['Kim']['total'],
+                         sum(Timesheet.objects.filter(cleaner_name='Kim').values_list('total_hours', flat=True)))
+
+    def test_filters_and_per_day(self):
+        data = hours_in_range(date(2025, 3, 1), date(2025, 3, 10), cleaner='Kim',
+                              company_ids=[self.acme.pk], per_day=True)
+        self.assertEqual(list(data['cleaners']), ['Kim'])
+        self.assertEqual(data['cleaners']['Kim']['days'], {
+            '2025-03-03': Decimal('2.50'), '2025-03-08': Decimal('1.25'), '2025-03-10': Decimal('2.50'),
+        })
+        self.assertEqual(data['companies'], {'Acme': Decimal('6.25')})
+
+    def test_biweekly_phase_in_a_partial_month(self):
+        company = make_company('Rotation', [{0: '1'}, {}], cycle_start_date=date(2025, 3, 3))
+        create_timesheet_with_entries('Ann', 3, 2025, [company.pk])
+        # March 3 is week A, March 10 week B
+        self.assertEqual(hours_in_range(date(2025, 3, 1), date(2025, 3, 16), cleaner='Ann')['total'], Decimal('1.00'))
+        self.assertEqual(hours_in_range(date(2025, 3, 1), date(2025, 3, 31), cleaner='Ann')['total'], Decimal('3.00'))
+
+    def test_end_before_start(self):
+        with self.assertRaises(ValidationError):
+            hours_in_range(date(2025, 3, 2), date(2025, 3, 1))
+
+    def test_view_returns_floats(self):
+        response = self.client.get(reverse('hours_range'), {
+            'start': '2025-03-01', 'end': '2025-03-10', 'cleaner': 'Kim', 'company': self.acme.pk, 'days': '1',
+        })
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['start'], '2025-03-01')
+        self.assertEqual(data['total'], 6.25)
+        self.assertEqual(data['cleaners']['Kim']['days']['2025-03-08'], 1.25)
+
+    def test_view_rejects_bad_parameters(self):
+        for params in (
+            {'start': '2025-03-01'},
+            {'start': '2025-03-10', 'end': '2025-03-01'},
+            {'start': '2020-01-01', 'end': '2025-12-31'},
+            {'start': '2025-03-01', 'end': '2025-03-10', 'company': 'acme'},
+        ):
+            response = self.client.get(reverse('hours_range'), params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn('error', response.json())
+
+
+class CompanyPatternsTests(CacheIsolatedTestCase):
+    params = {}
+
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.acme = make_company('Acme', [{0: '2.5'}])
+            self.globex = make_company('Globex', [{4: '1.5'}, {}], cycle_start_date=date(2025, 3, 3))
+            self.closed = Company.objects.create(name='Closed', is_active=False)
+
+    def get(self, **headers):
+        return self.client.get(reverse('company_patterns'), self.params, **headers)
+
+    def test_active_companies_by_default(self):
+        data = self.get().json()
+        self.assertEqual([company['name'] for company in data['companies']], ['Acme', 'Globex'])
+        self.assertEqual(data['companies'][0]['weeks'], [[2.5, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0]])
+        self.assertEqual(data['companies'][1]['weeks'][1], [0.0] * 7)
+
+    def test_ids_select_any_company(self):
+        self.params = {'ids': f'{self.closed.pk},{self.acme.pk}'}
+        data = self.get().json()
+        self.assertEqual([(c['name'], c['is_active']) for c in data['companies']],
+                         [('Acme', True), ('Closed', False)])
+
+    def test_bad_ids(self):
+        self.params = {'ids': '1,two'}
+        self.assertEqual(self.get().status_code, 400)
+
+    def test_matching_etag_is_not_modified_until_a_company_changes(self):
+        etag = self.get()['ETag']
+        # Only the version counter is read
+        with self.assertNumQueries(1):
+            response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.acme.set_hours(0, 1, Decimal('1'))
+            self.acme.save()
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['companies'][0]['weeks'][0][1], 1.0)
+
+    def test_etag_depends_on_the_ids(self):
+        etag = self.get()['ETag']
+        self.params = {'ids': str(self.acme.pk)}
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ExportJobTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.job_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.job_dir)
+        override = override_settings(TIMESHEET_EXPORT_JOB_DIR=self.job_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+        company = make_company('Acme', [{0: '2.5'}])
+        self.timesheet = create_timesheet_with_entries('Kim', 3, 2025, [company.pk])
+
+    def test_jobs_are_claimed_oldest_first_and_once(self):
+        first = jobs.enqueue_export('timesheet', {'timesheet_id': self.timesheet.pk})
+        second = jobs.enqueue_export('month', {'year': '2025', 'month': '3'})
+        claimed = jobs.claim_next_job('worker-1')
+        self.assertEqual((claimed.pk, claimed.status, claimed.worker), (first.pk, 'running', 'worker-1'))
+        self.assertIsNotNone(claimed.started_at)
+        self.assertEqual(jobs.claim_next_job('worker-2').pk, second.pk)
+        self.assertIsNone(jobs.claim_next_job('worker-3'))
+
+    def test_a_job_taken_by_another_worker_is_skipped(self):
+        first = jobs.enqueue_export('timesheet', {'timesheet_id': self.timesheet.pk})
+        second = jobs.enqueue_export('timesheet', {'timesheet_id': self.timesheet.pk})
+        real_update = QuerySet.update
+        raced = []
+
+        def update(queryset, **kwargs):
+            # Another worker claims the first job between the SELECT and the UPDATE
+            if not raced:
+                raced.append(True)
+                ExportJob.objects.filter(pk=first.pk).update(status='running', worker='worker-2')
+            return real_update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', update):
+            claimed = jobs.claim_next_job('worker-1')
+        self.assertEqual(claimed.pk, second.pk)
+        self.assertEqual(ExportJob.objects.get(pk=first.pk).worker, 'worker-2')
+
+    def test_invalid_exports_are_not_queued(self):
+        for kind, params in (
+            ('timesheet', {}),
+            ('timesheet', {'timesheet_id': self.timesheet.pk + 1}),
+            ('month', {'year': 2025, 'month': 13}),
+            ('month', {'year': 2025, 'month': 3, 'format': 'pdf'}),
+            ('year', {}),
+        ):
+            with self.assertRaises(ValidationError):
+                jobs.enqueue_export(kind, params)
+        self.assertFalse(ExportJob.objects.exists())
+
+    def test_only_silent_running_jobs_are_requeued(self):
+        stale = jobs.enqueue_export('timesheet', {'timesheet_id': self.timesheet.pk})
+        busy = jobs.enqueue_export('timesheet', {'timesheet_id': self.timesheet.pk})
+        jobs.claim_next_job('dead-worker')
+        jobs.claim_next_job('live-worker')
+        ExportJob.objects.filter(pk=stale.pk).update(progress=3, updated_at=timezone.now() - timedelta(minutes=20))
+
+        self.assertEqual(jobs.requeue_stale_jobs(timedelta(minutes=10)), 1)
+        stale.refresh_from_db()
+        self.assertEqual((stale.status, stale.worker, stale.progress), ('queued', '', 0))
+        self.assertEqual(ExportJob.objects.get(pk=busy.pk).status, 'running')
+
+    def test_finished_jobs_are_recorded_and_purged_with_their_files(self):
+        job = jobs.enqueue_export('timesheet', {'timesheet_id': self.timesheet.pk})
+        gone = create_timesheet_with_entries('Lee', 3, 2025, [])
+        failing = jobs.enqueue_export('timesheet', {'timesheet_id': gone.pk})
+        gone.delete()
+        self.assertTrue(jobs.run_job(jobs.claim_next_job('worker-1')))
+        self.assertFalse(jobs.run_job(jobs.claim_next_job('worker-1')))
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress, job.total), ('done', 1, 1))
+        self.assertTrue(jobs.job_path(job).exists())
+        failing.refresh_from_db()
+        self.assertEqual(failing.status, 'failed')
+        self.assertIn('DoesNotExist', failing.error)
+
+        self.assertEqual(jobs.purge_finished_jobs(timedelta(hours=1)), 0)
+        ExportJob.objects.update(finished_at=timezone.now() - timedelta(hours=2))
+        self.assertEqual(jobs.purge_finished_jobs(timedelta(hours=1)), 2)
+        self.assertFalse(ExportJob.objects.exists())
+        self.assertFalse(jobs.job_path(job).exists())
+
+
+class AnnualExportTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        acme = make_company('Acme', [{0: '2.5'}])
+        globex = make_company('Globex', [{4: '1.5'}])
+        create_timesheet_with_entries('Kim', 4, 2025, [acme.pk], [{'hours': Decimal('2.00')}])
+        create_timesheet_with_entries('Kim', 3, 2025, [acme.pk, globex.pk])
+        create_timesheet_with_entries('Lee', 3, 2025, [globex.pk])
+        create_timesheet_with_entries('Kim', 3, 2024, [acme.pk])
+
+    def test_summary_sheet_then_a_sheet_per_month(self):
+        with self.assertNumQueries(3):
+            timesheets = list(annual_timesheets(2025, 'Kim'))
+        with self.assertNumQueries(0):
+            wb = build_annual_workbook('Kim', 2025, timesheets)
+        self.assertEqual(wb.sheetnames, ['Summary', 'March', 'April'])
+
+        buffer = io.BytesIO()
+        wb.save(buffer)
+        rows = list(load_workbook(buffer).worksheets[0].iter_rows(values_only=True))
+        self.assertEqual(rows[0][0], 'Cleaner: Kim')
+        self.assertEqual(rows[3][:5], ('Company', 'Jan', 'Feb', 'Mar', 'Apr'))
+        self.assertEqual(rows[3][-1], 'Total')
+        # Only March and April have hours; the last column is the year total
+        summary = {row[0]: (row[3], row[4], row[-1]) for row in rows[4:]}
+        self.assertEqual(summary, {
+            'Acme': (12.5, 10.0, 22.5),
+            'Globex': (6.0, None, 6.0),
+            'Extra Hours': (None, 2.0, 2.0),
+            'TOTAL': (18.5, 12.0, 30.5),
+        })
+
+    def test_view_exports_one_workbook_or_a_zip_per_cleaner(self):
+        response = self.client.get(reverse('export_year'), {'year': 2025, 'cleaner': 'Kim'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Kim_2025.xlsx', response['Content-Disposition'])
+
+        response = self.client.get(reverse('export_year'), {'year': 2025})
+        self.assertEqual(response.status_code, 200)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(sorted(archive.namelist()), ['Kim_2025.xlsx', 'Lee_2025.xlsx'])
+        lee = load_workbook(io.BytesIO(archive.read('Lee_2025.xlsx')))
+        self.assertEqual(lee.sheetnames, ['Summary', 'March'])
+
+        self.assertEqual(self.client.get(reverse('export_year'), {'year': 'last'}).status_code, 400)
@@ -8,7 +8,20 @@ urlpatterns = [
     path('create/', views.create_timesheet, name='create_timesheet'),
     path('timesheet/<int:pk>/', views.timesheet_detail, name='timesheet_detail'),
     path('timesheet/<int:pk>/excel/', views.generate_excel, name='generate_excel'),
+    path('timesheet/<int:pk>/resync/', views.resync_timesheet, name='resync_timesheet'),
     path('timesheet/<int:pk>/delete/', views.delete_timesheet, name='delete_timesheet'),
+    path('timesheet/<int:pk>/entries/', views.add_entry, name='add_entry'),
+    path('timesheet/<int:pk>/entries/<int:entry_pk>/', views.update_entry, name='update_entry'),
+    path('timesheet/<int:pk>/entries/<int:entry_pk>/delete/', views.delete_entry, name='delete_entry'),
+    path('timesheet/<int:pk>/extra-hours/', views.add_extra_hours, name='add_extra_hours'),
+    path('timesheet/<int:pk>/extra-hours/<int:extra_pk>/', views.update_extra_hours, name='update_extra_hours'),
+    path('timesheet/<int:pk>/extra-hours/<int:extra_pk>/delete/', views.delete_extra_hours, name='delete_extra_hours'),
+    path('export/month/', views.export_month, name='export_month'),
+    path('export/year/', views.export_year, name='export_year'),
+    path('export/jobs/', views.export_job_create, name='export_job_create'),
+    path('export/jobs/<int:pk>/', views.export_job_status, name='export_job_status'),
+    path('export/jobs/<int:pk>/download/', views.export_job_download, name='export_job_download'),
+    path('dashboard/', views.dashboard, name='dashboard'),
     
     # Company Management URLs (Website)
     path('companies/', views.CompanyListView.as_view(), name='company_list'),
@@ -19,4 +32,14 @@ urlpatterns = [
     
     # API
     path('api/company-preview/', views.get_company_preview, name='company_preview'),
+    path('api/timesheets/', views.api_timesheets, name='api_timesheets'),
+    path('api/timesheets/<int:pk>/', views.api_timesheet_detail, name='api_timesheet_detail'),
+    path('api/company-patterns/', views.company_patterns, name='company_patterns'),
+    path('api/hours/', views.hours_range, name='hours_range'),
+    path('api/metrics/', views.request_metrics, name='request_metrics'),
+    
+    # Profiles of requests run with ?_profile=1 (staff only)
+    path('profiles/', views.profile_list, name='profile_list'),
+    path('profiles/<str:profile_id>/', views.profile_detail, name='profile_detail'),
+    path('profiles/<str:profile_id>/download/', views.profile_download, name='profile_download'),
 ]
\ No newline at end of file
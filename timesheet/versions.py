@@ -0,0 +1,55 @@
+# timesheet/versions.py
+"""
+Version counters kept in the database.
+
+Each counter names a slice of data (e.g. 'company') and is bumped by the
+signal handlers whenever that data changes, so anything derived from it
+(ETags, cached fragments) can be keyed on the current version instead of
+being invalidated explicitly. Bumps are a single UPDATE ... SET value =
+value + 1, which is atomic on every database; the file-based cache's incr()
+is a read followed by a write, so two bumps at once could end on the same
+value and leave a stale fragment cached under it for good. A missing
+counter starts from the current time in milliseconds, so recreating one
+never brings back an old version.
+"""
+import time
+
+from django.apps import apps
+from django.db.models import F
+
+
+def _counters():
+    # models.py imports this module (through schedule_cache), so look the model up lazily
+    return apps.get_model('timesheet', 'VersionCounter').objects
+
+
+def _initial():
+    return int(time.time() * 1000)
+
+
+def _create(names):
+    counters = _counters()
+    counters.bulk_create([counters.model(name=name, value=_initial()) for name in names], ignore_conflicts=True)
+
+
+def get_version(name):
+    return get_versions([name])[name]
+
+
+def bump_version(name):
+    counters = _counters().filter(name=name)
+    if not counters.update(value=F('value') + 1):
+        _create([name])
+        counters.update(value=F('value') + 1)
+    return counters.values_list('value', flat=True).get()
+
+
+def get_versions(names):
+    """get_version() for several counters in one query: {name: version}"""
+    names = set(names)
+    versions = dict(_counters().filter(name__in=names).values_list('name', 'value'))
+    missing = names - set(versions)
+    if missing:
+        _create(missing)
+        versions.update(_counters().filter(name__in=missing).values_list('name', 'value'))
+    return versions
@@ -1,17 +1,41 @@
 # timesheet/views.py (updated with Company CRUD views)
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse, JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse, QueryDict, StreamingHttpResponse
+from django.db import transaction
+from django.db.models import Prefetch, Q
 from django.views.generic import ListView, CreateView, DetailView, DeleteView, UpdateView
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
+from django.utils.cache import get_conditional_response
+from django.utils import dateformat, timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date, quote_etag
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import ValidationError
 from django.contrib.auth.mixins import LoginRequiredMixin
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.views.decorators.http import require_POST
 from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation
 import calendar
 
-from .models import Company, Timesheet, TimesheetEntry, ExtraHours
-from .forms import TimesheetForm, CompanySelectForm, ExtraHoursForm, ExtraHoursFormSet, CompanyForm
+from .hours import hundredths_of, to_decimal, to_float, to_hundredths, total as hours_total
+from .models import DAY_NAMES, Company, Timesheet, TimesheetEntry, ExtraHours, CleanerMonthRollup, CompanyMonthRollup, ExportJob
+from .services import create_timesheet_with_entries, hours_in_range, resync_with_company_patterns
+from . import api, jobs, metrics, profiling
+from .schedule_cache import schedule_cache
+from .versions import get_version, get_versions
+from .forms import (
+    TimesheetForm, CompanySelectForm, ExtraHoursForm, ExtraHoursFormSet, CompanyForm,
+    ExtraHoursEditForm, TimesheetEntryForm,
+)
+from .exports import (
+    annual_export_filename, annual_timesheets, build_annual_workbook,
+    build_month_workbook, build_timesheet_workbook, export_filename, export_timesheets,
+    file_response, iter_annual_zip, iter_month_zip, month_export_basename, workbook_response, zip_response,
+)
+from .export_cache import ExportCache, export_version
 
 # ==================== COMPANY VIEWS (Website Management) ====================
 
@@ -54,21 +78,9 @@ class CompanyDetailView(DetailView):
         context = super().get_context_data(**kwargs)
         company = self.object
         
-        # Calculate weekly totals
-        if company.pattern_type == 'weekly':
-            context['weekly_total'] = (
-                company.mon_hours + company.tue_hours + company.wed_hours +
-                company.thu_hours + company.fri_hours + company.sat_hours + company.sun_hours
-            )
-        else:
-            context['week_a_total'] = (
-                company.mon_hours_week_a + company.tue_hours_week_a + company.wed_hours_week_a +
-                company.thu_hours_week_a + company.fri_hours_week_a + company.sat_hours_week_a + company.sun_hours_week_a
-            )
-            context['week_b_total'] = (
-                company.mon_hours_week_b + company.tue_hours_week_b + company.wed_hours_week_b +
-                company.thu_hours_week_b + company.fri_hours_week_b + company.sat_hours_week_b + company.sun_hours_week_b
-            )
+        # (label, hours Monday..Sunday, total) per week of the rotation
+        context['weeks'] = company.get_weeks()
+        context['cycle_total'] = to_decimal(sum(company.get_pattern()))
         
         # Get timesheets using this company
         context['timesheet_count'] = TimesheetEntry.objects.filter(company=company).count()
@@ -117,7 +129,110 @@ class TimesheetListView(ListView):
     model = Timesheet
     template_name = 'timesheet/timesheet_list.html'
     context_object_name = 'timesheets'
-    ordering = ['-year', '-month']
+    ordering = ['-year', '-month', 'cleaner_name']
+    page_size = 25
+    
+    @staticmethod
+    def _parse_int(value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+    
+    @staticmethod
+    def _parse_cursor(value):
+        """Parse a "year.month.cleaner_name" keyset cursor"""
+        parts = (value or '').split('.', 2)
+        if len(parts) != 3:
+            return None
+        try:
+            return int(parts[0]), int(parts[1]), parts[2]
+        except ValueError:
+            return None
+    
+    @staticmethod
+    def _cursor(timesheet):
+        return f"{timesheet.year}.{timesheet.month}.{timesheet.cleaner_name}"
+    
+    def get_filters(self):
+        return {
+            'year': self._parse_int(self.request.GET.get('year')),
+            'month': self._parse_int(self.request.GET.get('month')),
+            'cleaner': self.request.GET.get('cleaner', '').strip(),
+        }
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        filters = self.get_filters()
+        if filters['year']:
+            queryset = queryset.filter(year=filters['year'])
+        if filters['month']:
+            queryset = queryset.filter(month=filters['month'])
+        if filters['cleaner']:
+            queryset = queryset.filter(cleaner_name=filters['cleaner'])
+        return queryset.prefetch_related(
+            Prefetch('entries', queryset=TimesheetEntry.objects.select_related('company'))
+        )
+    
+    def paginate_keyset(self, queryset):
+        """
+        Return (page, next_cursor, prev_cursor) using keyset pagination on
+        (-year, -month, cleaner_name), the columns of timesheet_ordering_idx;
+        cleaner names are unique per month, so the order is total.
+        """
+        after = self._parse_cursor(self.request.GET.get('after'))
+        before = self._parse_cursor(self.request.GET.get('before'))
+        
+        if before:
+            year, month, name = before
+            queryset = queryset.filter(
+                Q(year__gt=year) | Q(year=year, month__gt=month) | Q(year=year, month=month, cleaner_name__lt=name)
+            ).order_by('year', 'month', '-cleaner_name')
+        elif after:
+            year, month, name = after
+            queryset = queryset.filter(
+                Q(year__lt=year) | Q(year=year, month__lt=month) | Q(year=year, month=month, cleaner_name__gt=name)
+            )
+        
+        # Fetch one extra row to know whether there is another page
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if before:
+            rows.reverse()
+        
+        if not rows:
+            return rows, None, None
+        
+        if before:
+            next_cursor = self._cursor(rows[-1])
+            prev_cursor = self._cursor(rows[0]) if has_more else None
+        else:
+            next_cursor = self._cursor(rows[-1]) if has_more else None
+            prev_cursor = self._cursor(rows[0]) if after else None
+        return rows, next_cursor, prev_cursor
+    
+    def get_context_data(self, **kwargs):
+        page, next_cursor, prev_cursor = self.paginate_keyset(self.object_list)
+        kwargs['object_list'] = page
+        context = super().get_context_data(**kwargs)
+        
+        filters = self.get_filters()
+        params = QueryDict(mutable=True)
+        for key, value in filters.items():
+            if value:
+                params[key] = value
+        
+        context['filters'] = filters
+        context['filter_query'] = params.urlencode()
+        context['next_cursor'] = next_cursor
+        context['prev_cursor'] = prev_cursor
+        context['month_choices'] = Timesheet.MONTH_CHOICES
+        context['cleaner_names'] = (
+            Timesheet.objects.order_by('cleaner_name')
+            .values_list('cleaner_name', flat=True).distinct()
+        )
+        return context
 
 def create_timesheet(request):
     if request.method == 'POST':
@@ -125,19 +240,13 @@ def create_timesheet(request):
         company_ids = request.POST.getlist('companies')
         
         if form.is_valid() and company_ids:
-            timesheet = form.save()
-            
-            # Create entries for selected companies
-            for company_id in company_ids:
-                company = Company.objects.get(id=company_id)
-                TimesheetEntry.objects.create(timesheet=timesheet, company=company)
-            
             # Handle extra hours - only process if data is provided
             extra_hours_dates = request.POST.getlist('extra_hours_date')
             extra_hours_companies = request.POST.getlist('extra_hours_company')
             extra_hours_amounts = request.POST.getlist('extra_hours_amount')
             extra_hours_descs = request.POST.getlist('extra_hours_description')
             
+            extra_hours = []
             for i in range(len(extra_hours_dates)):
                 date_val = extra_hours_dates[i] if i < len(extra_hours_dates) else ''
                 hours_val = extra_hours_amounts[i] if i < len(extra_hours_amounts) else ''
@@ -149,18 +258,28 @@ def create_timesheet(request):
                     try:
                         hours_decimal = Decimal(str(hours_val))
                         if hours_decimal > 0:  # Only save if hours > 0
-                            ExtraHours.objects.create(
-                                timesheet=timesheet,
-                                company_id=int(company_val) if company_val else None,
-                                date=date_val,
-                                hours=hours_decimal,
-                                description=desc_val
-                            )
+                            extra_hours.append({
+                                'company_id': int(company_val) if company_val else None,
+                                'date': date.fromisoformat(date_val),
+                                'hours': hours_decimal,
+                                'description': desc_val,
+                            })
                     except (ValueError, InvalidOperation):
                         pass  # Skip invalid data
             
-            messages.success(request, 'Timesheet created successfully!')
-            return redirect('timesheet_detail', pk=timesheet.pk)
+            try:
+                timesheet = create_timesheet_with_entries(
+                    form.cleaned_data['cleaner_name'],
+                    form.cleaned_data['month'],
+                    form.cleaned_data['year'],
+                    company_ids,
+                    extra_hours,
+                )
+            except ValidationError as e:
+                form.add_error(None, e)
+            else:
+                messages.success(request, 'Timesheet created successfully!')
+                return redirect('timesheet_detail', pk=timesheet.pk)
     else:
         form = TimesheetForm()
     
@@ -170,314 +289,384 @@ def create_timesheet(request):
         'companies': companies,
     })
 
-def timesheet_detail(request, pk):
-    timesheet = get_object_or_404(Timesheet, pk=pk)
-    entries = timesheet.entries.select_related('company').all()
-    extra_hours = timesheet.extra_hours.all()
+
+# Seconds a rendered detail body is kept; stale versions simply expire
+DETAIL_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _hours_text(hundredths):
+    """Hundredths as the detail page shows them ('2.50'), or None for an empty cell"""
+    return str(to_decimal(hundredths)) if hundredths else None
+
+
+def _timesheet_detail_context(timesheet):
+    entries = list(timesheet.entries.select_related('company'))
+    extra_hours = timesheet.extra_hours.select_related('company')
     
     # Generate calendar data
     year = timesheet.year
     month = timesheet.month
     _, days_in_month = calendar.monthrange(year, month)
     
+    # One month vector per entry instead of a pattern lookup per cell
+    month_hours = [(entry.pk, entry.get_month_hundredths()) for entry in entries]
+    first_weekday = date(year, month, 1).weekday()
+    
+    # One cell per entry and day, so edits can patch single cells in place
     calendar_data = []
     for day in range(1, days_in_month + 1):
-        current_date = date(year, month, day)
-        weekday = current_date.weekday()
-        day_name = calendar.day_abbr[weekday]
-        
-        row = {
+        calendar_data.append({
             'date': day,
-            'day_name': day_name,
-            'companies': []
-        }
-        
-        for entry in entries:
-            hours = entry.get_daily_hours(day)
-            if hours > 0:
-                row['companies'].append({
-                    'name': entry.company.name,
-                    'hours': hours
-                })
-        
-        calendar_data.append(row)
+            'day_name': calendar.day_abbr[(first_weekday + day - 1) % 7],
+            'cells': [(entry_id, _hours_text(hours_by_day[day - 1])) for entry_id, hours_by_day in month_hours],
+        })
     
     # Calculate totals
-    company_totals = {}
+    entry_totals = []
     grand_total = 0
     
     for entry in entries:
-        total = entry.get_total_hours()
-        company_totals[entry.company.name] = total
+        total = sum(entry.get_month_hundredths())
+        entry_totals.append((entry.pk, to_decimal(total)))
         grand_total += total
     
-    extra_hours_total = sum(float(eh.hours) for eh in extra_hours)
-    grand_total += extra_hours_total
+    grand_total += hours_total(eh.hours for eh in extra_hours)
     
-    context = {
+    return {
         'timesheet': timesheet,
         'entries': entries,
         'extra_hours': extra_hours,
+        'companies': Company.objects.filter(is_active=True).only('id', 'name').order_by('name'),
         'calendar_data': calendar_data,
-        'company_totals': company_totals,
-        'grand_total': grand_total,
+        'entry_totals': entry_totals,
+        'grand_total': to_decimal(grand_total),
         'days_in_month': days_in_month,
+        'month_start': date(year, month, 1),
+        'month_end': date(year, month, days_in_month),
     }
-    
-    return render(request, 'timesheet/timesheet_detail.html', context)
-
-
-    entries = timesheet.entries.select_related('company').all()
-    extra_hours = timesheet.extra_hours.all()
-    
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Timesheet"
-    
-    # Styles
-    header_font = Font(bold=True, size=11)
-    title_font = Font(bold=True, size=12)
-    total_font = Font(bold=True)
-    center_align = Alignment(horizontal='center', vertical='center')
-    thin_border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
-    blue_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-    white_font = Font(bold=True, color="FFFFFF")
-    
-    # Title
-    ws['A1'] = f"Cleaner: {timesheet.cleaner_name}"
-    ws['A1'].font = title_font
-    ws['A2'] = f"Month: {calendar.month_name[timesheet.month]} {timesheet.year}"
-    ws['A2'].font = title_font
-    
-    # Headers
-    headers = ['Date', 'Day'] + [entry.company.name for entry in entries]
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=4, column=col, value=header)
-        cell.font = header_font
-        cell.alignment = center_align
-        cell.border = thin_border
-        cell.fill = PatternFill(start_color="D9E1F2", end_color="D9E1F2", fill_type="solid")
-    
-    # Data rows
-    year = timesheet.year
-    month = timesheet.month
-    _, days_in_month = calendar.monthrange(year, month)
-    
-    row_num = 5
-    for day in range(1, days_in_month + 1):
-        current_date = date(year, month, day)
-        weekday = current_date.weekday()
-        day_name = calendar.day_abbr[weekday]
-        
-        ws.cell(row=row_num, column=1, value=day).border = thin_border
-        ws.cell(row=row_num, column=2, value=day_name).border = thin_border
-        
-        col_num = 3
-        for entry in entries:
-            hours = entry.get_daily_hours(day)
-            cell = ws.cell(row=row_num, column=col_num, value=hours if hours > 0 else 0)
-            cell.border = thin_border
-            cell.alignment = center_align
-            col_num += 1
-        
-        row_num += 1
-    
-    # Total row
-    total_row = row_num
-    ws.cell(row=total_row, column=1, value="TOTAL").font = total_font
-    ws.cell(row=total_row, column=2, value="").border = thin_border
-    
-    col_num = 3
-    grand_total = 0
-    for entry in entries:
-        total = entry.get_total_hours()
-        grand_total += total
-        cell = ws.cell(row=total_row, column=col_num, value=total)
-        cell.font = total_font
-        cell.border = thin_border
-        cell.alignment = center_align
-        cell.fill = PatternFill(start_color="E7E6E6", end_color="E7E6E6", fill_type="solid")
-        col_num += 1
-    
-    # Grand Total row
-    grand_total_row = total_row + 1
-    ws.merge_cells(start_row=grand_total_row, start_column=1, end_row=grand_total_row, end_column=2)
-    grand_total_cell = ws.cell(row=grand_total_row, column=1, value="GRAND TOTAL")
-    grand_total_cell.font = white_font
-    grand_total_cell.fill = blue_fill
-    grand_total_cell.alignment = center_align
-    grand_total_cell.border = thin_border
-    
-    ws.merge_cells(start_row=grand_total_row, start_column=3, end_row=grand_total_row, end_column=col_num-1)
-    grand_value_cell = ws.cell(row=grand_total_row, column=3, value=grand_total)
-    grand_value_cell.font = white_font
-    grand_value_cell.fill = blue_fill
-    grand_value_cell.alignment = center_align
-    grand_value_cell.border = thin_border
-    
-    # Extra Hours section
-    extra_row = grand_total_row + 2
-    if extra_hours.exists():
-        ws.cell(row=extra_row, column=1, value="Extra Hours").font = title_font
-        extra_row += 1
-        
-        for eh in extra_hours:
-            ws.cell(row=extra_row, column=1, value=eh.date.day)
-            ws.cell(row=extra_row, column=2, value=calendar.day_abbr[eh.date.weekday()])
-            ws.cell(row=extra_row, column=3, value=float(eh.hours))
-            ws.cell(row=extra_row, column=4, value=eh.description)
-            extra_row += 1
-    
-    # Adjust column widths
-    ws.column_dimensions['A'].width = 8
-    ws.column_dimensions['B'].width = 10
-    for i in range(3, col_num):
-        ws.column_dimensions[chr(64+i)].width = 15
-    
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = f'attachment; filename="{timesheet.cleaner_name}_{calendar.month_name[timesheet.month]}_{timesheet.year}.xlsx"'
-    
-    wb.save(response)
-    return response
+
+
+def timesheet_detail(request, pk):
+    timesheet = get_object_or_404(Timesheet, pk=pk)
+    # The body only changes with the timesheet, its rows or a company, and
+    # timesheet/signals.py bumps these versions when any of them is saved
+    versions = get_versions([f'timesheet:{pk}', 'company'])
+    cache_key = f"timesheet:detail:{pk}:{versions[f'timesheet:{pk}']}:{versions['company']}"
+    body = cache.get(cache_key)
+    if body is None:
+        body = render_to_string('timesheet/timesheet_detail_body.html', _timesheet_detail_context(timesheet))
+        cache.set(cache_key, body, DETAIL_CACHE_TIMEOUT)
+    return render(request, 'timesheet/timesheet_detail.html', {'timesheet': timesheet, 'body': body})
+
+
+@require_POST
+def resync_timesheet(request, pk):
+    """Apply the companies' current patterns to a timesheet whose entries were snapshotted earlier"""
+    timesheet = get_object_or_404(Timesheet, pk=pk)
+    changed = resync_with_company_patterns([timesheet.pk])
+    if changed:
+        messages.success(request, f'Updated the hours of {changed} compan{"y" if changed == 1 else "ies"} from the current patterns.')
+    else:
+        messages.success(request, 'Hours already match the current company patterns.')
+    return redirect('timesheet_detail', pk=pk)
+
+
+# ==================== TIMESHEET EDITING (AJAX) ====================
+# The detail page edits entries and extra hours in place. Each endpoint saves
+# one row (timesheet/signals.py refreshes the stored totals and rollups) and
+# answers with only the cells, rows and totals the page has to patch.
+
+def _edit_response(timesheet, status=200, **changes):
+    """JSON with the changed parts plus the timesheet's new grand total"""
+    total = Timesheet.objects.values_list('total_hours', flat=True).get(pk=timesheet.pk)
+    return JsonResponse({'grand_total': str(to_decimal(to_hundredths(total))), **changes}, status=status)
+
+
+def _form_error(form):
+    return JsonResponse({'error': ' '.join(error for errors in form.errors.values() for error in errors)}, status=400)
+
+
+def _entry_json(timesheet, entry):
+    return {
+        'id': entry.pk,
+        'company_id': entry.company_id,
+        'company': entry.company.name,
+        'cycle': entry.company.get_cycle_weeks_display(),
+        'total': str(entry.get_total_hours()),
+        'update_url': reverse('update_entry', args=[timesheet.pk, entry.pk]),
+        'delete_url': reverse('delete_entry', args=[timesheet.pk, entry.pk]),
+    }
+
+
+def _entry_cells(entry, days):
+    return [{'entry': entry.pk, 'day': day, 'hours': _hours_text(entry.get_month_hundredths()[day - 1])} for day in days]
+
+
+def _extra_hours_json(timesheet, extra):
+    return {
+        'id': extra.pk,
+        'date': extra.date.isoformat(),
+        'date_label': dateformat.format(extra.date, 'M d'),
+        'day_name': dateformat.format(extra.date, 'D'),
+        'hours': str(to_decimal(to_hundredths(extra.hours))),
+        'description': extra.description,
+        'company_id': extra.company_id,
+        'company': extra.company.name if extra.company else None,
+        'update_url': reverse('update_extra_hours', args=[timesheet.pk, extra.pk]),
+        'delete_url': reverse('delete_extra_hours', args=[timesheet.pk, extra.pk]),
+    }
+
+
+@require_POST
+def add_entry(request, pk):
+    """Add a company to the timesheet; answers with its column of day cells"""
+    timesheet = get_object_or_404(Timesheet, pk=pk)
+    form = TimesheetEntryForm(request.POST, timesheet=timesheet)
+    if not form.is_valid():
+        return _form_error(form)
+    with transaction.atomic():
+        entry = form.save()
+    days = range(1, len(entry.get_month_hundredths()) + 1)
+    return _edit_response(timesheet, status=201, entry=_entry_json(timesheet, entry), cells=_entry_cells(entry, days))
+
+
+@require_POST
+def update_entry(request, pk, entry_pk):
+    """Swap an entry's company; answers with the day cells whose hours changed"""
+    timesheet = get_object_or_404(Timesheet, pk=pk)
+    entry = get_object_or_404(TimesheetEntry.objects.select_related('company'), pk=entry_pk, timesheet=timesheet)
+    entry.timesheet = timesheet
+    before = entry.get_month_hundredths()
+    form = TimesheetEntryForm(request.POST, instance=entry, timesheet=timesheet)
+    if not form.is_valid():
+        return _form_error(form)
+    with transaction.atomic():
+        entry = form.save()
+    after = entry.get_month_hundredths()
+    days = [day for day, (old, new) in enumerate(zip(before, after), start=1) if old != new]
+    return _edit_response(timesheet, entry=_entry_json(timesheet, entry), cells=_entry_cells(entry, days))
+
+
+@require_POST
+def delete_entry(request, pk, entry_pk):
+    timesheet = get_object_or_404(Timesheet, pk=pk)
+    entry = get_object_or_404(TimesheetEntry, pk=entry_pk, timesheet=timesheet)
+    with transaction.atomic():
+        entry.delete()
+    return _edit_response(timesheet, removed_entry=entry_pk)
+
+
+@require_POST
+def add_extra_hours(request, pk):
+    timesheet = get_object_or_404(Timesheet, pk=pk)
+    form = ExtraHoursEditForm(request.POST, timesheet=timesheet)
+    if not form.is_valid():
+        return _form_error(form)
+    with transaction.atomic():
+        extra = form.save()
+    return _edit_response(timesheet, status=201, extra_hours=_extra_hours_json(timesheet, extra))
+
+
+@require_POST
+def update_extra_hours(request, pk, extra_pk):
+    timesheet = get_object_or_404(Timesheet, pk=pk)
+    extra = get_object_or_404(ExtraHours, pk=extra_pk, timesheet=timesheet)
+    form = ExtraHoursEditForm(request.POST, instance=extra, timesheet=timesheet)
+    if not form.is_valid():
+        return _form_error(form)
+    with transaction.atomic():
+        extra = form.save()
+    return _edit_response(timesheet, extra_hours=_extra_hours_json(timesheet, extra))
+
+
+@require_POST
+def delete_extra_hours(request, pk, extra_pk):
+    timesheet = get_object_or_404(Timesheet, pk=pk)
+    extra = get_object_or_404(ExtraHours, pk=extra_pk, timesheet=timesheet)
+    with transaction.atomic():
+        extra.delete()
+    return _edit_response(timesheet, removed_extra_hours=extra_pk)
 
 
 def generate_excel(request, pk):
-    from decimal import Decimal
     timesheet = get_object_or_404(Timesheet, pk=pk)
-    entries = timesheet.entries.select_related('company').all()
-    extra_hours = timesheet.extra_hours.all()
-    
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Timesheet"
-    
-    # Styles
-    header_font = Font(bold=True, size=11)
-    title_font = Font(bold=True, size=12)
-    total_font = Font(bold=True)
-    center_align = Alignment(horizontal='center', vertical='center')
-    thin_border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
-    blue_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-    white_font = Font(bold=True, color="FFFFFF")
-    
-    # Title
-    ws['A1'] = f"Cleaner: {timesheet.cleaner_name}"
-    ws['A1'].font = title_font
-    ws['A2'] = f"Month: {timesheet.get_month_name()} {timesheet.year}"  # FIXED
-    ws['A2'].font = title_font
-    
-    # Headers
-    headers = ['Date', 'Day'] + [entry.company.name for entry in entries]
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=4, column=col, value=header)
-        cell.font = header_font
-        cell.alignment = center_align
-        cell.border = thin_border
-        cell.fill = PatternFill(start_color="D9E1F2", end_color="D9E1F2", fill_type="solid")
-    
-    # Data rows
-    year = timesheet.year
-    month = timesheet.month
-    _, days_in_month = calendar.monthrange(year, month)
-    
-    row_num = 5
-    for day in range(1, days_in_month + 1):
-        current_date = date(year, month, day)
-        weekday = current_date.weekday()
-        day_name = calendar.day_abbr[weekday]
-        
-        ws.cell(row=row_num, column=1, value=day).border = thin_border
-        ws.cell(row=row_num, column=2, value=day_name).border = thin_border
-        
-        col_num = 3
-        for entry in entries:
-            hours = entry.get_daily_hours(day)
-            # FIXED: Convert Decimal to float for Excel, properly formatted
-            hours_val = float(hours) if hours else None
-            cell = ws.cell(row=row_num, column=col_num, value=hours_val)
-            cell.border = thin_border
-            cell.alignment = center_align
-            cell.number_format = '0.00'  # FIXED: Ensure 2 decimal places in Excel
-            col_num += 1
-        
-        row_num += 1
-    
-    # Total row
-    total_row = row_num
-    ws.cell(row=total_row, column=1, value="TOTAL").font = total_font
-    ws.cell(row=total_row, column=2, value="").border = thin_border
-    
-    col_num = 3
-    grand_total = Decimal('0.00')
-    for entry in entries:
-        total = entry.get_total_hours()
-        grand_total += total
-        cell = ws.cell(row=total_row, column=col_num, value=float(total))
-        cell.font = total_font
-        cell.border = thin_border
-        cell.alignment = center_align
-        cell.fill = PatternFill(start_color="E7E6E6", end_color="E7E6E6", fill_type="solid")
-        cell.number_format = '0.00'  # FIXED
-        col_num += 1
-    
-    # Grand Total row
-    grand_total_row = total_row + 1
-    ws.merge_cells(start_row=grand_total_row, start_column=1, end_row=grand_total_row, end_column=2)
-    grand_total_cell = ws.cell(row=grand_total_row, column=1, value="GRAND TOTAL")
-    grand_total_cell.font = white_font
-    grand_total_cell.fill = blue_fill
-    grand_total_cell.alignment = center_align
-    grand_total_cell.border = thin_border
-    
-    ws.merge_cells(start_row=grand_total_row, start_column=3, end_row=grand_total_row, end_column=col_num-1)
-    grand_value_cell = ws.cell(row=grand_total_row, column=3, value=float(grand_total))
-    grand_value_cell.font = white_font
-    grand_value_cell.fill = blue_fill
-    grand_value_cell.alignment = center_align
-    grand_value_cell.border = thin_border
-    grand_value_cell.number_format = '0.00'  # FIXED
-    
-    # Extra Hours section
-    extra_row = grand_total_row + 2
-    if extra_hours.exists():
-        ws.cell(row=extra_row, column=1, value="Extra Hours").font = title_font
-        extra_row += 1
-        
-        for eh in extra_hours:
-            ws.cell(row=extra_row, column=1, value=eh.date.day if eh.date else '')
-            ws.cell(row=extra_row, column=2, value=calendar.day_abbr[eh.date.weekday()] if eh.date else '')
-            cell = ws.cell(row=extra_row, column=3, value=float(eh.hours))
-            cell.number_format = '0.00'  # FIXED
-            ws.cell(row=extra_row, column=4, value=eh.description)
-            extra_row += 1
-    
-    # Adjust column widths
-    ws.column_dimensions['A'].width = 8
-    ws.column_dimensions['B'].width = 10
-    for i in range(3, col_num):
-        ws.column_dimensions[chr(64+i)].width = 15
-    
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = f'attachment; filename="{timesheet.cleaner_name}_{timesheet.get_month_name()}_{timesheet.year}.xlsx"'  # FIXED
-    
-    wb.save(response)
+    entries = list(timesheet.entries.select_related('company'))
+    extra_hours = list(timesheet.extra_hours.all())
+    
+    # Answer conditional requests before building anything
+    etag = quote_etag(export_version(timesheet, entries, extra_hours))
+    # Entry and extra hours edits also move timesheet.updated_at (see Timesheet.refresh_totals)
+    last_modified = int(timesheet.updated_at.timestamp())
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(last_modified),
+        'Cache-Control': 'private, no-cache',
+    }
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        response = not_modified
+    else:
+        cache = ExportCache()
+        key = etag.strip('"')
+        f = cache.get(key)
+        if f is None:
+            wb = build_timesheet_workbook(timesheet, entries, extra_hours)
+            f = cache.put(key, wb.save)
+        response = file_response(f, export_filename(timesheet))
+    
+    for header, value in headers.items():
+        response[header] = value
     return response
 
 
+def export_month(request):
+    """Export every timesheet of a month as a ZIP of workbooks or one multi-sheet workbook"""
+    try:
+        year = int(request.GET.get('year', ''))
+        month = int(request.GET.get('month', ''))
+    except ValueError:
+        return JsonResponse({'error': 'year and month are required'}, status=400)
+    if not 1 <= month <= 12:
+        return JsonResponse({'error': 'month must be between 1 and 12'}, status=400)
+    
+    cleaner = request.GET.get('cleaner', '').strip() or None
+    export_format = request.GET.get('format', 'zip')
+    timesheets = list(export_timesheets(year, month, cleaner))
+    basename = month_export_basename(year, month, cleaner)
+    
+    if export_format == 'workbook':
+        return workbook_response(build_month_workbook(timesheets), f"{basename}.xlsx")
+    if export_format == 'zip':
+        # Rendered in this process: a request must not spawn a process pool
+        # (jobs and the export_month command use one)
+        return zip_response(iter_month_zip(timesheets, workers=1), f"{basename}.zip")
+    return JsonResponse({'error': 'format must be "zip" or "workbook"'}, status=400)
+
+
+def export_year(request):
+    """
+    Export a cleaner's year as one workbook (a summary sheet plus a sheet per
+    month), or without a cleaner, a ZIP with one such workbook per cleaner
+    """
+    try:
+        year = int(request.GET.get('year', ''))
+    except ValueError:
+        return JsonResponse({'error': 'year is required'}, status=400)
+    
+    cleaner = request.GET.get('cleaner', '').strip() or None
+    timesheets = list(annual_timesheets(year, cleaner))
+    if cleaner:
+        return workbook_response(build_annual_workbook(cleaner, year, timesheets), annual_export_filename(cleaner, year))
+    return zip_response(iter_annual_zip(year, timesheets, workers=1), f"Timesheets_{year}.zip")
+
+
+@require_POST
+def export_job_create(request):
+    """Queue an export for run_export_worker and return its status URL straight away"""
+    try:
+        job = jobs.enqueue_export(request.POST.get('kind', ''), request.POST)
+    except ValidationError as e:
+        return JsonResponse({'error': '; '.join(e.messages)}, status=400)
+    data = _export_job_json(job)
+    response = JsonResponse(data, status=202)
+    response['Location'] = data['status_url']
+    return response
+
+
+def _export_job_json(job):
+    data = {
+        'id': job.pk,
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+        'total': job.total,
+        'percent': round(job.progress * 100 / job.total) if job.total else (100 if job.status == 'done' else 0),
+        'error': job.error or None,
+        'created_at': job.created_at,
+        'finished_at': job.finished_at,
+        'status_url': reverse('export_job_status', args=[job.pk]),
+        'download_url': None,
+    }
+    if job.status == 'done':
+        data['download_url'] = reverse('export_job_download', args=[job.pk])
+    return data
+
+
+def export_job_status(request, pk):
+    return JsonResponse(_export_job_json(get_object_or_404(ExportJob, pk=pk)))
+
+
+def export_job_download(request, pk):
+    job = get_object_or_404(ExportJob, pk=pk, status='done')
+    try:
+        fileobj = open(jobs.job_path(job), 'rb')
+    except FileNotFoundError:
+        raise Http404("The export file has expired")
+    if job.filename.endswith('.zip'):
+        return file_response(fileobj, job.filename, content_type='application/zip')
+    return file_response(fileobj, job.filename)
+
+
+def dashboard(request):
+    """Hours per company or cleaner for each month of a year, compared with another year"""
+    today = date.today()
+    try:
+        year = int(request.GET.get('year') or today.year)
+        compare = int(request.GET.get('compare') or year - 1)
+    except ValueError:
+        year, compare = today.year, today.year - 1
+    by = 'cleaner' if request.GET.get('by') == 'cleaner' else 'company'
+    
+    # One query over the rollup table, served by its (year, month, ...) index
+    if by == 'company':
+        rollups = CompanyMonthRollup.objects.filter(year__in=[year, compare]).values_list(
+            'company__name', 'year', 'month', hundredths_of('hours')
+        )
+    else:
+        rollups = CleanerMonthRollup.objects.filter(year__in=[year, compare]).values_list(
+            'cleaner_name', 'year', 'month', hundredths_of('hours')
+        )
+    
+    # Added up in hundredths; converted back to Decimals for the template below
+    rows = {}
+    month_totals = [0] * 12
+    compare_month_totals = [0] * 12
+    for name, row_year, month, hours in rollups:
+        row = rows.setdefault(name, {'name': name, 'months': [0] * 12, 'total': 0, 'compare_total': 0})
+        if row_year == year:
+            row['months'][month - 1] += hours
+            row['total'] += hours
+            month_totals[month - 1] += hours
+        else:
+            row['compare_total'] += hours
+            compare_month_totals[month - 1] += hours
+    
+    def change(current, previous):
+        return None if not previous else round(Decimal(current - previous) / previous * 100, 1)
+    
+    rows = sorted(rows.values(), key=lambda row: (-row['total'], row['name']))
+    for row in rows:
+        row['change'] = change(row['total'], row['compare_total'])
+        row['months'] = [to_decimal(hours) for hours in row['months']]
+        row['total'] = to_decimal(row['total'])
+        row['compare_total'] = to_decimal(row['compare_total'])
+    total = sum(month_totals)
+    compare_total = sum(compare_month_totals)
+    
+    return render(request, 'timesheet/dashboard.html', {
+        'year': year,
+        'compare': compare,
+        'by': by,
+        'rows': rows,
+        'month_names': [calendar.month_abbr[m] for m in range(1, 13)],
+        'month_totals': [to_decimal(hours) for hours in month_totals],
+        'compare_month_totals': [to_decimal(hours) for hours in compare_month_totals],
+        'total': to_decimal(total),
+        'compare_total': to_decimal(compare_total),
+        'change': change(total, compare_total),
+    })
+
+
 def delete_timesheet(request, pk):
     timesheet = get_object_or_404(Timesheet, pk=pk)
     if request.method == 'POST':
@@ -486,39 +675,203 @@ def delete_timesheet(request, pk):
         return redirect('timesheet_list')
     return render(request, 'timesheet/timesheet_confirm_delete.html', {'timesheet': timesheet})
 
+def _float_hours(value):
+    """Decimal hours as the float every JSON endpoint sends (see api.py)"""
+    return to_float(to_hundredths(value))
+
+
 def get_company_preview(request):
     company_id = request.GET.get('company_id')
     if company_id:
         company = get_object_or_404(Company, id=company_id)
         data = {
-            'pattern_type': company.pattern_type,
-            'weekly': {
-                'mon': float(company.mon_hours),
-                'tue': float(company.tue_hours),
-                'wed': float(company.wed_hours),
-                'thu': float(company.thu_hours),
-                'fri': float(company.fri_hours),
-                'sat': float(company.sat_hours),
-                'sun': float(company.sun_hours),
-            },
-            'biweekly_a': {
-                'mon': float(company.mon_hours_week_a),
-                'tue': float(company.tue_hours_week_a),
-                'wed': float(company.wed_hours_week_a),
-                'thu': float(company.thu_hours_week_a),
-                'fri': float(company.fri_hours_week_a),
-                'sat': float(company.sat_hours_week_a),
-                'sun': float(company.sun_hours_week_a),
-            },
-            'biweekly_b': {
-                'mon': float(company.mon_hours_week_b),
-                'tue': float(company.tue_hours_week_b),
-                'wed': float(company.wed_hours_week_b),
-                'thu': float(company.thu_hours_week_b),
-                'fri': float(company.fri_hours_week_b),
-                'sat': float(company.sat_hours_week_b),
-                'sun': float(company.sun_hours_week_b),
-            },
+            'cycle_weeks': company.cycle_weeks,
+            'cycle_start_date': company.cycle_start_date,
+            'weeks': [
+                {'label': label, 'hours': dict(zip(DAY_NAMES, map(_float_hours, hours)))}
+                for label, hours, _ in company.get_weeks()
+            ],
         }
+        if company.cycle_weeks <= 2:
+            # The keys from before N-week rotations, for clients that still read them
+            week_a = dict(zip(DAY_NAMES, (_float_hours(company.get_hours(0, wd)) for wd in range(7))))
+            data.update({
+                'pattern_type': 'weekly' if company.cycle_weeks == 1 else 'biweekly',
+                'weekly': week_a,
+                'biweekly_a': week_a,
+                'biweekly_b': dict(zip(DAY_NAMES, (_float_hours(company.get_hours(1, wd)) for wd in range(7)))),
+            })
         return JsonResponse(data)
-    return JsonResponse({'error': 'No company ID provided'}, status=400)
\ No newline at end of file
+    return JsonResponse({'error': 'No company ID provided'}, status=400)
+
+def company_patterns(request):
+    """
+    Hour patterns of many companies in one response: ?ids=1,2,3 or every
+    active company when ids is omitted. Hours are one Monday-first list per
+    week of the rotation (week A first). The ETag
+    follows the company version counter, so clients revalidate for free
+    until a company changes.
+    """
+    try:
+        ids = sorted({int(pk) for pk in request.GET.get('ids', '').split(',') if pk.strip()})
+    except ValueError:
+        return JsonResponse({'error': 'ids must be a comma-separated list of company ids'}, status=400)
+    
+    version = get_version('company')
+    etag = quote_etag(f"companies-{version}-{','.join(map(str, ids)) or 'all'}")
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        companies = Company.objects.order_by('name')
+        companies = companies.filter(pk__in=ids) if ids else companies.filter(is_active=True)
+        data = [
+            {
+                'id': company.id,
+                'name': company.name,
+                'is_active': company.is_active,
+                'cycle_weeks': company.cycle_weeks,
+                'cycle_start_date': company.cycle_start_date,
+                'weeks': [[_float_hours(value) for value in hours] for _, hours, _ in company.get_weeks()],
+            }
+            for company in companies.only('id', 'name', 'is_active', 'cycle_weeks', 'cycle_start_date', 'pattern')
+        ]
+        response = JsonResponse({'version': version, 'companies': data})
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+# Longest range hours_range will compute in one request
+MAX_RANGE_DAYS = 5 * 366
+
+
+def _hours_json(value):
+    """Convert the Decimal hours in a hours_in_range() result to floats"""
+    if isinstance(value, dict):
+        return {key: _hours_json(item) for key, item in value.items()}
+    if isinstance(value, Decimal):
+        return _float_hours(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def hours_range(request):
+    """Hours per cleaner and per company over an arbitrary date range"""
+    try:
+        start = date.fromisoformat(request.GET.get('start', ''))
+        end = date.fromisoformat(request.GET.get('end', ''))
+    except ValueError:
+        return JsonResponse({'error': 'start and end are required (YYYY-MM-DD)'}, status=400)
+    if end < start:
+        return JsonResponse({'error': 'end must not be before start'}, status=400)
+    if (end - start).days >= MAX_RANGE_DAYS:
+        return JsonResponse({'error': f'range must be shorter than {MAX_RANGE_DAYS} days'}, status=400)
+    
+    try:
+        company_ids = [int(pk) for pk in request.GET.getlist('company')]
+    except ValueError:
+        return JsonResponse({'error': 'company must be an id'}, status=400)
+    cleaner = request.GET.get('cleaner', '').strip() or None
+    per_day = request.GET.get('days') in ('1', 'true')
+    
+    data = hours_in_range(start, end, cleaner=cleaner, company_ids=company_ids, per_day=per_day)
+    return JsonResponse(_hours_json(data))
+
+def api_timesheets(request):
+    """
+    Timesheets as JSON, oldest id first. Filters: year, month, cleaner,
+    updated_since (ISO datetime). ?fields= picks the fields (see
+    timesheet/api.py), ?after=<id>&limit= pages, ?stream=1 streams them all.
+    """
+    try:
+        fields = api.parse_fields(request.GET.get('fields'))
+        after = int(request.GET['after']) if request.GET.get('after') else None
+        limit = min(int(request.GET.get('limit') or api.PAGE_SIZE), api.MAX_PAGE_SIZE)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if limit < 1:
+        return JsonResponse({'error': 'limit must be positive'}, status=400)
+    
+    queryset = api.timesheet_queryset(fields)
+    for param in ('year', 'month'):
+        value = request.GET.get(param)
+        if value:
+            if not value.isdigit():
+                return JsonResponse({'error': f'{param} must be a number'}, status=400)
+            queryset = queryset.filter(**{param: int(value)})
+    cleaner = request.GET.get('cleaner', '').strip()
+    if cleaner:
+        queryset = queryset.filter(cleaner_name=cleaner)
+    updated_since = request.GET.get('updated_since')
+    if updated_since:
+        try:
+            updated_since = parse_datetime(updated_since)
+        except ValueError:
+            updated_since = None
+        if updated_since is None:
+            return JsonResponse({'error': 'updated_since must be an ISO datetime'}, status=400)
+        if timezone.is_naive(updated_since):
+            updated_since = timezone.make_aware(updated_since)
+        queryset = queryset.filter(updated_at__gte=updated_since)
+    
+    if request.GET.get('stream') in ('1', 'true'):
+        return StreamingHttpResponse(api.iter_json_stream(queryset, fields), content_type='application/json')
+    
+    rows, next_after = api.keyset_page(queryset, after, limit)
+    next_url = None
+    if next_after is not None:
+        params = request.GET.copy()
+        params['after'] = next_after
+        next_url = f"{request.path}?{params.urlencode()}"
+    return JsonResponse({
+        'results': [api.serialize_timesheet(ts, fields) for ts in rows],
+        'next': next_url,
+    })
+
+
+def api_timesheet_detail(request, pk):
+    """One timesheet as JSON; all fields unless ?fields= narrows them"""
+    try:
+        fields = api.parse_fields(request.GET.get('fields'), default=api.ALL_FIELDS)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    timesheet = get_object_or_404(api.timesheet_queryset(fields), pk=pk)
+    return JsonResponse(api.serialize_timesheet(timesheet, fields))
+
+
+@staff_member_required
+def request_metrics(request):
+    """Per-view latency / query histograms for this process (JSON, or Prometheus text with ?format=prometheus)"""
+    if request.GET.get('format') == 'prometheus':
+        return HttpResponse(
+            metrics.registry.prometheus() + schedule_cache.prometheus(),
+            content_type='text/plain; version=0.0.4; charset=utf-8',
+        )
+    if request.method == 'POST' and request.POST.get('reset'):
+        metrics.registry.reset()
+        schedule_cache.reset_stats()
+    return JsonResponse({**metrics.registry.snapshot(), 'schedule_cache': schedule_cache.stats()})
+
+
+@staff_member_required
+def profile_list(request):
+    """Requests profiled with ?_profile=1, newest first"""
+    return render(request, 'timesheet/profile_list.html', {'profiles': profiling.list_profiles()})
+
+
+@staff_member_required
+def profile_detail(request, profile_id):
+    """Summary of one profiled request: timings, hottest functions and its SQL queries"""
+    summary = profiling.load_summary(profile_id)
+    if summary is None:
+        raise Http404("Unknown profile")
+    return render(request, 'timesheet/profile_detail.html', {'profile': summary})
+
+
+@staff_member_required
+def profile_download(request, profile_id):
+    """The raw .pstats file, for snakeviz or python -m pstats"""
+    path = profiling.pstats_path(profile_id)
+    if path is None:
+        raise Http404("Unknown profile")
+    return file_response(open(path, 'rb'), f"{profile_id}.pstats", content_type='application/octet-stream')
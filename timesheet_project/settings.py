@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 import os
+import tempfile
 import dj_database_url
 from pathlib import Path
 
@@ -41,10 +42,12 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'timesheet.metrics.RequestMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'timesheet.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -84,4 +87,45 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Shared by all workers: holds the version counters in timesheet/versions.py
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'timesheet-cache')),
+    }
+}
+
+# Processes the export job worker and export_month command render bulk exports
+# with (defaults to one per CPU, at most 4); web requests always render serially
+TIMESHEET_EXPORT_WORKERS = int(os.environ.get('TIMESHEET_EXPORT_WORKERS', 0)) or None
+
+# Local disk cache for generated Excel exports, shared by all workers
+TIMESHEET_EXPORT_CACHE_DIR = os.environ.get(
+    'TIMESHEET_EXPORT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'timesheet-exports')
+)
+TIMESHEET_EXPORT_CACHE_MAX_BYTES = int(os.environ.get('TIMESHEET_EXPORT_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+# Background export jobs (timesheet/jobs.py): where finished files are kept,
+# when a silent running job counts as abandoned, and how long results are kept
+TIMESHEET_EXPORT_JOB_DIR = os.environ.get(
+    'TIMESHEET_EXPORT_JOB_DIR', os.path.join(tempfile.gettempdir(), 'timesheet-export-jobs')
+)
+TIMESHEET_EXPORT_JOB_STALE_SECONDS = int(os.environ.get('TIMESHEET_EXPORT_JOB_STALE_SECONDS', 600))
+TIMESHEET_EXPORT_JOB_TTL_SECONDS = int(os.environ.get('TIMESHEET_EXPORT_JOB_TTL_SECONDS', 24 * 60 * 60))
+
+# Fraction of requests measured by timesheet.metrics.RequestMetricsMiddleware
+TIMESHEET_METRICS_SAMPLE_RATE = float(os.environ.get('TIMESHEET_METRICS_SAMPLE_RATE', 1.0))
+
+# Compiled schedules and month vectors kept per process by timesheet.schedule_cache
+# (a month vector is a tuple of at most 31 int hundredths shared with the
+# schedule's slots, about 300 bytes, so the default is roughly 5 MB per process)
+TIMESHEET_SCHEDULE_CACHE_SIZE = int(os.environ.get('TIMESHEET_SCHEDULE_CACHE_SIZE', 16384))
+
+# Requests profiled by staff with ?_profile=1 (timesheet.profiling): where the
+# .pstats files and summaries go, and how many of the newest are kept
+TIMESHEET_PROFILE_DIR = os.environ.get(
+    'TIMESHEET_PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'timesheet-profiles')
+)
+TIMESHEET_PROFILE_KEEP = int(os.environ.get('TIMESHEET_PROFILE_KEEP', 50))